@@ -1,34 +1,16 @@
+import os
 
-from flask import Flask, jsonify
+from flask import Blueprint, Flask, Response, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-
-# Import and register all blueprints
-from routes import (
-    knot_bp,
-    snowflake_bp,
-    merchants_bp,
-    cards_bp,
-    analytics_bp,
-    chat_bp,
-    nessie_bp
-)
-
-app.register_blueprint(knot_bp)
-app.register_blueprint(snowflake_bp)
-app.register_blueprint(merchants_bp)
-app.register_blueprint(cards_bp)
-app.register_blueprint(analytics_bp)
-app.register_blueprint(chat_bp)
-app.register_blueprint(nessie_bp)
-
-
-@app.route("/")
+# App-level routes (index + legacy aliases), registered by create_app()
+core_bp = Blueprint('core', __name__)
+
+
+@core_bp.route("/")
 def index():
     return jsonify({
         "app": "Dime Backend",
@@ -39,30 +21,134 @@ def index():
             "merchants": "/api/merchants/*",
             "cards": "/api/cards",
             "analytics": "/api/cashflow, /api/alerts, /api/top-of-file",
-            "chat": "/api/chat"
+            "items": "/api/items/top",
+            "chat": "/api/chat",
+            "jobs": "/api/jobs/<job_id>, /api/jobs/warehouse/<job_id>",
+            "metrics": "/metrics"
         }
     })
 
-@app.route("/api/classify-transactions", methods=["POST"])
+@core_bp.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (this process's series)"""
+    from metrics import registry
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@core_bp.route("/api/classify-transactions", methods=["POST"])
 def classify_transactions_legacy():
     """Legacy endpoint - redirects to snowflake blueprint"""
     from routes.snowflake_routes import classify
     return classify()
 
 
-@app.route("/api/transactions", methods=["GET", "POST"])
+@core_bp.route("/api/transactions", methods=["GET", "POST"])
 def unified_transactions():
     """Unified transactions endpoint that calls Knot sync directly"""
     from routes.knot import sync_transactions
     return sync_transactions()
 
 
-@app.route("/api/transactions/stored", methods=["GET", "POST"])
+@core_bp.route("/api/transactions/<tx_id>", methods=["GET"])
+def transaction_detail(tx_id):
+    """Transaction detail with raw payload - served by the snowflake blueprint"""
+    from routes.snowflake_routes import get_transaction_detail
+    return get_transaction_detail(tx_id)
+
+
+@core_bp.route("/api/transactions/stored", methods=["GET", "POST"])
 def stored_transactions_legacy():
     """Legacy endpoint - redirects to snowflake blueprint"""
     from routes.snowflake_routes import get_stored_transactions
     return get_stored_transactions()
 
 
+def start_background_workers(recover_jobs: bool = True):
+    """Start this process's job queue workers and warehouse poller.
+    
+    recover_jobs requeues jobs left 'running' by a previous process; under a
+    multi-worker server only the master does that (see gunicorn.conf.py).
+    """
+    from jobs import get_queue
+    get_queue(recover=recover_jobs)
+    from warehouse_jobs import get_warehouse_jobs
+    get_warehouse_jobs()
+
+
+def reset_after_fork():
+    """Drop per-process state inherited from a pre-fork parent (threads and connections don't survive fork)"""
+    from snowflake_db import reset_db_after_fork
+    from jobs import reset_queue_after_fork
+    from warehouse_jobs import reset_warehouse_jobs_after_fork
+    reset_db_after_fork()
+    reset_queue_after_fork()
+    reset_warehouse_jobs_after_fork()
+
+
+def drain_background_workers(timeout: float = 30.0):
+    """Graceful shutdown: finish running jobs, stop polling, close Snowflake sessions"""
+    from jobs import shutdown_queue
+    from warehouse_jobs import shutdown_warehouse_jobs
+    from snowflake_db import close_db
+    shutdown_queue(timeout)
+    shutdown_warehouse_jobs()
+    close_db()
+
+
+def create_app(start_background: bool = True) -> Flask:
+    """Build the Flask app; start_background starts job workers in this process"""
+    app = Flask(__name__)
+    CORS(app)
+    
+    # Request latency per endpoint + route label for Snowflake QUERY_TAG
+    import metrics
+    metrics.init_app(app)
+    # Opt-in per-request cProfile / tracemalloc capture (no hooks unless PROFILING_ENABLED)
+    import profiling
+    profiling.init_app(app)
+    
+    # Import and register all blueprints
+    from routes import (
+        knot_bp,
+        snowflake_bp,
+        merchants_bp,
+        cards_bp,
+        analytics_bp,
+        chat_bp,
+        nessie_bp,
+        jobs_bp,
+        items_bp,
+        admin_bp
+    )
+    
+    app.register_blueprint(core_bp)
+    app.register_blueprint(knot_bp)
+    app.register_blueprint(snowflake_bp)
+    app.register_blueprint(merchants_bp)
+    app.register_blueprint(cards_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(chat_bp)
+    app.register_blueprint(nessie_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(items_bp)
+    app.register_blueprint(admin_bp)
+    
+    if start_background:
+        # Jobs queued and warehouse queries submitted before a restart resume
+        start_background_workers()
+    return app
+
+
+def is_reloader_child() -> bool:
+    """True in the process the Werkzeug reloader spawned to serve requests.
+    
+    The reloader parent only watches files. Starting workers there too would put two
+    processes on one job queue, and each reload's recover_interrupted() would requeue
+    jobs the other process is still running.
+    """
+    return os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
 if __name__ == "__main__":
-    app.run(port=5001, debug=True)
+    # Development server; production runs wsgi.py under gunicorn (see README.md)
+    create_app(start_background=is_reloader_child()).run(port=5001, debug=True)
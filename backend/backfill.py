@@ -0,0 +1,194 @@
+"""
+Column Backfills for Dime
+
+Chunked, resumable backfills of derived TRANSACTIONS columns:
+- Walks rows still missing the column in bounded id ranges (keyset on id)
+- Checkpoints progress to BACKFILL_CHECKPOINTS after every batch
+- Pause / resume (also across restarts: runs are durable job-queue jobs)
+- Pluggable derivations: set-based SQL from raw_json, or a Python callable
+  (also used to flatten raw_json products into TRANSACTION_ITEMS)
+"""
+
+import os
+import time
+from typing import Any, Dict, List
+
+BACKFILL_CONFIG = {
+    "batch_size": int(os.getenv("BACKFILL_BATCH_SIZE", "1000")),
+    # Breathing room between batches so interactive queries are not starved
+    "sleep_seconds": float(os.getenv("BACKFILL_SLEEP_SECONDS", "0.2")),
+}
+
+
+def _categorize(db, tx_ids: List[str]) -> int:
+    return db.categorize_transactions_batch(tx_ids)["categorized"]
+
+
+def _flatten_items(db, tx_ids: List[str]) -> int:
+    return db.backfill_transaction_items(tx_ids)
+
+
+# name -> derivation. SQL derivations give a source query yielding (id, value) for the
+# rows in {scope}; Python derivations get the batch's ids and return rows updated.
+BACKFILL_DERIVATIONS: Dict[str, Dict[str, Any]] = {
+    "payment_method": {
+        "column": "payment_method",
+        "missing": "payment_method IS NULL AND EXISTS (SELECT 1 FROM TRANSACTION_RAW_JSON r "
+                   "WHERE r.tx_id = TRANSACTIONS.id AND r.raw_json:payment_methods[0] IS NOT NULL)",
+        "source": """
+            SELECT t.id, {payment_method} AS value
+            FROM TRANSACTIONS t JOIN TRANSACTION_RAW_JSON r ON r.tx_id = t.id
+            WHERE {{scope}}
+        """,
+        "refresh_rollup": True,
+    },
+    "card_id": {
+        "column": "card_id",
+        "missing": "card_id IS NULL AND EXISTS (SELECT 1 FROM TRANSACTION_RAW r WHERE r.tx_id = TRANSACTIONS.id)",
+        "source": """
+            SELECT t.id,
+                   COALESCE(r.raw_json:card_id::VARCHAR, r.raw_json:account_id::VARCHAR,
+                            r.raw_json:payment_methods[0]:external_id::VARCHAR) AS value
+            FROM TRANSACTIONS t JOIN TRANSACTION_RAW_JSON r ON r.tx_id = t.id
+            WHERE {scope}
+        """,
+        "refresh_rollup": False,
+    },
+    "product_text": {
+        "column": "product_text",
+        "missing": "COALESCE(product_text, '') = '' AND EXISTS (SELECT 1 FROM TRANSACTION_RAW_JSON r "
+                   "WHERE r.tx_id = TRANSACTIONS.id AND r.raw_json:products[0] IS NOT NULL)",
+        # First 10 product names, as _transaction_row builds it at ingest
+        "source": """
+            SELECT t.id, LISTAGG(p.value:name::VARCHAR, ' ') WITHIN GROUP (ORDER BY p.index) AS value
+            FROM TRANSACTIONS t
+            JOIN TRANSACTION_RAW_JSON r ON r.tx_id = t.id,
+            LATERAL FLATTEN(input => r.raw_json:products) p
+            WHERE {scope} AND p.index < 10
+            GROUP BY t.id
+        """,
+        "refresh_rollup": False,
+    },
+    "items": {
+        # Not a column: rows of TRANSACTION_ITEMS flattened from raw_json:products
+        "missing": "EXISTS (SELECT 1 FROM TRANSACTION_RAW_JSON r "
+                   "WHERE r.tx_id = TRANSACTIONS.id AND r.raw_json:products[0] IS NOT NULL) "
+                   "AND NOT EXISTS (SELECT 1 FROM TRANSACTION_ITEMS i WHERE i.tx_id = TRANSACTIONS.id)",
+        "python": _flatten_items,
+    },
+    "spend_category": {
+        "column": "spend_category",
+        "missing": "spend_category IS NULL",
+        "python": _categorize,
+    },
+}
+
+
+def _derivation(name: str) -> Dict[str, Any]:
+    from snowflake_db import PAYMENT_METHOD_FROM_RAW_SQL
+    if name not in BACKFILL_DERIVATIONS:
+        raise ValueError(f"Unknown backfill: {name}. Available: {', '.join(BACKFILL_DERIVATIONS)}")
+    derivation = dict(BACKFILL_DERIVATIONS[name])
+    if name == "payment_method":
+        derivation["source"] = derivation["source"].format(payment_method=PAYMENT_METHOD_FROM_RAW_SQL)
+    return derivation
+
+
+def run_backfill(db, name: str, max_batches: int = None, restart: bool = False) -> Dict[str, Any]:
+    """Process batches from the last checkpoint until done, paused, or max_batches is reached.
+    
+    A completed backfill is returned as is; pass restart=True to rescan from the first id.
+    """
+    derivation = _derivation(name)
+    if restart:
+        checkpoint = db.save_backfill_checkpoint(name, "running", last_id=None, rows_processed=0,
+                                                 rows_updated=0, batches=0, error=None)
+    else:
+        checkpoint = db.get_backfill_checkpoint(name) or {}
+    if checkpoint.get("status") in ("paused", "completed"):
+        return checkpoint
+
+    state = {
+        "last_id": checkpoint.get("last_id"),
+        "rows_processed": checkpoint.get("rows_processed", 0),
+        "rows_updated": checkpoint.get("rows_updated", 0),
+        "batches": checkpoint.get("batches", 0),
+    }
+    batches_run = 0
+    while max_batches is None or batches_run < max_batches:
+        # Re-read each batch so a pause from any process is honoured promptly
+        current = db.get_backfill_checkpoint(name)
+        if current and current["status"] == "paused":
+            print(f"⏸️  Backfill {name} paused at {state['last_id']}")
+            return current
+        if current and current["batches"] < state["batches"]:
+            # Restarted (start_backfill(restart=True)) while this run was in flight
+            state = {key: current[key] for key in state}
+
+        ids = db.backfill_next_ids(derivation["missing"], state["last_id"], BACKFILL_CONFIG["batch_size"])
+        if not ids:
+            print(f"✅ Backfill {name} complete: {state['rows_updated']} rows updated in {state['batches']} batches")
+            return db.save_backfill_checkpoint(name, "completed", **state)
+
+        if "python" in derivation:
+            updated = derivation["python"](db, ids)
+        else:
+            updated = db.backfill_apply(derivation["column"], derivation["source"], ids,
+                                        refresh_rollup=derivation.get("refresh_rollup", False))
+
+        batches_run += 1
+        # A pause or restart may have landed while the batch ran; saving "running" would undo it
+        current = db.get_backfill_checkpoint(name)
+        if current and current["batches"] < state["batches"]:
+            state = {key: current[key] for key in state}
+            continue
+
+        state["last_id"] = ids[-1]
+        state["rows_processed"] += len(ids)
+        state["rows_updated"] += updated
+        state["batches"] += 1
+        if current and current["status"] == "paused":
+            print(f"⏸️  Backfill {name} paused at {state['last_id']}")
+            return db.save_backfill_checkpoint(name, "paused", **state)
+        db.save_backfill_checkpoint(name, "running", **state)
+        if BACKFILL_CONFIG["sleep_seconds"] > 0:
+            time.sleep(BACKFILL_CONFIG["sleep_seconds"])
+
+    return db.get_backfill_checkpoint(name)
+
+
+def start_backfill(db, name: str, restart: bool = False) -> Dict[str, Any]:
+    """Mark a backfill running (from scratch if restart) and queue a durable job to drive it.
+    
+    A completed backfill is returned as is unless restart. No job is queued while one
+    that will pick up this checkpoint is already queued or running.
+    """
+    _derivation(name)
+    checkpoint = db.get_backfill_checkpoint(name) or {}
+    previous_status = checkpoint.get("status")
+    if previous_status == "completed" and not restart:
+        return checkpoint
+    if restart or previous_status is None:
+        checkpoint = db.save_backfill_checkpoint(name, "running", last_id=None, rows_processed=0,
+                                                 rows_updated=0, batches=0, error=None)
+    else:
+        checkpoint = db.save_backfill_checkpoint(name, "running", error=None)
+
+    from jobs import get_queue
+    queue = get_queue()
+    user_id = f"backfill:{name}"
+    active = queue.active("backfill_column", user_id)
+    # A queued job reads the checkpoint when it starts, and a running one re-reads it every
+    # batch (including a restart). Only a run that may be exiting on a pause needs a successor.
+    queued = [job for job in active if job["status"] == "queued"]
+    if queued or (active and previous_status != "paused"):
+        return {**checkpoint, "job_id": (queued or active)[0]["id"]}
+    # Per-"user" ordering in the queue keeps one run per backfill name at a time
+    job_id = queue.enqueue("backfill_column", {"name": name}, user_id=user_id)
+    return {**checkpoint, "job_id": job_id}
+
+
+def pause_backfill(db, name: str) -> Dict[str, Any]:
+    """Ask a running backfill to stop after its current batch"""
+    _derivation(name)
+    return db.save_backfill_checkpoint(name, "paused")
@@ -0,0 +1,209 @@
+"""
+Read-Through Cache for Dime
+
+In-process TTL + LRU cache for SnowflakeDB read methods:
+- Keyed by (method, args) plus a per-user data version
+- Write methods bump the version, so a read after a write never sees stale data
+- Versions live in the jobs SQLite file, so a write in one gunicorn worker
+  invalidates every worker's entries on the same host
+- Hit / miss / eviction counters
+"""
+
+import copy
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CACHE_CONFIG = {
+    "enabled": os.getenv("CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+    "ttl_seconds": float(os.getenv("CACHE_TTL_SECONDS", "60")),
+    "max_entries": int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    # Keep data versions in SQLite (shared by processes on this host) instead of process memory
+    "shared_versions": os.getenv("CACHE_SHARED_VERSIONS", "true").lower() not in ("0", "false", "no"),
+    "versions_db_path": os.getenv("CACHE_VERSIONS_DB_PATH", ""),  # default: the jobs database
+}
+
+
+class LocalVersions:
+    """Per-process version counters (single-process deployments and tests)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+
+    def get(self, *scopes: str) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes: str) -> None:
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+
+class SharedVersions:
+    """Version counters in a SQLite table, visible to every process that opens the same file"""
+
+    def __init__(self, db_path: str = None):
+        if not db_path:
+            from jobs import JOBS_CONFIG
+            db_path = JOBS_CONFIG["db_path"]
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_versions (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, reopened in a forked child (never reuse the parent's)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, *scopes: str) -> Tuple[int, ...]:
+        placeholders = ", ".join(["?"] * len(scopes))
+        rows = self._connection().execute(
+            f"SELECT scope, version FROM cache_versions WHERE scope IN ({placeholders})", scopes).fetchall()
+        found = dict(rows)
+        return tuple(found.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes: str) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO cache_versions (scope, version) VALUES (?, 1)
+                ON CONFLICT (scope) DO UPDATE SET version = version + 1
+            """, [(scope,) for scope in scopes])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_versions_instance = None
+_versions_lock = threading.Lock()
+
+
+def default_versions():
+    """Process-wide version store: SQLite-backed unless CACHE_SHARED_VERSIONS is off"""
+    global _versions_instance
+    if _versions_instance is None:
+        with _versions_lock:
+            if _versions_instance is None:
+                if CACHE_CONFIG["shared_versions"]:
+                    _versions_instance = SharedVersions(CACHE_CONFIG["versions_db_path"] or None)
+                else:
+                    _versions_instance = LocalVersions()
+    return _versions_instance
+
+
+class VersionedCache:
+    """Thread-safe TTL + LRU cache whose keys embed per-user data versions"""
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None, namespace: str = "reads",
+                 versions=None):
+        self.ttl_seconds = CACHE_CONFIG["ttl_seconds"] if ttl_seconds is None else ttl_seconds
+        self.max_entries = max(1, max_entries or CACHE_CONFIG["max_entries"])
+        self.namespace = namespace
+        self._versions = versions or default_versions()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # ========== Versions ==========
+
+    def _scope(self, user_id: Optional[str]) -> str:
+        # user_id=None is the all-users scope (reads not attributed to one user)
+        return f"{self.namespace}:user:{'' if user_id is None else user_id}"
+
+    def _version(self, user_id: Optional[str]) -> tuple:
+        # (epoch, user version); the epoch is bumped when a write can't be attributed to one user
+        return self._versions.get(f"{self.namespace}:epoch", self._scope(user_id))
+
+    def invalidate_user(self, user_id: Optional[str]) -> None:
+        """Bump a user's data version (also the all-users scope used by user_id=None reads)"""
+        scopes = [self._scope(user_id)]
+        if user_id is not None:
+            scopes.append(self._scope(None))
+        self._versions.bump(*scopes)
+        with self._lock:
+            self._stats["invalidations"] += 1
+
+    def invalidate_all(self) -> None:
+        """Bump the global epoch, invalidating every user's entries"""
+        self._versions.bump(f"{self.namespace}:epoch")
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    # ========== Lookups ==========
+
+    def get_or_load(self, method: str, args: tuple, user_id: Optional[str], load: Callable[[], Any]) -> Any:
+        """Return a cached copy for (method, args, version), calling load() on a miss"""
+        # Version is captured before loading, so a write that lands mid-load
+        # (in this or any other process) makes this entry unreachable instead of serving it as fresh
+        key = (method, args, self._version(user_id))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(entry[1])
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+
+        value = load()
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared_versions": isinstance(self._versions, SharedVersions),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_read(fn):
+    """Serve a SnowflakeDB read method through self._cache, keyed by its bound arguments and user_id"""
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, "_cache", None)
+        if cache is None:
+            return fn(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        call_args = tuple((name, value) for name, value in bound.arguments.items() if name != "self")
+        return cache.get_or_load(fn.__name__, call_args, bound.arguments.get("user_id"),
+                                 lambda: fn(self, *args, **kwargs))
+
+    return wrapper
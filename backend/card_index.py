@@ -0,0 +1,218 @@
+"""
+Card Benefit Index for Dime
+
+Precompiled, per-user card rankings for /api/optimal-card:
+- Built from each card's stored benefits_multipliers (compiled at save_card)
+  plus the card-network POINTS_RULES (PayPal / Discover / Visa)
+- Held in memory per user; rebuilt when a card is saved or deleted
+- Card changes bump a shared version (cache.default_versions), so other worker
+  processes rebuild on their next lookup
+- A recommendation is a dictionary lookup, with no warehouse query
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cache import default_versions
+
+CARD_INDEX_CONFIG = {
+    # Safety net on top of the shared version check
+    "ttl_seconds": float(os.getenv("CARD_INDEX_TTL_SECONDS", "300")),
+}
+
+# Extension / legacy category names -> spend categories
+CATEGORY_ALIASES = {
+    "dining": "food_dining",
+    "food": "food_dining",
+    "restaurants": "food_dining",
+    "grocery": "groceries",
+    "gas": "gas_auto",
+    "auto": "gas_auto",
+    "streaming": "entertainment",
+    "health": "healthcare",
+    "utilities": "services",
+}
+
+# Networks typically strong in a category; breaks ties between equal multipliers
+CATEGORY_PREFERENCES = {
+    "groceries": ["amex", "discover"],
+    "food_dining": ["amex", "visa"],
+    "travel": ["amex", "visa"],
+    "gas_auto": ["discover", "visa"],
+    "entertainment": ["visa", "mastercard"],
+    "shopping": ["amex", "discover"],
+}
+
+
+def normalize_category(category: Optional[str]) -> str:
+    """Map a free-form category name onto the spend categories"""
+    key = (category or "").strip().lower().replace(" ", "_")
+    return CATEGORY_ALIASES.get(key, key)
+
+
+def _clean_multipliers(parsed: Dict[str, Any]) -> Dict[str, float]:
+    """Normalize category keys and drop non-numeric multipliers from a parsed benefits dict"""
+    multipliers = {}
+    for key, value in (parsed or {}).items():
+        try:
+            multipliers[normalize_category(key)] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return multipliers
+
+
+class CardIndex:
+    """One user's cards ranked per category, plus merchant-specific network bonuses"""
+
+    def __init__(self, cards: Dict[str, Dict[str, Any]], rankings: Dict[str, List[tuple]],
+                 merchant_rules: List[Dict[str, Any]], version: tuple = ()):
+        self.version = version                # shared data version the index was built from
+        self.cards = cards                    # card_id -> card summary
+        self.rankings = rankings              # category -> [(card_id, multiplier, reason)], best first
+        self.merchant_rules = merchant_rules  # [{merchant_id, keyword, cards: {card_id: (multiplier, reason)}}]
+        self.built_at = time.monotonic()
+
+    def recommend(self, merchant: str = "", category: str = "", merchant_id: int = None) -> Optional[Dict[str, Any]]:
+        """Best card for a (merchant, category) pair, or None if the user has no cards"""
+        ranking = self.rankings.get(normalize_category(category)) or self.rankings.get("base", [])
+        if not ranking:
+            return None
+
+        merchant_lower = (merchant or "").lower()
+        overrides = {}
+        for rule in self.merchant_rules:
+            if (rule["merchant_id"] is not None and merchant_id == rule["merchant_id"]) or \
+               (rule["keyword"] and rule["keyword"] in merchant_lower):
+                overrides.update(rule["cards"])
+
+        best_id, best_multiplier, reason = ranking[0]
+        if overrides:
+            # Ranking order is the tie-breaker, so only a strictly higher multiplier wins
+            for card_id, multiplier, card_reason in ranking:
+                bonus = overrides.get(card_id)
+                if bonus and bonus[0] > multiplier:
+                    multiplier, card_reason = bonus
+                if multiplier > best_multiplier:
+                    best_id, best_multiplier, reason = card_id, multiplier, card_reason
+
+        card = self.cards[best_id]
+        return {
+            "card_id": best_id,
+            "card_type": card.get("card_type"),
+            "last_four": card.get("last_four"),
+            "reason": reason,
+            "multiplier": best_multiplier,
+            "benefits": card.get("benefits"),
+        }
+
+
+def build_card_index(cards: List[Dict[str, Any]], multipliers_by_card: Dict[str, Dict[str, Any]],
+                     version: tuple = ()) -> CardIndex:
+    """Compile a user's cards and their parsed benefit multipliers into a CardIndex"""
+    from snowflake_db import POINTS_RULES, SPEND_CATEGORIES, match_points_rule
+
+    summaries = {}
+    scored: Dict[str, List[tuple]] = {category: [] for category in SPEND_CATEGORIES + ["base"]}
+
+    for position, card in enumerate(cards):
+        card_id = card["card_id"]
+        card_type = (card.get("card_type") or "").lower()
+        summaries[card_id] = card
+        multipliers = _clean_multipliers(multipliers_by_card.get(card_id))
+        network_multiplier, network_reason = match_points_rule(card_type, None, None)
+        base = multipliers.get("base")
+
+        for category in scored:
+            if category != "base" and category in multipliers:
+                multiplier = multipliers[category]
+                reason = f"Benefits earn {multiplier:g}x on {category}"
+            elif base is not None:
+                multiplier = base
+                reason = f"Earns {multiplier:g}x on all purchases"
+            else:
+                multiplier, reason = float(network_multiplier), network_reason
+            preferred = card_type in CATEGORY_PREFERENCES.get(category, [])
+            scored[category].append((-multiplier, not preferred, position, card_id, multiplier, reason))
+
+    rankings = {
+        category: [(card_id, multiplier, reason) for _, _, _, card_id, multiplier, reason in sorted(entries)]
+        for category, entries in scored.items()
+    }
+
+    merchant_rules = []
+    for rule in POINTS_RULES:
+        if "merchant_id" not in rule and "merchant_name_contains" not in rule:
+            continue
+        matching = {
+            card_id: (float(rule["multiplier"]), rule["reason"])
+            for card_id, card in summaries.items()
+            if rule["payment_contains"] in (card.get("card_type") or "").upper()
+        }
+        if matching:
+            merchant_rules.append({
+                "merchant_id": rule.get("merchant_id"),
+                "keyword": rule.get("merchant_name_contains"),
+                "cards": matching,
+            })
+
+    return CardIndex(summaries, rankings, merchant_rules, version)
+
+
+class CardIndexRegistry:
+    """Process-wide map of user_id -> CardIndex with explicit invalidation"""
+
+    def __init__(self, ttl_seconds: float = None, versions=None):
+        self.ttl_seconds = CARD_INDEX_CONFIG["ttl_seconds"] if ttl_seconds is None else ttl_seconds
+        self._versions = versions
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, CardIndex] = {}
+        self._stats = {"hits": 0, "builds": 0, "invalidations": 0}
+
+    def get(self, db, user_id: str) -> CardIndex:
+        """Return the user's index, building it on first use or after invalidation (in any process)"""
+        version = self._version(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.version == version and time.monotonic() - index.built_at < self.ttl_seconds:
+                self._stats["hits"] += 1
+                return index
+        return self.rebuild(db, user_id)
+
+    def rebuild(self, db, user_id: str) -> CardIndex:
+        """Load the user's cards and compile a fresh index"""
+        # Captured before loading, so a card change that lands mid-build forces another rebuild
+        version = self._version(user_id)
+        cards = db.get_cards(user_id)
+        # Multipliers were compiled once at save_card, so building costs no Cortex calls
+        multipliers_by_card = {card["card_id"]: card.get("multipliers") or {} for card in cards}
+        index = build_card_index(cards, multipliers_by_card, version)
+        with self._lock:
+            self._indexes[user_id] = index
+            self._stats["builds"] += 1
+        print(f"🗂️  Built card index for {user_id}: {len(cards)} cards")
+        return index
+
+    def _version(self, user_id: str) -> tuple:
+        versions = self._versions or default_versions()
+        return versions.get("cards:epoch", f"cards:user:{user_id}")
+
+    def invalidate(self, user_id: str = None) -> None:
+        """Drop one user's index (or all of them), here and in every other process"""
+        versions = self._versions or default_versions()
+        versions.bump("cards:epoch" if user_id is None else f"cards:user:{user_id}")
+        with self._lock:
+            if user_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(user_id, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"users": len(self._indexes), **self._stats}
+
+
+# Shared registry (one per process)
+card_indexes = CardIndexRegistry()
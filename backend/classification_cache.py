@@ -0,0 +1,91 @@
+"""
+Classification Result Cache for Dime
+
+Content-addressed memo for CLASSIFY_TEXT results:
+- Key: SHA-256 of normalized product_text || merchant_name
+- In-memory LRU in front of the CLASSIFICATION_CACHE table
+- Entries carry a model version (labels + model), so changing SPEND_CATEGORIES
+  never serves stale labels
+- Memory / table hit and miss counters
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+CLASSIFICATION_CACHE_CONFIG = {
+    "enabled": os.getenv("CLASSIFICATION_CACHE_ENABLED", "true").lower() not in ("0", "false", "no"),
+    "max_entries": int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "20000")),
+}
+
+
+def classification_text(product_text: Optional[str], merchant_name: Optional[str]) -> str:
+    """The text sent to CLASSIFY_TEXT (same concatenation the SQL paths use)"""
+    return f"{product_text or ''} {merchant_name or ''}"
+
+
+def classification_key(product_text: Optional[str], merchant_name: Optional[str]) -> str:
+    """Hash of the classification text, case- and whitespace-insensitive"""
+    normalized = " ".join(classification_text(product_text, merchant_name).lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def model_version(model: str, labels: Iterable[str]) -> str:
+    """Version tag for a model + label set; any change to the labels yields a new version"""
+    digest = hashlib.sha256(",".join(labels).encode()).hexdigest()[:12]
+    return f"{model}:{digest}"
+
+
+class ClassificationLRU:
+    """Thread-safe LRU of (text_hash, model_version) -> (label, score), with hit counters"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max(1, max_entries or CLASSIFICATION_CACHE_CONFIG["max_entries"])
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "table_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_many(self, keys: Iterable[str], version: str) -> Dict[str, Tuple[str, float]]:
+        """Cached (label, score) for each key found in memory"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((key, version))
+                if entry is not None:
+                    self._entries.move_to_end((key, version))
+                    found[key] = entry
+            self._stats["memory_hits"] += len(found)
+        return found
+
+    def put_many(self, results: Dict[str, Tuple[str, float]], version: str) -> None:
+        with self._lock:
+            for key, value in results.items():
+                self._entries[(key, version)] = value
+                self._entries.move_to_end((key, version))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def record(self, table_hits: int = 0, misses: int = 0) -> None:
+        """Count lookups resolved by the table or sent to Cortex"""
+        with self._lock:
+            self._stats["table_hits"] += table_hits
+            self._stats["misses"] += misses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["table_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
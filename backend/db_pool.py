@@ -0,0 +1,214 @@
+"""
+Connection Pool for Dime
+
+Bounded, thread-safe pool of warehouse connections:
+- checkout()/checkin() API with a max size and wait timeout
+- Health check on checkout (closed or stale connections are replaced)
+- Idle eviction of connections that sat unused too long
+- Pool size and wait-time stats
+- A "background" lane so job workers can be routed to their own pool
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# "interactive" (request threads) or "background" (job workers, warehouse poller)
+pool_lane: contextvars.ContextVar = contextvars.ContextVar("pool_lane", default="interactive")
+
+
+@contextmanager
+def background_lane():
+    """Run the block's checkouts against the background pool"""
+    token = pool_lane.set("background")
+    try:
+        yield
+    finally:
+        pool_lane.reset(token)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections created by a connect() factory"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 8,
+        wait_timeout: float = 30.0,
+        idle_timeout: float = 600.0,
+        health_check_after: float = 60.0,
+    ):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.wait_timeout = wait_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle: List[tuple] = []  # (connection, last_used_monotonic), most recent last
+        self._in_use = 0
+        self._closed = False
+
+        self._stats = {
+            "created": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "evicted_idle": 0,
+            "health_check_failures": 0,
+        }
+
+    # ========== Checkout / Checkin ==========
+
+    def checkout(self, timeout: Optional[float] = None) -> Any:
+        """Borrow a healthy connection, waiting up to timeout seconds for one to free up"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        stale: List[Any] = []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed")
+                    stale.extend(self._take_expired_locked())
+
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        conn, last_used = None, None
+                        self._in_use += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["wait_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No connection available after {timeout:.1f}s (pool size {self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                wait_ms = (time.monotonic() - started) * 1000
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                self._stats["total_wait_ms"] += wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        finally:
+            # Closing is a network round trip; do it after releasing the lock
+            for old in stale:
+                self._close_quietly(old)
+
+        # Connect / health check outside the lock so other threads are not blocked on I/O
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                with self._cond:
+                    self._stats["created"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def checkin(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool (or close it if discard is set)"""
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                keep = False
+            else:
+                keep = True
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if not keep:
+            self._close_quietly(conn)
+
+    def close_all(self) -> None:
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def reset(self) -> None:
+        """Drop all idle connections (e.g. after fork) and reopen the pool"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._closed = False
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    # ========== Stats ==========
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool size and wait-time counters"""
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "size": self._in_use + len(self._idle),
+                "avg_wait_ms": round(self._stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+    # ========== Internals ==========
+
+    def _take_expired_locked(self) -> List[Any]:
+        """Remove connections idle longer than idle_timeout (caller holds the lock, then closes them)"""
+        if not self._idle or self.idle_timeout <= 0:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = [conn for conn, last_used in self._idle if last_used < cutoff]
+        if stale:
+            self._idle = [entry for entry in self._idle if entry[1] >= cutoff]
+            self._stats["evicted_idle"] += len(stale)
+        return stale
+
+    def _is_healthy(self, conn: Any, last_used: float) -> bool:
+        """Cheap closed check always; round-trip ping only for connections idle a while"""
+        try:
+            is_closed = getattr(conn, "is_closed", None)
+            if callable(is_closed) and is_closed():
+                return False
+            if time.monotonic() - last_used < self.health_check_after:
+                return True
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,152 @@
+"""
+Fast-Path Classifier for Dime
+
+Rule-based spend categorization that runs before Cortex CLASSIFY_TEXT:
+- Merchant-id map for single-category merchants (DoorDash -> food_dining)
+- All category keywords compiled into one multi-pattern matcher
+- Whole batches classified in-process; unmatched / low-confidence rows go to Cortex
+- Counters for the fraction of rows the fast path resolved
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+FAST_PATH_CONFIG = {
+    "enabled": os.getenv("FAST_PATH_ENABLED", "true").lower() not in ("0", "false", "no"),
+    "min_confidence": float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.6")),
+}
+
+# Knot merchant_id -> category, only for merchants that sell a single kind of thing
+MERCHANT_CATEGORIES = {
+    10: "travel",          # Uber (rideshare)
+    13: "entertainment",   # Spotify
+    19: "food_dining",     # DoorDash
+    38: "food_dining",     # Grubhub
+}
+MERCHANT_CONFIDENCE = 0.95
+
+# Category -> keywords matched on whole words in product_text + merchant_name
+KEYWORD_RULES = {
+    "food_dining": [
+        "restaurant", "pizza", "burger", "burrito", "taco", "sushi", "ramen", "pad thai", "noodles",
+        "sandwich", "salad", "wings", "fries", "coffee", "latte", "espresso", "cafe", "bakery",
+        "bagel", "donut", "doordash", "grubhub", "uber eats", "ubereats", "chipotle", "starbucks",
+    ],
+    "groceries": [
+        "grocery", "groceries", "supermarket", "whole foods", "trader joe's", "safeway", "kroger",
+        "instacart", "produce", "milk", "eggs", "bananas", "avocados",
+    ],
+    "gas_auto": [
+        "gas station", "fuel", "gasoline", "diesel", "chevron", "exxon", "car wash", "oil change",
+        "motor oil", "tire", "tires", "auto parts", "windshield",
+    ],
+    "travel": [
+        "airline", "airlines", "flight", "hotel", "airbnb", "lyft", "rideshare", "uber trip",
+        "rental car", "hertz", "expedia", "boarding pass",
+    ],
+    "entertainment": [
+        "netflix", "hulu", "spotify", "disney+", "disney plus", "movie", "cinema", "concert",
+        "ticketmaster", "playstation", "xbox", "nintendo", "video game", "streaming",
+    ],
+    "healthcare": [
+        "pharmacy", "cvs", "walgreens", "prescription", "vitamin", "vitamins", "ibuprofen",
+        "tylenol", "bandages", "dental", "medical", "first aid",
+    ],
+    "services": [
+        "utility", "electric bill", "water bill", "internet bill", "phone bill", "insurance",
+        "tuition", "dmv",
+    ],
+    "home": [
+        "furniture", "ikea", "home depot", "lowe's", "mattress", "sofa", "lamp", "drill",
+        "paint", "vacuum", "cookware", "bedding", "curtains",
+    ],
+    "shopping": [
+        "headphones", "earbuds", "charger", "usb", "cable", "phone case", "laptop", "keyboard",
+        "t-shirt", "shirt", "jeans", "sneakers", "shoes", "backpack", "book",
+    ],
+}
+
+
+class FastPathClassifier:
+    """Merchant map + one compiled keyword matcher over the spend categories"""
+
+    def __init__(self, categories: Iterable[str], merchant_categories: Dict[int, str] = None,
+                 keyword_rules: Dict[str, List[str]] = None, min_confidence: float = None):
+        allowed = set(categories)
+        self.min_confidence = FAST_PATH_CONFIG["min_confidence"] if min_confidence is None else min_confidence
+        self.merchant_categories = {
+            merchant_id: category
+            for merchant_id, category in (merchant_categories or MERCHANT_CATEGORIES).items()
+            if category in allowed
+        }
+        self.keyword_categories: Dict[str, str] = {}
+        for category, keywords in (keyword_rules or KEYWORD_RULES).items():
+            if category not in allowed:
+                continue
+            for keyword in keywords:
+                self.keyword_categories[keyword.lower()] = category
+
+        # One alternation, longest keywords first so "uber eats" wins over shorter overlaps;
+        # the regex engine scans each text once for every pattern
+        alternation = "|".join(re.escape(k) for k in sorted(self.keyword_categories, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<![\w])(?:{alternation})(?![\w])") if alternation else None
+
+        self._lock = threading.Lock()
+        self._stats = {"rows": 0, "merchant_hits": 0, "keyword_hits": 0, "low_confidence": 0, "unmatched": 0}
+
+    def match(self, product_text: Optional[str], merchant_name: Optional[str],
+              merchant_id: Optional[int] = None) -> Optional[Tuple[str, float, str]]:
+        """(category, confidence, source) for one row, or None if no rule applies"""
+        if merchant_id is not None and merchant_id in self.merchant_categories:
+            return self.merchant_categories[merchant_id], MERCHANT_CONFIDENCE, "merchant"
+        if self._pattern is None:
+            return None
+        text = f"{product_text or ''} {merchant_name or ''}".lower()
+        votes = Counter(self.keyword_categories[m] for m in self._pattern.findall(text))
+        if not votes:
+            return None
+        (category, top), total = votes.most_common(1)[0], sum(votes.values())
+        # Agreement across keywords raises confidence; conflicting keywords lower it
+        confidence = round((top / total) * min(0.9, 0.6 + 0.1 * top), 4)
+        return category, confidence, "keyword"
+
+    def classify_many(self, rows: Iterable[tuple]) -> Tuple[Dict[str, Tuple[str, float]], List[tuple]]:
+        """Split (id, product_text, merchant_name, merchant_id) rows into fast-path labels and leftovers.
+
+        Returns ({id: (category, confidence)}, remaining rows for Cortex).
+        """
+        labels: Dict[str, Tuple[str, float]] = {}
+        remaining: List[tuple] = []
+        counts = Counter()
+        for row in rows:
+            tx_id, product_text, merchant_name, merchant_id = row
+            result = self.match(product_text, merchant_name, merchant_id)
+            if result is None:
+                counts["unmatched"] += 1
+                remaining.append(row)
+            elif result[1] < self.min_confidence:
+                counts["low_confidence"] += 1
+                remaining.append(row)
+            else:
+                counts[f"{result[2]}_hits"] += 1
+                labels[tx_id] = (result[0], result[1])
+            counts["rows"] += 1
+        with self._lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+        return labels, remaining
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resolved = self._stats["merchant_hits"] + self._stats["keyword_hits"]
+            rows = self._stats["rows"]
+            return {
+                "resolved": resolved,
+                "resolved_fraction": round(resolved / rows, 4) if rows else 0.0,
+                "keywords": len(self.keyword_categories),
+                "merchants": len(self.merchant_categories),
+                **self._stats,
+            }
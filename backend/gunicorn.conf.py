@@ -0,0 +1,47 @@
+"""
+Gunicorn settings for Dime (production serving)
+- Pre-fork workers x threads, configurable from the environment
+- Snowflake pools, job workers and the warehouse poller start in each worker after fork
+- Interrupted jobs are recovered once, by the master, before workers start
+- Graceful drain on SIGTERM: in-flight requests finish, then job workers stop and sessions close
+"""
+
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("DIME_BIND", "0.0.0.0:5001")
+# Each worker has its own in-memory caches. Invalidations reach the other workers through the
+# cache_versions table in the jobs SQLite file, so every worker must see the same JOBS_DB_PATH
+# (see README "Caches and multiple workers").
+workers = int(os.getenv("DIME_WORKERS", "2"))
+# Requests mostly wait on Snowflake / Knot, so threads carry the concurrency.
+# Keep SNOWFLAKE_POOL_SIZE >= threads so a worker's threads don't queue for connections.
+worker_class = "gthread"
+threads = int(os.getenv("DIME_THREADS", "8"))
+timeout = int(os.getenv("DIME_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("DIME_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Loading the app in the master is safe (post_worker_init resets inherited state) and
+# shares imported modules copy-on-write, but off by default so code reloads per worker
+preload_app = os.getenv("DIME_PRELOAD", "false").lower() in ("1", "true", "yes")
+accesslog = os.getenv("DIME_ACCESS_LOG", "-")
+
+
+def when_ready(server):
+    """Master: requeue jobs a previous deployment left 'running' (workers must not, they'd steal live jobs)"""
+    from jobs import JobQueue
+    recovered = JobQueue().recover_interrupted()
+    server.log.info(f"Recovered {recovered} interrupted jobs")
+
+
+def post_worker_init(worker):
+    """Worker, after fork and app load: fresh per-process state, then background threads"""
+    from app import reset_after_fork, start_background_workers
+    reset_after_fork()
+    start_background_workers(recover_jobs=False)
+
+
+def worker_exit(server, worker):
+    """Worker shutting down (requests already drained): let running jobs finish, close sessions"""
+    from app import drain_background_workers
+    drain_background_workers(timeout=max(1.0, graceful_timeout - 5))
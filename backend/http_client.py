@@ -0,0 +1,192 @@
+"""
+Outbound HTTP Client for Dime
+
+One requests-based client for every third-party call (Knot, Nessie, Photon):
+- Keep-alive connection pool per service / host
+- Connect + read timeouts on every call
+- Jittered exponential retry for idempotent calls (connection errors, timeouts, 429/502/503/504)
+- Per-host circuit breaker: after repeated failures calls fail fast until a probe succeeds
+- Latency / error metrics through metrics.InstrumentedAdapter
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import InstrumentedAdapter, registry as metrics_registry
+
+HTTP_CLIENT_CONFIG = {
+    "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    "read_timeout": float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+    "retries": int(os.getenv("HTTP_RETRIES", "2")),
+    "backoff_seconds": float(os.getenv("HTTP_BACKOFF_SECONDS", "0.25")),
+    "max_backoff_seconds": float(os.getenv("HTTP_MAX_BACKOFF_SECONDS", "5")),
+    "pool_maxsize": int(os.getenv("HTTP_POOL_MAXSIZE", "10")),
+    # Consecutive failures that open a host's breaker, and how long it stays open
+    "breaker_failures": int(os.getenv("HTTP_BREAKER_FAILURES", "5")),
+    "breaker_reset_seconds": float(os.getenv("HTTP_BREAKER_RESET_SECONDS", "30")),
+}
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a host whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open (one probe) after a cool-down"""
+
+    def __init__(self, host: str, failure_threshold: int = None, reset_seconds: float = None):
+        self.host = host
+        self.failure_threshold = max(1, failure_threshold or HTTP_CLIENT_CONFIG["breaker_failures"])
+        self.reset_seconds = HTTP_CLIENT_CONFIG["breaker_reset_seconds"] if reset_seconds is None else reset_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"Circuit open for {self.host}")
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    raise CircuitOpenError(f"Circuit half-open for {self.host}, probe in flight")
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 Circuit opened for {self.host} after {self.failures} failures")
+                    metrics_registry.inc("dime_outbound_circuit_opens_total", "Times a host's circuit breaker opened",
+                                         host=self.host)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def _breaker_gauge() -> Dict[tuple, float]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {(("host", b.host),): 0 if b.state == "closed" else 1 for b in breakers}
+
+
+metrics_registry.gauge("dime_outbound_circuit_open", "1 while a host's circuit breaker is open or half-open",
+                       _breaker_gauge)
+
+
+class HttpClient:
+    """Session wrapper adding timeouts, retries and circuit breaking for one service"""
+
+    def __init__(self, service: str, base_url: str = None, auth: Any = None, headers: Dict[str, str] = None,
+                 timeout: Tuple[float, float] = None, retries: int = None, pool_maxsize: int = None):
+        self.service = service
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout or (HTTP_CLIENT_CONFIG["connect_timeout"], HTTP_CLIENT_CONFIG["read_timeout"])
+        self.retries = HTTP_CLIENT_CONFIG["retries"] if retries is None else retries
+        self.session = requests.Session()
+        if auth is not None:
+            self.session.auth = auth
+        if headers:
+            self.session.headers.update(headers)
+        pool_maxsize = pool_maxsize or HTTP_CLIENT_CONFIG["pool_maxsize"]
+        for scheme in ("http://", "https://"):
+            # Retries are handled here (with the breaker), not by urllib3
+            self.session.mount(scheme, InstrumentedAdapter(service, pool_connections=4, pool_maxsize=pool_maxsize,
+                                                           max_retries=0))
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None,
+                timeout: Tuple[float, float] = None, **kwargs) -> requests.Response:
+        """Send with retries (idempotent calls only; pass idempotent=True for read-only POSTs)"""
+        method = method.upper()
+        if self.base_url and not url.startswith(("http://", "https://")):
+            url = f"{self.base_url}/{url.lstrip('/')}"
+        retryable = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        attempts = 1 + (self.retries if retryable else 0)
+        breaker = breaker_for(urlparse(url).netloc)
+
+        for attempt in range(attempts):
+            breaker.before_call()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except Exception:
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                self._sleep_before_retry(attempt, url)
+                continue
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                self._sleep_before_retry(attempt, url, retry_after)
+                continue
+            return response
+        raise AssertionError("unreachable")
+
+    def _sleep_before_retry(self, attempt: int, url: str, retry_after: Optional[str] = None) -> None:
+        delay = min(HTTP_CLIENT_CONFIG["max_backoff_seconds"], HTTP_CLIENT_CONFIG["backoff_seconds"] * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.5)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), HTTP_CLIENT_CONFIG["max_backoff_seconds"]))
+        metrics_registry.inc("dime_outbound_retries_total", "Outbound HTTP retries by service",
+                             service=self.service)
+        print(f"🔁 Retrying {self.service} call to {urlparse(url).path} in {delay:.2f}s (attempt {attempt + 2})")
+        time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_clients: Dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service: str, **kwargs) -> HttpClient:
+    """Process-wide client per service (kwargs only apply on first creation)"""
+    client = _clients.get(service)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = HttpClient(service, **kwargs)
+    return client
@@ -0,0 +1,372 @@
+"""
+Background Job Queue for Dime
+
+In-process worker pool for post-ingest work (categorization, points):
+- Durable SQLite store, so pending jobs survive a restart
+- Per-user ordering (a user's jobs run one at a time, oldest first)
+- Retry with exponential backoff and jitter
+- Job status lookups for /api/jobs/<id>
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from db_pool import background_lane
+from metrics import current_route
+
+JOBS_CONFIG = {
+    "db_path": os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")),
+    "workers": int(os.getenv("JOBS_WORKERS", "4")),
+    "max_attempts": int(os.getenv("JOBS_MAX_ATTEMPTS", "5")),
+    "backoff_seconds": float(os.getenv("JOBS_BACKOFF_SECONDS", "2")),
+    "max_backoff_seconds": float(os.getenv("JOBS_MAX_BACKOFF_SECONDS", "300")),
+}
+
+# kind -> handler(payload, user_id) -> JSON-serializable result
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], Optional[str]], Any]] = {}
+
+
+def job_handler(kind: str):
+    """Register a function as the handler for a job kind"""
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by a pool of worker threads"""
+
+    def __init__(self, db_path: str = None, workers: int = None):
+        self.db_path = db_path or JOBS_CONFIG["db_path"]
+        self.num_workers = max(1, workers or JOBS_CONFIG["workers"])
+        self._wakeup = threading.Condition()
+        self._claim_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._setup()
+
+    # ========== Storage ==========
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _setup(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    kind TEXT NOT NULL,
+                    user_id TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, run_after)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_idx ON jobs (user_id, status)")
+        finally:
+            conn.close()
+
+    # ========== Public API ==========
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], user_id: Optional[str] = None, max_attempts: int = None) -> str:
+        """Persist a job and wake a worker; returns the job id"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                INSERT INTO jobs (id, kind, user_id, payload, status, attempts, max_attempts, run_after, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+            """, (job_id, kind, user_id, json.dumps(payload), max_attempts or JOBS_CONFIG["max_attempts"], now, now, now))
+        finally:
+            conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status, attempts and result"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._to_dict(row) if row else None
+
+    def list(self, user_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """List recent jobs, newest first"""
+        query = "SELECT * FROM jobs WHERE 1 = 1"
+        params: List[Any] = []
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [self._to_dict(row) for row in rows]
+
+    def active(self, kind: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Queued or running jobs of one kind (optionally for one user), oldest first"""
+        query = "SELECT * FROM jobs WHERE kind = ? AND status IN ('queued', 'running')"
+        params: List[Any] = [kind]
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + " ORDER BY seq", params).fetchall()
+        finally:
+            conn.close()
+        return [self._to_dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return {row[0]: row[1] for row in rows}
+
+    # ========== Workers ==========
+
+    def recover_interrupted(self) -> int:
+        """Requeue jobs left 'running' by a previous process (they were interrupted mid-flight)"""
+        conn = self._connect()
+        try:
+            return conn.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                                (time.time(),)).rowcount
+        finally:
+            conn.close()
+
+    def start(self, recover: bool = True):
+        """Recover interrupted jobs (unless another process owns recovery) and start the worker threads"""
+        if self._threads:
+            return
+        if recover:
+            self.recover_interrupted()
+        self._stopping = False
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🧵 Job queue started with {self.num_workers} workers ({self.db_path})")
+
+    def stop(self, timeout: float = 30.0):
+        """Stop claiming new jobs and wait for running ones to finish"""
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _worker_loop(self):
+        while not self._stopping:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            self._run(job)
+            # Finishing a job may unblock the same user's next one
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically mark the next runnable job as running.
+
+        A job is runnable when its backoff has elapsed and no older queued or
+        running job exists for the same user.
+        """
+        now = time.time()
+        with self._claim_lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("""
+                    SELECT * FROM jobs j
+                    WHERE j.status = 'queued' AND j.run_after <= ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM jobs k
+                          WHERE k.user_id = j.user_id
+                            AND (k.status = 'running' OR (k.status = 'queued' AND k.seq < j.seq))
+                      )
+                    ORDER BY j.seq
+                    LIMIT 1
+                """, (now,)).fetchone()
+                if row is not None:
+                    conn.execute("""
+                        UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                        WHERE seq = ?
+                    """, (now, row["seq"]))
+                conn.execute("COMMIT")
+                return row
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def _run(self, job: sqlite3.Row):
+        attempts = job["attempts"] + 1
+        handler = JOB_HANDLERS.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind {job['kind']}")
+            # Labels metrics and Snowflake QUERY_TAG for everything the handler does
+            token = current_route.set(f"job:{job['kind']}")
+            try:
+                # Snowflake connections come from the background pool, never the interactive one
+                with background_lane():
+                    result = handler(json.loads(job["payload"]), job["user_id"])
+            finally:
+                current_route.reset(token)
+            self._finish(job["seq"], "succeeded", result=result)
+        except Exception as e:
+            print(f"⚠️  Job {job['id']} ({job['kind']}) attempt {attempts} failed: {e}")
+            if attempts < job["max_attempts"]:
+                delay = min(JOBS_CONFIG["max_backoff_seconds"], JOBS_CONFIG["backoff_seconds"] * (2 ** (attempts - 1)))
+                delay *= random.uniform(0.5, 1.5)
+                self._finish(job["seq"], "queued", error=str(e), run_after=time.time() + delay)
+            else:
+                traceback.print_exc()
+                self._finish(job["seq"], "failed", error=str(e))
+
+    def _finish(self, seq: int, status: str, result: Any = None, error: str = None, run_after: float = None):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE jobs
+                SET status = ?, result = ?, error = ?, run_after = COALESCE(?, run_after), updated_at = ?
+                WHERE seq = ?
+            """, (status, json.dumps(result) if result is not None else None, error, run_after, now, seq))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "user_id": row["user_id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "next_attempt_at": row["run_after"] if row["status"] == "queued" else None,
+        }
+
+
+# ========== Job Handlers ==========
+
+@job_handler("categorize_and_points")
+def categorize_and_points(payload: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    """Embed and categorize freshly ingested transactions, then recalculate their points"""
+    from snowflake_db import get_db
+    db = get_db()
+    tx_ids = payload.get("tx_ids", [])
+    # One rollup refresh for the whole job
+    with db.deferred_rollup():
+        embedded = db.embed_transactions(tx_ids)
+        categorized = db.categorize_transactions_batch(tx_ids, user_id=user_id)
+        points = db.recalculate_all_points(user_id=user_id, tx_ids=tx_ids)
+    return {
+        "transactions": len(tx_ids),
+        "embedded_texts": embedded["embedded_texts"],
+        "categorized": categorized["categorized"],
+        "points_calculated": points["points_calculated"],
+    }
+
+
+@job_handler("categorize_all")
+def categorize_all(payload: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    """Categorize every pending transaction (fast path, result cache, chunked CLASSIFY_TEXT) and recalculate points"""
+    from snowflake_db import get_db
+    return get_db().process_all_uncategorized(user_id, payload.get("chunk_size"))
+
+
+@job_handler("classify_unclassified")
+def classify_unclassified(payload: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    """Vector-classify every row without a category (local matrix first), honouring min_confidence"""
+    from snowflake_db import get_db
+    db = get_db()
+    with db.deferred_rollup():
+        return db.classify_all_unclassified(payload.get("min_confidence"))
+
+
+@job_handler("backfill_column")
+def backfill_column(payload: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+    """Drive a chunked column backfill from its checkpoint until done or paused"""
+    from backfill import run_backfill
+    from snowflake_db import get_db
+    db = get_db()
+    name = payload["name"]
+    try:
+        return run_backfill(db, name)
+    except Exception as e:
+        db.save_backfill_checkpoint(name, "failed", error=str(e))
+        raise
+
+
+# Singleton queue (one per process)
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+def get_queue(recover: bool = True) -> JobQueue:
+    """Get the process-wide job queue, starting its workers on first use"""
+    global _queue_instance
+    if _queue_instance is None:
+        with _queue_lock:
+            if _queue_instance is None:
+                queue = JobQueue()
+                queue.start(recover=recover)
+                _queue_instance = queue
+    return _queue_instance
+
+
+def reset_queue_after_fork() -> None:
+    """Forget a queue inherited from the parent process (its worker threads did not survive fork)"""
+    global _queue_instance, _queue_lock
+    _queue_lock = threading.Lock()
+    _queue_instance = None
+
+
+def shutdown_queue(timeout: float = 30.0) -> None:
+    """Stop claiming jobs and wait up to timeout for running ones"""
+    if _queue_instance is not None:
+        _queue_instance.stop(timeout)
@@ -0,0 +1,87 @@
+"""
+Load Test for Dime
+
+Tiny closed-loop HTTP load generator (stdlib only) for comparing serving modes:
+- N client threads, each with a keep-alive connection, for a fixed duration
+- Requests/second plus p50 / p95 / p99 latency per endpoint
+- Usage: python loadtest.py http://127.0.0.1:5001 / /api/snowflake/pool --concurrency 16 --seconds 10
+"""
+
+import argparse
+import http.client
+import threading
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(base_url: str, path: str, concurrency: int, seconds: float) -> Dict[str, Any]:
+    """Hammer one path from concurrency threads for seconds; returns throughput and latency"""
+    target = urlparse(base_url)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        local, failed = [], 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except Exception:
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Closed-loop HTTP load test")
+    parser.add_argument("base_url")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'path':<32} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for path in args.paths:
+        result = run(args.base_url, path, args.concurrency, args.seconds)
+        print(f"{result['path']:<32} {result['rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['errors']:>7}")
@@ -0,0 +1,243 @@
+"""
+Metrics for Dime
+
+In-process latency / count instrumentation exposed in Prometheus text format:
+- Flask request latency per endpoint (before/after request hooks)
+- Snowflake statement latency, row counts and errors per SnowflakeDB method
+- Outbound HTTP latency and errors per service (Knot, Nessie, Photon) and calling route
+- The current route, for Snowflake QUERY_TAG and labels, in a context variable
+- Per process: under gunicorn each worker reports its own series (scrape each worker,
+  or aggregate by instance)
+"""
+
+import contextvars
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+
+METRICS_CONFIG = {
+    "enabled": os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no"),
+    # Histogram bucket upper bounds, in seconds
+    "buckets": tuple(float(b) for b in os.getenv(
+        "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")),
+    "query_tag_prefix": os.getenv("SNOWFLAKE_QUERY_TAG_PREFIX", "dime"),
+}
+
+# Route (Flask endpoint or background job kind) the current thread is working for
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("current_route", default="unknown")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by metric name + label set"""
+
+    def __init__(self, buckets: Tuple[float, ...] = None):
+        self.buckets = tuple(sorted(buckets or METRICS_CONFIG["buckets"]))
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        # name -> labels -> [bucket counts..., sum, count]
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[LabelKey, float]]] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, help_text: str, value: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, help_text: str, seconds: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Dict[LabelKey, float]]) -> None:
+        """Register a gauge read at scrape time; collect() returns {label key: value}"""
+        with self._lock:
+            self._help[name] = ("gauge", help_text)
+            self._gauges[name] = collect
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+            gauges = dict(self._gauges)
+            help_by_name = dict(self._help)
+
+        lines: List[str] = []
+        for name in sorted(help_by_name):
+            kind, help_text = help_by_name[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for key, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            elif kind == "histogram":
+                for key, values in sorted(histograms.get(name, {}).items()):
+                    for bound, count in zip(self.buckets, values):
+                        lines.append(f"{name}_bucket{_labels(key, le=_number(bound))} {_number(count)}")
+                    lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {_number(values[-1])}")
+                    lines.append(f"{name}_sum{_labels(key)} {values[-2]:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {_number(values[-1])}")
+            else:
+                try:
+                    for key, value in sorted(gauges[name]().items()):
+                        lines.append(f"{name}{_labels(key)} {_number(value)}")
+                except Exception as e:
+                    lines.append(f"# gauge {name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = MetricsRegistry()
+
+
+# ========== Snowflake ==========
+
+def observe_query(method: str, seconds: float, rows: Optional[int], error: bool) -> None:
+    if not METRICS_CONFIG["enabled"]:
+        return
+    registry.observe("dime_snowflake_query_seconds", "Snowflake statement latency by SnowflakeDB method",
+                     seconds, method=method)
+    if rows is not None and rows >= 0:
+        registry.inc("dime_snowflake_query_rows_total", "Rows returned or affected by SnowflakeDB method",
+                     rows, method=method)
+    if error:
+        registry.inc("dime_snowflake_query_errors_total", "Failed Snowflake statements by SnowflakeDB method",
+                     method=method)
+
+
+class TimedCursor:
+    """Cursor proxy that records latency, rows and errors for every execute"""
+
+    def __init__(self, cursor: Any, method: str):
+        self._cursor = cursor
+        self._method = method
+
+    def _timed(self, fn: Callable, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            observe_query(self._method, time.perf_counter() - started, None, True)
+            raise
+        observe_query(self._method, time.perf_counter() - started, getattr(self._cursor, "rowcount", None), False)
+        return result
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, *args, **kwargs)
+
+    def execute_async(self, *args, **kwargs):
+        return self._timed(self._cursor.execute_async, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def query_tag() -> str:
+    """QUERY_TAG for statements issued on behalf of the current route"""
+    return f"{METRICS_CONFIG['query_tag_prefix']}:{current_route.get()}"
+
+
+# ========== Outbound HTTP ==========
+
+class InstrumentedAdapter(HTTPAdapter):
+    """requests transport adapter that times every call for one upstream service"""
+
+    def __init__(self, service: str, *args, **kwargs):
+        self.service = service
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        route = current_route.get()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception as e:
+            self._record(route, request.method, time.perf_counter() - started, type(e).__name__)
+            raise
+        self._record(route, request.method, time.perf_counter() - started,
+                     None if response.status_code < 500 else f"http_{response.status_code}")
+        return response
+
+    def _record(self, route: str, verb: str, seconds: float, error: Optional[str]) -> None:
+        if not METRICS_CONFIG["enabled"]:
+            return
+        registry.observe("dime_outbound_request_seconds", "Outbound HTTP latency by service and calling route",
+                         seconds, service=self.service, route=route, verb=verb)
+        if error:
+            registry.inc("dime_outbound_errors_total", "Outbound HTTP failures (exceptions and 5xx)",
+                         service=self.service, route=route, reason=error)
+
+
+# ========== Flask ==========
+
+def init_app(app) -> None:
+    """Time every request and tag the thread with its route for the duration"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        g._metrics_token = current_route.set(request.endpoint or "unmatched")
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None and METRICS_CONFIG["enabled"]:
+            endpoint = request.endpoint or "unmatched"
+            registry.observe("dime_http_request_seconds", "Request latency by Flask endpoint",
+                             time.perf_counter() - started, endpoint=endpoint, method=request.method)
+            registry.inc("dime_http_requests_total", "Requests by Flask endpoint and status class",
+                         endpoint=endpoint, status=f"{response.status_code // 100}xx")
+        return response
+
+    @app.teardown_request
+    def _reset_route(exc):
+        token = g.pop("_metrics_token", None)
+        if token is not None:
+            current_route.reset(token)
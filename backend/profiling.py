@@ -0,0 +1,205 @@
+"""
+Request Profiling for Dime
+
+Opt-in per-request CPU and allocation profiling:
+- Triggered by the X-Dime-Profile header or a random sampling rate
+- cProfile for the request thread + tracemalloc allocation diff (one request at a time;
+  concurrent triggers run unprofiled)
+- Keeps the N slowest profiled requests in memory for /api/admin/profiles
+- Hooks are only installed when PROFILING_ENABLED is set, so disabled means zero overhead
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List, Optional
+
+PROFILING_CONFIG = {
+    "enabled": os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes"),
+    # Fraction of requests profiled without the header (0 = header only)
+    "sample_rate": float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    "header": os.getenv("PROFILING_HEADER", "X-Dime-Profile"),
+    # When set, the header value must match and the admin endpoints require it too
+    "token": os.getenv("PROFILING_TOKEN", ""),
+    "keep": int(os.getenv("PROFILING_KEEP", "20")),
+    "top_functions": int(os.getenv("PROFILING_TOP_FUNCTIONS", "40")),
+    "top_allocations": int(os.getenv("PROFILING_TOP_ALLOCATIONS", "15")),
+    "tracemalloc_frames": int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1")),
+}
+
+
+class SlowestProfiles:
+    """Bounded store that keeps the N slowest captured profiles"""
+
+    def __init__(self, keep: int = None):
+        self.keep = max(1, keep or PROFILING_CONFIG["keep"])
+        self._lock = threading.Lock()
+        self._profiles: List[Dict[str, Any]] = []
+        self._stats = {"captured": 0, "kept": 0, "dropped": 0, "skipped_busy": 0}
+
+    def add(self, profile: Dict[str, Any]) -> bool:
+        """Store a profile if it ranks among the slowest; returns whether it was kept"""
+        with self._lock:
+            self._stats["captured"] += 1
+            if len(self._profiles) >= self.keep:
+                fastest = min(self._profiles, key=lambda p: p["duration_ms"])
+                if fastest["duration_ms"] >= profile["duration_ms"]:
+                    self._stats["dropped"] += 1
+                    return False
+                self._profiles.remove(fastest)
+                self._stats["dropped"] += 1
+            self._profiles.append(profile)
+            self._stats["kept"] = len(self._profiles)
+            return True
+
+    def skip_busy(self) -> None:
+        """Count a triggered request that ran unprofiled because another one was being profiled"""
+        with self._lock:
+            self._stats["skipped_busy"] += 1
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries, slowest first"""
+        with self._lock:
+            profiles = sorted(self._profiles, key=lambda p: p["duration_ms"], reverse=True)
+        return [{k: v for k, v in p.items() if k not in ("stats_text", "allocations", "prof")} for p in profiles]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+            self._stats["kept"] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": PROFILING_CONFIG["enabled"], "keep": self.keep,
+                    "sample_rate": PROFILING_CONFIG["sample_rate"], **self._stats}
+
+
+profiles = SlowestProfiles()
+
+# cProfile (one active profiler per interpreter on 3.12+) and tracemalloc are process-wide,
+# so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def authorized(value: Optional[str]) -> bool:
+    """Header / admin token check (open when no PROFILING_TOKEN is configured)"""
+    return not PROFILING_CONFIG["token"] or value == PROFILING_CONFIG["token"]
+
+
+def _should_profile(request) -> Optional[str]:
+    """'header' / 'sample' when this request should be profiled, else None"""
+    header = request.headers.get(PROFILING_CONFIG["header"])
+    if header is not None and authorized(header):
+        return "header"
+    if PROFILING_CONFIG["sample_rate"] > 0 and random.random() < PROFILING_CONFIG["sample_rate"]:
+        return "sample"
+    return None
+
+
+def _stats_text(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(PROFILING_CONFIG["top_functions"])
+    return out.getvalue()
+
+
+def _allocation_diff(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    diff = after.compare_to(before, "lineno")
+    return [{
+        "location": str(stat.traceback[0]) if stat.traceback else "?",
+        "size_kb": round(stat.size_diff / 1024, 1),
+        "count": stat.count_diff,
+    } for stat in diff[:PROFILING_CONFIG["top_allocations"]]]
+
+
+def _release_profiling() -> None:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _profile_lock.release()
+
+
+def init_app(app) -> None:
+    """Install profiling hooks (no-op unless PROFILING_ENABLED)"""
+    if not PROFILING_CONFIG["enabled"]:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        trigger = _should_profile(request)
+        if trigger is None:
+            return
+        if not _profile_lock.acquire(blocking=False):
+            profiles.skip_busy()
+            return
+        try:
+            profiler = cProfile.Profile()
+            tracemalloc.start(PROFILING_CONFIG["tracemalloc_frames"])
+            g._profile_malloc = tracemalloc.take_snapshot()
+            profiler.enable()
+        except Exception as e:
+            # e.g. a profiler started outside this module is already active
+            print(f"⚠️  Profiling skipped: {e}")
+            _release_profiling()
+            g.pop("_profile_malloc", None)
+            return
+        g._profile_trigger = trigger
+        g._profile_started = time.perf_counter()
+        g._profiler = profiler
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop("_profiler", None)
+        if profiler is None:
+            return response
+        try:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - g.pop("_profile_started")) * 1000
+            allocations = _allocation_diff(g.pop("_profile_malloc"), tracemalloc.take_snapshot())
+        finally:
+            _release_profiling()
+
+        profiler.create_stats()
+        # Serialize before pstats.Stats() takes ownership of (and empties) profiler.stats
+        prof = marshal.dumps(profiler.stats)
+        profile_id = str(uuid.uuid4())
+        kept = profiles.add({
+            "id": profile_id,
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "status": response.status_code,
+            "trigger": g.pop("_profile_trigger", None),
+            "duration_ms": round(duration_ms, 2),
+            "captured_at": time.time(),
+            "stats_text": _stats_text(profiler),
+            "allocations": allocations,
+            # marshal of pstats data: the same bytes cProfile's dump_stats() writes
+            "prof": prof,
+        })
+        if kept:
+            response.headers["X-Dime-Profile-Id"] = profile_id
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request didn't run (unhandled error): stop profiling and release the lock
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            g.pop("_profile_malloc", None)
+            _release_profiling()
+
+    print(f"🔬 Request profiling enabled (header {PROFILING_CONFIG['header']}, "
+          f"sample rate {PROFILING_CONFIG['sample_rate']}, keeping {profiles.keep})")
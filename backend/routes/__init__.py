@@ -9,6 +9,9 @@ from .cards import cards_bp
 from .analytics import analytics_bp
 from .chat import chat_bp
 from .nessie import nessie_bp
+from .jobs import jobs_bp
+from .items import items_bp
+from .admin import admin_bp
 
 __all__ = [
     'knot_bp',
@@ -17,5 +20,8 @@ __all__ = [
     'cards_bp',
     'analytics_bp',
     'chat_bp',
-    'nessie_bp'
+    'nessie_bp',
+    'jobs_bp',
+    'items_bp',
+    'admin_bp'
 ]
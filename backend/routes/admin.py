@@ -0,0 +1,57 @@
+"""
+Admin Routes
+- Captured request profiles (slowest N): list, detail, .prof download, clear
+"""
+
+from flask import Blueprint, Response, request, jsonify
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+
+def _check_access():
+    """None when allowed, else an error response (profiling off or bad token)"""
+    from profiling import PROFILING_CONFIG, authorized
+    if not PROFILING_CONFIG["enabled"]:
+        return jsonify({"error": "Profiling disabled (set PROFILING_ENABLED=true)"}), 404
+    if not authorized(request.headers.get(PROFILING_CONFIG["header"]) or request.args.get("token")):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    return None
+
+
+@admin_bp.route("/profiles", methods=["GET", "DELETE"])
+def list_profiles():
+    """Slowest profiled requests, slowest first (DELETE clears them)"""
+    denied = _check_access()
+    if denied:
+        return denied
+    from profiling import profiles
+    if request.method == "DELETE":
+        profiles.clear()
+    return jsonify({"profiles": profiles.list(), "stats": profiles.stats()})
+
+
+@admin_bp.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """One profile: top functions by cumulative time and the allocation diff"""
+    denied = _check_access()
+    if denied:
+        return denied
+    from profiling import profiles
+    profile = profiles.get(profile_id)
+    if not profile:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify({k: v for k, v in profile.items() if k != "prof"})
+
+
+@admin_bp.route("/profiles/<profile_id>/download", methods=["GET"])
+def download_profile(profile_id):
+    """Raw cProfile stats (open with pstats, snakeviz, ...)"""
+    denied = _check_access()
+    if denied:
+        return denied
+    from profiling import profiles
+    profile = profiles.get(profile_id)
+    if not profile:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(profile["prof"], mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.prof"})
@@ -4,6 +4,7 @@ Analytics Routes
 - Cashflow analytics
 - Alerts
 - Spending trends
+- Maintenance (categorize-all, recalculate-points, backfill) as background jobs
 """
 
 from flask import Blueprint, request, jsonify
@@ -21,6 +22,24 @@ def get_snowflake():
         return None
 
 
+def run_async():
+    """Maintenance endpoints return a background job unless ?sync=true is passed"""
+    return request.args.get("sync", "false").lower() != "true"
+
+
+def submit_warehouse_job(db, name, user_id=None):
+    from warehouse_jobs import submit_maintenance
+    job = submit_maintenance(db, name, user_id)
+    return jsonify({"success": True, "async": True, "job": job}), 202
+
+
+def enqueue_job(kind, payload, user_id=None):
+    from jobs import get_queue
+    queue = get_queue()
+    job_id = queue.enqueue(kind, payload, user_id=user_id)
+    return jsonify({"success": True, "async": True, "job": queue.get(job_id)}), 202
+
+
 @analytics_bp.route("/top-of-file", methods=["GET"])
 def top_of_file():
     """Get top of file data - payment methods per merchant"""
@@ -86,11 +105,15 @@ def categorize_all():
     if not db:
         return jsonify({"error": "Snowflake not configured"}), 500
     
-    data = request.json or {}
+    data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
+    chunk_size = int(data["chunk_size"]) if data.get("chunk_size") else None
     
     try:
-        result = db.process_all_uncategorized(user_id)
+        if run_async():
+            # Same chunked pipeline as the sync path, run by the durable job queue
+            return enqueue_job("categorize_all", {"chunk_size": chunk_size}, user_id)
+        result = db.process_all_uncategorized(user_id, chunk_size)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -125,30 +148,8 @@ def spending_by_category():
     days = int(data.get("days", request.args.get("days", 30)))
     
     try:
-        # Uses the new spend_category field
-        conn, cursor = db._get_connection()
-        cursor.execute("""
-            SELECT 
-                COALESCE(spend_category, 'uncategorized') AS category,
-                COUNT(*) AS transaction_count,
-                SUM(total_amount) AS total_spent,
-                SUM(points_earned) AS total_points
-            FROM TRANSACTIONS
-            WHERE user_id = %s
-              AND datetime >= DATEADD(day, -%s, CURRENT_TIMESTAMP())
-            GROUP BY spend_category
-            ORDER BY total_spent DESC
-        """, (user_id, days))
-        
-        rows = cursor.fetchall()
-        categories = []
-        for row in rows:
-            categories.append({
-                "category": row[0],
-                "transaction_count": row[1],
-                "total_spent": float(row[2]) if row[2] else 0,
-                "total_points": int(row[3]) if row[3] else 0
-            })
+        # Uses the new spend_category field (pre-aggregated per day)
+        categories = db.get_spending_by_category(user_id, days)
         
         return jsonify({
             "user_id": user_id,
@@ -167,6 +168,10 @@ def backfill_payment_methods():
         return jsonify({"error": "Snowflake not configured"}), 500
     
     try:
+        if run_async():
+            # Chunked and checkpointed; progress at /api/snowflake/backfills
+            from backfill import start_backfill
+            return jsonify({"success": True, "async": True, "backfill": start_backfill(db, "payment_method")}), 202
         result = db.backfill_payment_methods()
         return jsonify(result)
     except Exception as e:
@@ -180,8 +185,13 @@ def recalculate_points():
     if not db:
         return jsonify({"error": "Snowflake not configured"}), 500
     
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+    
     try:
-        result = db.recalculate_all_points()
+        if run_async():
+            return submit_warehouse_job(db, "recalculate_points", user_id)
+        result = db.recalculate_all_points(user_id)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -189,7 +199,7 @@ def recalculate_points():
 
 @analytics_bp.route("/transactions", methods=["GET"])
 def get_transactions():
-    """Get raw transactions list from Snowflake"""
+    """Get a keyset-paginated transactions list from Snowflake (cursor, fields, include_raw)"""
     db = get_snowflake()
     if not db:
         return jsonify({"error": "Snowflake not configured", "transactions": []}), 500
@@ -197,13 +207,19 @@ def get_transactions():
     user_id = request.args.get("user_id", "aman")
     merchant_id = request.args.get("merchant_id")
     limit = int(request.args.get("limit", 100))
+    cursor = request.args.get("cursor")
+    include_raw = request.args.get("include_raw", "").lower() in ("1", "true", "yes")
+    fields = request.args.get("fields")
+    fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
 
     try:
         if merchant_id:
             merchant_id = int(merchant_id)
 
-        transactions = db.get_transactions(user_id, merchant_id, limit)
-        return jsonify({"transactions": transactions})
+        page = db.get_transactions_page(user_id, merchant_id, limit, cursor=cursor, include_raw=include_raw, fields=fields)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e), "transactions": []}), 400
     except Exception as e:
         return jsonify({"error": str(e), "transactions": []}), 500
 
@@ -228,19 +244,7 @@ def spending_trends():
         })
 
     try:
-        conn, cursor = db._get_connection()
-        cursor.execute("""
-            SELECT
-                DATE_TRUNC('month', datetime) AS month,
-                SUM(total_amount) AS total_spent
-            FROM TRANSACTIONS
-            WHERE user_id = %s
-              AND datetime >= DATEADD(month, -%s, CURRENT_TIMESTAMP())
-            GROUP BY DATE_TRUNC('month', datetime)
-            ORDER BY month ASC
-        """, (user_id, months))
-
-        rows = cursor.fetchall()
+        rows = db.get_spending_trends(user_id, months)
 
         if not rows:
             return jsonify({
@@ -251,12 +255,12 @@ def spending_trends():
 
         trends = []
         for row in rows:
-            month_date = row[0]
+            month_date = row["month"]
             if isinstance(month_date, str):
                 month_date = datetime.strptime(month_date[:10], "%Y-%m-%d")
             trends.append({
                 "month": month_date.strftime("%b"),
-                "amount": float(row[1]) if row[1] else 0
+                "amount": row["amount"]
             })
 
         return jsonify({
@@ -2,12 +2,17 @@
 Card Management Routes
 - List saved cards
 - Add new card (Encrypted)
-- Optimal card recommendation (Benefits-aware)
+- Optimal card recommendation (Benefits-aware, served from the card index)
+- Batch recommendations for many (merchant, category) pairs
 """
 
 from flask import Blueprint, request, jsonify
 import uuid
 
+from card_index import card_indexes
+
+MAX_BATCH_ITEMS = 500
+
 cards_bp = Blueprint('cards', __name__, url_prefix='/api')
 
 def get_snowflake():
@@ -18,6 +23,15 @@ def get_snowflake():
         print(f"Snowflake not available: {e}")
         return None
 
+def _rebuild_card_index(db, user_id):
+    """Recompile the user's card index after a card change (lazily rebuilt on failure)"""
+    # Bump the shared version first so other workers drop their copy too
+    card_indexes.invalidate(user_id)
+    try:
+        card_indexes.rebuild(db, user_id)
+    except Exception as e:
+        print(f"⚠️  Card index rebuild failed for {user_id}: {e}")
+
 @cards_bp.route("/cards", methods=["GET", "POST"])
 def manage():
     db = get_snowflake()
@@ -35,6 +49,7 @@ def manage():
         try:
             print(f"Adding card for user {user_id}: {data.get('card_number', '')[-4:]}")
             result = db.save_card(data, user_id)
+            _rebuild_card_index(db, user_id)
             return jsonify(result), 201
         except Exception as e:
             import traceback
@@ -63,6 +78,7 @@ def delete_card_route(card_id):
     success = db.delete_card(card_id, user_id)
     
     if success:
+        _rebuild_card_index(db, user_id)
         return jsonify({"success": True}), 200
     else:
         return jsonify({"error": "Failed to delete card"}), 500
@@ -80,69 +96,47 @@ def optimal():
     category = data.get("category", "").lower()
     
     try:
-        cards = db.get_cards(user_id)
-        if not cards:
+        index = card_indexes.get(db, user_id)
+        recommendation = index.recommend(merchant, category, data.get("merchant_id"))
+        if not recommendation:
             return jsonify({"recommendation": None, "message": "No cards found"})
             
-        best_card = None
-        best_score = -1
-        reason = "Default card"
-        
-        # Scoring logic
-        # 1. Benefits match (+10)
-        # 2. Category preference (+5)
-        
-        category_preferences = {
-            "groceries": ["amex", "discover"],
-            "dining": ["amex", "visa"],
-            "travel": ["amex", "visa"],
-            "gas": ["discover", "visa"],
-            "streaming": ["visa", "mastercard"],
-            "shopping": ["amex", "discover"],
-        }
-        
-        preferred_types = category_preferences.get(category, [])
-        
-        for card in cards:
-            score = 0
-            current_reason = "Good general spending card"
-            
-            benefits = card.get("benefits", "").lower()
-            card_type = card.get("card_type", "").lower()
-            
-            # Check benefits text
-            if category and category in benefits:
-                score += 10
-                current_reason = f"Benefits explicitly mention '{category}'"
-            elif "everything" in benefits or "all purchases" in benefits:
-                score += 2
-                current_reason = "Earns on all purchases"
-                
-            # Check card type preference
-            if card_type in preferred_types:
-                score += 5
-                if score < 10: # Don't overwrite specific benefit reason
-                    current_reason = f"{card_type.title()} is typically good for {category}"
-            
-            if score > best_score:
-                best_score = score
-                best_card = card
-                reason = current_reason
-        
-        if not best_card:
-            best_card = cards[0]
-            
         return jsonify({
-            "recommendation": {
-                "card_id": best_card.get("card_id"),
-                "card_type": best_card.get("card_type"),
-                "last_four": best_card.get("last_four"),
-                "reason": reason,
-                "benefits": best_card.get("benefits")
-            },
+            "recommendation": recommendation,
             "merchant": merchant,
             "category": category
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@cards_bp.route("/optimal-card/batch", methods=["POST"])
+def optimal_batch():
+    """Score many (merchant, category) pairs against one card index lookup"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"results": [], "message": "Snowflake not connected"})
+    
+    data = request.json or {}
+    user_id = data.get("user_id", "aman")
+    items = data.get("items", [])
+    if not isinstance(items, list):
+        return jsonify({"error": "items must be a list of {merchant, category}"}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({"error": f"At most {MAX_BATCH_ITEMS} items per batch"}), 400
+    
+    try:
+        index = card_indexes.get(db, user_id)
+        results = []
+        for item in items:
+            merchant = item.get("merchant", "")
+            category = item.get("category", "").lower()
+            results.append({
+                "merchant": merchant,
+                "category": category,
+                "recommendation": index.recommend(merchant, category, item.get("merchant_id")),
+            })
+        return jsonify({"results": results, "count": len(results)})
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
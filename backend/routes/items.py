@@ -0,0 +1,48 @@
+"""
+Item Routes
+- Top purchased products (by spend, quantity or orders)
+- Per-item spend for products matching a name
+"""
+
+from flask import Blueprint, request, jsonify
+
+items_bp = Blueprint('items', __name__, url_prefix='/api/items')
+
+MAX_ITEMS_LIMIT = 100
+
+
+def get_snowflake():
+    try:
+        from snowflake_db import get_db
+        return get_db()
+    except Exception as e:
+        print(f"Snowflake not available: {e}")
+        return None
+
+
+@items_bp.route("/top", methods=["GET", "POST"])
+def top_items():
+    """Top products from TRANSACTION_ITEMS (?sort=spend|quantity|orders, ?q= filters by name)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured", "items": []}), 200
+    
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    user_id = data.get("user_id", request.args.get("user_id", "test_user"))
+    days = int(data.get("days", request.args.get("days", 30)))
+    limit = min(int(data.get("limit", request.args.get("limit", 10))), MAX_ITEMS_LIMIT)
+    sort = data.get("sort", request.args.get("sort", "spend"))
+    name = data.get("q", request.args.get("q"))
+    
+    try:
+        items = db.get_top_items(user_id, days, limit, sort, name)
+        return jsonify({
+            "user_id": user_id,
+            "days": days,
+            "sort": sort,
+            "items": items,
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e), "items": []}), 400
+    except Exception as e:
+        return jsonify({"error": str(e), "items": []}), 200
@@ -0,0 +1,54 @@
+"""
+Background Job Routes
+- Job status lookup
+- Recent jobs listing
+- Async warehouse job status
+"""
+
+from flask import Blueprint, request, jsonify
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+def get_job_queue():
+    """Import the job queue lazily to avoid circular imports"""
+    from jobs import get_queue
+    return get_queue()
+
+
+@jobs_bp.route("", methods=["GET"])
+def list_jobs():
+    """List recent jobs, optionally filtered by user_id and status"""
+    queue = get_job_queue()
+    user_id = request.args.get("user_id")
+    status = request.args.get("status")
+    limit = int(request.args.get("limit", 50))
+    return jsonify({"jobs": queue.list(user_id, status, limit), "counts": queue.stats()})
+
+
+@jobs_bp.route("/warehouse", methods=["GET"])
+def list_warehouse_jobs():
+    """List recent async warehouse jobs"""
+    from warehouse_jobs import get_warehouse_jobs
+    status = request.args.get("status")
+    limit = int(request.args.get("limit", 50))
+    return jsonify({"jobs": get_warehouse_jobs().list(status, limit)})
+
+
+@jobs_bp.route("/warehouse/<job_id>", methods=["GET"])
+def warehouse_job_status(job_id):
+    """Get status, step and query ids for an async warehouse job"""
+    from warehouse_jobs import get_warehouse_jobs
+    job = get_warehouse_jobs().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Get status, attempts and result for a job"""
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
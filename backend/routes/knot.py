@@ -6,19 +6,173 @@ Knot API Routes
 """
 
 from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
 import os
-import requests
+import time
+
+from http_client import get_client
 
 knot_bp = Blueprint('knot', __name__, url_prefix='/api/knot')
 
 KNOT_CLIENT_ID = os.getenv("KNOT_CLIENT_ID")
 KNOT_CLIENT_SECRET = os.getenv("KNOT_CLIENT_SECRET")
 PHOTON_SERVER_URL = os.getenv("PHOTON_SERVER_URL", "http://localhost:4000")
+KNOT_SYNC_URL = "https://production.knotapi.com/transactions/sync"
+
+# Concurrent merchant syncs and (connect, read) timeouts for Knot calls
+KNOT_SYNC_WORKERS = int(os.getenv("KNOT_SYNC_WORKERS", "8"))
+KNOT_TIMEOUT = (float(os.getenv("KNOT_CONNECT_TIMEOUT", "5")), float(os.getenv("KNOT_READ_TIMEOUT", "30")))
+
+# Cursor pagination: transactions per Knot page, and max pages per merchant per sync
+KNOT_PAGE_SIZE = int(os.getenv("KNOT_PAGE_SIZE", "100"))
+KNOT_MAX_PAGES = int(os.getenv("KNOT_MAX_PAGES", "20"))
 
 # In-memory transaction storage
 saved_transactions = []
 
 
+# Keep-alive client for Knot, sized for the sync thread pool
+knot_client = get_client("knot", auth=(KNOT_CLIENT_ID, KNOT_CLIENT_SECRET),
+                         headers={"Content-Type": "application/json"},
+                         timeout=KNOT_TIMEOUT, pool_maxsize=KNOT_SYNC_WORKERS)
+# Photon notifications are best-effort: short timeout, no retries
+photon_client = get_client("photon", timeout=(1, 1), retries=0)
+
+
+def _sync_merchant(db, user_id: str, m_id, m_name: str, limit: int, full: bool = False) -> dict:
+    """Page through one merchant's Knot transactions from the saved cursor and save them; never raises"""
+    started = time.perf_counter()
+    result = {"merchant_id": m_id, "merchant": m_name, "fetched": 0, "saved": 0, "new_rows": 0,
+              "pages": 0, "resumed": False, "job_id": None, "error": None, "transactions": []}
+    try:
+        # Resume from the last persisted watermark unless a full resync was asked for
+        sync_cursor = None
+        if db and not full:
+            state = db.get_sync_state(user_id, int(m_id))
+            sync_cursor = state.get("cursor") if state else None
+            result["resumed"] = bool(sync_cursor)
+        
+        print(f"🔍 Syncing merchant {m_id} ({m_name}) for user {user_id} "
+              f"({'from saved cursor' if sync_cursor else 'from start'})...")
+        
+        txs = []
+        has_more = True
+        while has_more and result["pages"] < KNOT_MAX_PAGES:
+            payload = {
+                "external_user_id": user_id,
+                "merchant_id": int(m_id),
+                "limit": limit
+            }
+            if sync_cursor:
+                payload["cursor"] = sync_cursor
+            
+            # transactions/sync only reads, so it is safe to retry
+            response = knot_client.post(KNOT_SYNC_URL, json=payload, idempotent=True)
+            if not response.ok:
+                error_data = response.json() if response.headers.get('content-type') == 'application/json' else response.text
+                print(f"❌ Knot API error for merchant {m_id} ({m_name}): {response.status_code} - {error_data}")
+                result["error"] = f"Knot API {response.status_code}: {error_data}"
+                break
+            
+            page = response.json()
+            page_txs = page.get("transactions", [])
+            txs.extend(page_txs)
+            result["pages"] += 1
+            
+            # Keep the last non-null cursor so an exhausted sync resumes at its final page
+            next_cursor = page.get("next_cursor")
+            has_more = bool(next_cursor) and page.get("has_more", True) and bool(page_txs)
+            if next_cursor:
+                sync_cursor = next_cursor
+        
+        print(f"✅ Received {len(txs)} transactions in {result['pages']} page(s) from merchant {m_id} ({m_name})")
+        
+        # Enforce flattened info into transaction for frontend
+        for tx in txs:
+            if not tx.get("merchant_name"):
+                tx["merchant_name"] = m_name or tx.get("merchant", {}).get("name")
+            if not tx.get("merchant_id"):
+                tx["merchant_id"] = m_id or tx.get("merchant", {}).get("id")
+            if not tx.get("total_amount"):
+                tx["total_amount"] = tx.get("price", {}).get("total") or tx.get("total")
+            if not tx.get("payment_method") and tx.get("payment_methods"):
+                px = tx.get("payment_methods")[0]
+                tx["payment_method"] = px.get("brand") or px.get("type")
+        result["transactions"] = txs
+        result["fetched"] = len(txs)
+        
+        if db and result["pages"]:
+            try:
+                if txs:
+                    saved = db.save_transactions_batch(txs, user_id, int(m_id), m_name, background=True)
+                    result["saved"] = saved.get("saved", 0)
+                    result["new_rows"] = saved.get("inserted", 0)
+                    result["job_id"] = saved.get("job_id")
+                    timing = saved.get("timing", {})
+                    print(f"💾 Saved {saved.get('saved')}/{saved.get('total')} transactions "
+                          f"({result['new_rows']} new) for merchant {m_id} "
+                          f"({timing.get('merge_statements')} MERGE, {timing.get('merge_ms')} ms)")
+                # Only advance the watermark once the fetched pages are committed
+                db.save_sync_state(user_id, int(m_id), sync_cursor, result["pages"], result["new_rows"])
+            except Exception as save_error:
+                print(f"⚠️ Failed to save transactions for merchant {m_id}: {save_error}")
+                result["error"] = f"save failed: {save_error}"
+    except Exception as e:
+        print(f"❌ Error syncing merchant {m_id}: {e}")
+        result["error"] = str(e)
+    
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _sync_merchants(db, user_id: str, merchants: list, limit: int, full: bool = False) -> tuple:
+    """Sync merchants concurrently; returns (per-merchant results, wall-clock ms)"""
+    started = time.perf_counter()
+    results = []
+    if merchants:
+        with ThreadPoolExecutor(max_workers=min(KNOT_SYNC_WORKERS, len(merchants))) as pool:
+            futures = [
+                # Copy the request context so per-merchant calls keep the route label / QUERY_TAG
+                pool.submit(contextvars.copy_context().run, _sync_merchant,
+                            db, user_id, m.get("merchant_id"), m.get("name", "Unknown"), limit, full)
+                for m in merchants
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+    sync_ms = round((time.perf_counter() - started) * 1000, 1)
+    slowest = max((r["elapsed_ms"] for r in results), default=0)
+    print(f"⏱️  Synced {len(results)} merchants in {sync_ms} ms (slowest merchant {slowest} ms)")
+    return results, sync_ms
+
+
+def _page_args(data) -> dict:
+    """Parse and validate limit / fields / cursor / include_raw; raises ValueError (-> 400)"""
+    from snowflake_db import _decode_page_cursor, _resolve_transaction_fields
+    try:
+        limit = int(data.get("limit", 100))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    fields = data.get("fields")
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    include_raw = str(data.get("include_raw", "")).lower() in ("1", "true", "yes")
+    cursor = data.get("cursor")
+    _resolve_transaction_fields(fields or None, include_raw)
+    if cursor:
+        _decode_page_cursor(cursor)
+    return {"limit": limit, "cursor": cursor, "include_raw": include_raw, "fields": fields or None}
+
+
+def _enriched_page(db, user_id: str, data) -> dict:
+    """First (or cursor-selected) page of stored transactions for a sync response"""
+    page = db.get_transactions_page(user_id, **_page_args(data))
+    # Map to include spend_category field that frontend expects
+    for tx in page["transactions"]:
+        tx["spend_category"] = tx.get("category")  # Ensure field name consistency
+    return page
+
+
 def get_snowflake():
     """Import snowflake lazily to avoid circular imports"""
     try:
@@ -49,12 +203,7 @@ def create_session():
     }
     
     try:
-        response = requests.post(
-            url,
-            json=payload,
-            auth=(KNOT_CLIENT_ID, KNOT_CLIENT_SECRET),
-            headers={"Content-Type": "application/json"}
-        )
+        response = knot_client.post(url, json=payload)
         
         data = response.json()
         if response.ok:
@@ -80,23 +229,36 @@ def sync_transactions():
     # Handle manual transaction submission (from agent)
     if manual_transactions:
         print(f"📸 Received {len(manual_transactions)} manual transaction(s) from agent")
+        # Reject a bad cursor / fields before saving anything, not after
+        try:
+            _page_args(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         try:
+            # Group by merchant so each merchant's rows land in one MERGE
+            by_merchant = {}
             for tx in manual_transactions:
-                m_id = tx.get("merchant_id")
-                m_name = tx.get("merchant_name", "Unknown")
-                result = db.save_transactions_batch([tx], user_id, int(m_id), m_name)
-                print(f"💾 Saved manual transaction: {m_name} - ${tx.get('total_amount')}")
+                key = (int(tx.get("merchant_id")), tx.get("merchant_name", "Unknown"))
+                by_merchant.setdefault(key, []).append(tx)
             
-            # Return enriched data
-            limit = int(data.get("limit", 100))
-            enriched_transactions = db.get_transactions(user_id, limit=limit)
-            for tx in enriched_transactions:
-                tx["spend_category"] = tx.get("category")
+            job_ids = []
+            for (m_id, m_name), txs in by_merchant.items():
+                result = db.save_transactions_batch(txs, user_id, m_id, m_name, background=True)
+                if result.get("job_id"):
+                    job_ids.append(result["job_id"])
+                for tx in txs:
+                    print(f"💾 Saved manual transaction: {m_name} - ${tx.get('total_amount')}")
+            
+            # Return enriched data (categories fill in once the queued jobs finish)
+            page = _enriched_page(db, user_id, data)
             
             return jsonify({
                 "success": True,
-                "total": len(enriched_transactions),
-                "transactions": enriched_transactions
+                "total": len(page["transactions"]),
+                "transactions": page["transactions"],
+                "cursor": page["next_cursor"],
+                "has_more": page["has_more"],
+                "jobs": job_ids
             })
         except Exception as e:
             print(f"❌ Error saving manual transactions: {e}")
@@ -104,6 +266,20 @@ def sync_transactions():
             traceback.print_exc()
             return jsonify({"error": str(e)}), 500
     
+    # A page cursor means "load more" from the stored history - no need to re-sync Knot
+    if db and data.get("cursor"):
+        try:
+            page = _enriched_page(db, user_id, data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "success": True,
+            "total": len(page["transactions"]),
+            "transactions": page["transactions"],
+            "cursor": page["next_cursor"],
+            "has_more": page["has_more"]
+        })
+    
     # Original Knot API sync logic
     merchants = []
     if db:
@@ -131,84 +307,24 @@ def sync_transactions():
             {"merchant_id": 44, "name": "Amazon"}
         ]
     
-    url = "https://production.knotapi.com/transactions/sync"
-    all_transactions = []
+    full_sync = str(data.get("full", "")).lower() in ("1", "true", "yes")
+    results, sync_ms = _sync_merchants(db, user_id, merchants_to_sync, limit=KNOT_PAGE_SIZE, full=full_sync)
+    all_transactions = [tx for r in results for tx in r.pop("transactions")]
+    job_ids = [r["job_id"] for r in results if r.get("job_id")]
     
-    for m_info in merchants_to_sync:
-        m_id = m_info.get("merchant_id")
-        m_name = m_info.get("name")
-        
-        current_cursor = None
-        has_more = True
-        merchant_txs = []
-        
-        try:
-            # Simple sync call for these transactions
-            payload = {
-                "external_user_id": user_id,
-                "merchant_id": int(m_id),
-                "limit": 50
-            }
-            
-            print(f"🔍 Syncing merchant {m_id} ({m_name}) for user {user_id}...")
-            
-            response = requests.post(
-                url,
-                json=payload,
-                auth=(KNOT_CLIENT_ID, KNOT_CLIENT_SECRET),
-                headers={"Content-Type": "application/json"}
-            )
-            
-            print(f"📡 Knot API response status for merchant {m_id}: {response.status_code}")
-            
-            if response.ok:
-                data = response.json()
-                txs = data.get("transactions", [])
-                
-                print(f"✅ Received {len(txs)} transactions from merchant {m_id} ({m_name})")
-                
-                # Enforce flattened info into transaction for frontend
-                for tx in txs:
-                    if not tx.get("merchant_name"):
-                        tx["merchant_name"] = m_name or tx.get("merchant", {}).get("name")
-                    if not tx.get("merchant_id"):
-                        tx["merchant_id"] = m_id or tx.get("merchant", {}).get("id")
-                    if not tx.get("total_amount"):
-                        tx["total_amount"] = tx.get("price", {}).get("total") or tx.get("total")
-                    if not tx.get("payment_method") and tx.get("payment_methods"):
-                        px = tx.get("payment_methods")[0]
-                        tx["payment_method"] = px.get("brand") or px.get("type")
-                        
-                all_transactions.extend(txs)
-                
-                # Save to Snowflake in background (simplified)
-                if db and txs:
-                    try:
-                        result = db.save_transactions_batch(txs, user_id, int(m_id), m_name)
-                        print(f"💾 Saved {result.get('saved')}/{result.get('total')} transactions for merchant {m_id}")
-                    except Exception as save_error:
-                        print(f"⚠️ Failed to save transactions for merchant {m_id}: {save_error}")
-            else:
-                error_data = response.json() if response.headers.get('content-type') == 'application/json' else response.text
-                print(f"❌ Knot API error for merchant {m_id} ({m_name}): {response.status_code} - {error_data}")
-                    
-        except Exception as e:
-            print(f"❌ Error syncing merchant {m_id}: {e}")
-            import traceback
-            traceback.print_exc()
-
     # After syncing, return enriched data from Snowflake (with categories!)
     if db:
         try:
-            limit = int(data.get("limit", 100))
-            enriched_transactions = db.get_transactions(user_id, limit=limit)
-            # Map to include spend_category field that frontend expects
-            for tx in enriched_transactions:
-                tx["spend_category"] = tx.get("category")  # Ensure field name consistency
+            page = _enriched_page(db, user_id, data)
             return jsonify({
                 "success": True, 
-                "total": len(enriched_transactions),
-                "transactions": enriched_transactions
+                "total": len(page["transactions"]),
+                "transactions": page["transactions"],
+                "cursor": page["next_cursor"],
+                "has_more": page["has_more"],
+                "jobs": job_ids,
+                "merchants": results,
+                "sync_ms": sync_ms
             })
         except Exception as e:
             print(f"⚠️ Falling back to raw transactions: {e}")
@@ -219,7 +335,10 @@ def sync_transactions():
     return jsonify({
         "success": True, 
         "total": len(all_transactions),
-        "transactions": all_transactions
+        "transactions": all_transactions,
+        "jobs": job_ids,
+        "merchants": results,
+        "sync_ms": sync_ms
     })
 
 
@@ -236,43 +355,24 @@ def sync_all_merchants():
         return jsonify({"error": "Snowflake not configured"}), 500
         
     try:
-        merchants = db.get_merchants(user_id)
-        sync_results = []
+        merchants = [m for m in db.get_merchants(user_id) if m.get("merchant_id")]
+        full_sync = bool(data.get("full"))
+        results, sync_ms = _sync_merchants(db, user_id, merchants, limit=KNOT_PAGE_SIZE, full=full_sync)
         
-        for merchant in merchants:
-            merchant_id = merchant.get("merchant_id")
-            if not merchant_id:
-                continue
-                
-            # Internal call to sync logic (simplified for batch)
-            # In a real app, this would be a background task
-            url = "https://production.knotapi.com/transactions/sync"
-            payload = {
-                "external_user_id": user_id,
-                "merchant_id": int(merchant_id),
-                "limit": 100
-            }
-            
-            response = requests.post(
-                url,
-                json=payload,
-                auth=(KNOT_CLIENT_ID, KNOT_CLIENT_SECRET),
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.ok:
-                data = response.json()
-                txs = data.get("transactions", [])
-                if txs:
-                    db.save_transactions_batch(txs, user_id, int(merchant_id), merchant.get("name", "Unknown"))
-                    sync_results.append({"merchant": merchant.get("name"), "synced": len(txs)})
-            else:
-                sync_results.append({"merchant": merchant.get("name"), "error": response.text})
+        sync_results = []
+        for r in results:
+            r.pop("transactions")
+            if r.get("error"):
+                sync_results.append({"merchant": r["merchant"], "error": r["error"], "elapsed_ms": r["elapsed_ms"]})
+            elif r["fetched"]:
+                sync_results.append({"merchant": r["merchant"], "synced": r["fetched"], "new_rows": r["new_rows"],
+                                     "pages": r["pages"], "job_id": r.get("job_id"), "elapsed_ms": r["elapsed_ms"]})
                 
         return jsonify({
             "success": True,
             "merchants_synced": len(sync_results),
-            "details": sync_results
+            "details": sync_results,
+            "sync_ms": sync_ms
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -294,22 +394,24 @@ def webhook():
             # Save to Snowflake
             db = get_snowflake()
             if db and txs:
-                for tx in txs:
-                    try:
-                        merchant = tx.get("merchant", {})
-                        merchant_id = merchant.get("id", 0)
-                        merchant_name = merchant.get("name", "Unknown")
-                        payment_method = tx.get("payment_method", tx.get("card_type", None))
+                # One rollup refresh for the whole delivery instead of one per transaction
+                with db.deferred_rollup():
+                    for tx in txs:
+                        try:
+                            merchant = tx.get("merchant", {})
+                            merchant_id = merchant.get("id", 0)
+                            merchant_name = merchant.get("name", "Unknown")
+                            payment_method = tx.get("payment_method", tx.get("card_type", None))
                         
-                        db.save_transaction_with_payment_update(
-                            tx,
-                            payload.get("user_id", "webhook_user"),
-                            int(merchant_id) if merchant_id else 0,
-                            merchant_name,
-                            payment_method
-                        )
-                    except Exception as e:
-                        print(f"Webhook: Failed to save transaction: {e}")
+                            db.save_transaction_with_payment_update(
+                                tx,
+                                payload.get("user_id", "webhook_user"),
+                                int(merchant_id) if merchant_id else 0,
+                                merchant_name,
+                                payment_method
+                            )
+                        except Exception as e:
+                            print(f"Webhook: Failed to save transaction: {e}")
             
             if txs:
                 merchant = txs[0].get("merchant", {}).get("name", "New Merchant")
@@ -317,7 +419,7 @@ def webhook():
                 message = f"Knot Alert: Transaction at {merchant} for ${amount}."
                 
                 try:
-                    requests.post(f"{PHOTON_SERVER_URL}/message", json={"message": message}, timeout=1)
+                    photon_client.post(f"{PHOTON_SERVER_URL}/message", json={"message": message})
                 except:
                     pass
                     
@@ -2,18 +2,170 @@
 Nessie API Routes
 - Capital One Nessie API integration for account and income data
 - Sandbox API: http://api.nessieisreal.com
+- Account lists and deposits cached with a TTL, revalidated with ETag / Last-Modified
+- Invalidation goes through the shared cache versions, so it reaches every worker
+- Per-account deposit fetches fanned out concurrently
 """
 
 import os
-import requests
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from cache import default_versions
+from http_client import get_client
 
 nessie_bp = Blueprint('nessie', __name__, url_prefix='/api/nessie')
 
 NESSIE_BASE_URL = "http://api.nessieisreal.com"
 NESSIE_API_KEY = os.getenv("NESSIE_API_KEY", "")
 
+NESSIE_CACHE_CONFIG = {
+    # Deposits and account lists change rarely; a stale entry is revalidated, not refetched blindly
+    "ttl_seconds": float(os.getenv("NESSIE_CACHE_TTL_SECONDS", "300")),
+    "max_entries": int(os.getenv("NESSIE_CACHE_MAX_ENTRIES", "512")),
+    "fetch_workers": int(os.getenv("NESSIE_FETCH_WORKERS", "8")),
+}
+
+# Keep-alive client with timeouts, retries on GETs and a circuit breaker
+nessie_client = get_client("nessie", pool_maxsize=NESSIE_CACHE_CONFIG["fetch_workers"])
+
+
+class NessieCache:
+    """TTL + LRU cache of Nessie GET responses keyed by path, with conditional refresh"""
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None, versions=None):
+        self.ttl_seconds = NESSIE_CACHE_CONFIG["ttl_seconds"] if ttl_seconds is None else ttl_seconds
+        self.max_entries = max(1, max_entries or NESSIE_CACHE_CONFIG["max_entries"])
+        self._versions = versions
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0, "evictions": 0}
+
+    def get_json(self, path: str, api_key: str) -> Tuple[int, Any]:
+        """(status, JSON body) for a GET, served from cache while fresh; treat the body as read-only"""
+        version = self._version(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["version"] != version:
+                # Invalidated (possibly by another worker): refetch without validators
+                entry = None
+            if entry is not None and entry["expires_at"] > time.monotonic():
+                self._entries.move_to_end(path)
+                self._stats["hits"] += 1
+                return 200, entry["data"]
+            self._stats["misses"] += 1
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = nessie_client.get(f"{NESSIE_BASE_URL}{path}", params={"key": api_key}, headers=headers)
+        except Exception:
+            if entry is None:
+                raise
+            return self._serve_stale(path, entry)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                entry["expires_at"] = time.monotonic() + self.ttl_seconds
+                self._stats["revalidated"] += 1
+                self._store(path, entry)
+            return 200, entry["data"]
+        if response.status_code != 200:
+            if entry is not None:
+                return self._serve_stale(path, entry)
+            return response.status_code, None
+
+        data = response.json()
+        with self._lock:
+            self._store(path, {
+                "data": data,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "expires_at": time.monotonic() + self.ttl_seconds,
+                "version": version,
+            })
+        return 200, data
+
+    def _serve_stale(self, path: str, entry: Dict[str, Any]) -> Tuple[int, Any]:
+        print(f"⚠️ Nessie refresh failed for {path}, serving cached copy")
+        with self._lock:
+            self._stats["stale_served"] += 1
+        return 200, entry["data"]
+
+    def _store(self, path: str, entry: Dict[str, Any]) -> None:
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _version(self, path: str) -> tuple:
+        return (self._versions or default_versions()).get("nessie:epoch", f"nessie:{path}")
+
+    def invalidate(self, *paths: str) -> None:
+        """Drop paths here and in every other worker"""
+        (self._versions or default_versions()).bump(*(f"nessie:{path}" for path in paths))
+        with self._lock:
+            for path in paths:
+                self._entries.pop(path, None)
+
+    def clear(self) -> None:
+        (self._versions or default_versions()).bump("nessie:epoch")
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
+
+
+nessie_cache = NessieCache()
+
+
+def _fetch_deposits(account_ids, api_key: str) -> Tuple[list, int]:
+    """All deposits for the given accounts (cached, fetched concurrently); returns (deposits, failed accounts)"""
+    account_ids = list(account_ids)
+    if not account_ids:
+        return [], 0
+
+    def fetch(account_id):
+        try:
+            return nessie_cache.get_json(f"/accounts/{account_id}/deposits", api_key)
+        except Exception as e:
+            print(f"❌ Nessie deposits fetch failed for account {account_id}: {e}")
+            return None, None
+
+    workers = min(NESSIE_CACHE_CONFIG["fetch_workers"], len(account_ids))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fetch, a) for a in account_ids]
+        results = [future.result() for future in futures]
+
+    deposits, failed = [], 0
+    for status, data in results:
+        if status == 200 and isinstance(data, list):
+            deposits.extend(data)
+        else:
+            failed += 1
+    return deposits, failed
+
 
 def get_api_key():
     """Get Nessie API key from environment"""
@@ -28,16 +180,12 @@ def get_accounts():
         return jsonify({"error": "Nessie API key not configured", "accounts": []}), 200
 
     try:
-        response = requests.get(
-            f"{NESSIE_BASE_URL}/accounts",
-            params={"key": api_key}
-        )
+        status, accounts = nessie_cache.get_json("/accounts", api_key)
 
-        if response.status_code == 200:
-            accounts = response.json()
+        if status == 200:
             return jsonify({"accounts": accounts})
         else:
-            return jsonify({"error": f"Nessie API error: {response.status_code}", "accounts": []}), 200
+            return jsonify({"error": f"Nessie API error: {status}", "accounts": []}), 200
     except Exception as e:
         return jsonify({"error": str(e), "accounts": []}), 200
 
@@ -50,7 +198,7 @@ def get_customers():
         return jsonify({"error": "Nessie API key not configured", "customers": []}), 200
 
     try:
-        response = requests.get(
+        response = nessie_client.get(
             f"{NESSIE_BASE_URL}/customers",
             params={"key": api_key}
         )
@@ -72,16 +220,12 @@ def get_deposits(account_id):
         return jsonify({"error": "Nessie API key not configured", "deposits": []}), 200
 
     try:
-        response = requests.get(
-            f"{NESSIE_BASE_URL}/accounts/{account_id}/deposits",
-            params={"key": api_key}
-        )
+        status, deposits = nessie_cache.get_json(f"/accounts/{account_id}/deposits", api_key)
 
-        if response.status_code == 200:
-            deposits = response.json()
+        if status == 200:
             return jsonify({"deposits": deposits})
         else:
-            return jsonify({"error": f"Nessie API error: {response.status_code}", "deposits": []}), 200
+            return jsonify({"error": f"Nessie API error: {status}", "deposits": []}), 200
     except Exception as e:
         return jsonify({"error": str(e), "deposits": []}), 200
 
@@ -94,7 +238,7 @@ def get_purchases(account_id):
         return jsonify({"error": "Nessie API key not configured", "purchases": []}), 200
 
     try:
-        response = requests.get(
+        response = nessie_client.get(
             f"{NESSIE_BASE_URL}/accounts/{account_id}/purchases",
             params={"key": api_key}
         )
@@ -108,6 +252,14 @@ def get_purchases(account_id):
         return jsonify({"error": str(e), "purchases": []}), 200
 
 
+@nessie_bp.route("/cache", methods=["GET", "DELETE"])
+def cache_stats():
+    """Nessie response cache counters (DELETE clears it)"""
+    if request.method == "DELETE":
+        nessie_cache.clear()
+    return jsonify(nessie_cache.stats())
+
+
 @nessie_bp.route("/income-trends", methods=["GET", "POST"])
 def get_income_trends():
     """
@@ -130,20 +282,15 @@ def get_income_trends():
     try:
         # If no account_id provided, get all accounts and aggregate
         if not account_id:
-            accounts_response = requests.get(
-                f"{NESSIE_BASE_URL}/accounts",
-                params={"key": api_key}
-            )
+            status, accounts = nessie_cache.get_json("/accounts", api_key)
 
-            if accounts_response.status_code != 200:
+            if status != 200:
                 return jsonify({
                     "source": "sample",
                     "message": "Could not fetch accounts. Using sample data.",
                     "trends": _get_sample_income_trends()
                 })
 
-            accounts = accounts_response.json()
-
             # If no accounts exist, fall back to sample data
             if not accounts:
                 return jsonify({
@@ -152,16 +299,7 @@ def get_income_trends():
                     "trends": _get_sample_income_trends()
                 })
 
-            all_deposits = []
-
-            for account in accounts:
-                deposits_response = requests.get(
-                    f"{NESSIE_BASE_URL}/accounts/{account['_id']}/deposits",
-                    params={"key": api_key}
-                )
-                if deposits_response.status_code == 200:
-                    deposits = deposits_response.json()
-                    all_deposits.extend(deposits)
+            all_deposits, _ = _fetch_deposits((account["_id"] for account in accounts), api_key)
 
             # If no deposits found, fall back to sample data
             if not all_deposits:
@@ -171,20 +309,15 @@ def get_income_trends():
                     "trends": _get_sample_income_trends()
                 })
         else:
-            deposits_response = requests.get(
-                f"{NESSIE_BASE_URL}/accounts/{account_id}/deposits",
-                params={"key": api_key}
-            )
+            status, all_deposits = nessie_cache.get_json(f"/accounts/{account_id}/deposits", api_key)
 
-            if deposits_response.status_code != 200:
+            if status != 200:
                 return jsonify({
                     "source": "sample",
                     "message": "Could not fetch deposits. Using sample data.",
                     "trends": _get_sample_income_trends()
                 })
 
-            all_deposits = deposits_response.json()
-
         # Aggregate deposits by month
         trends = _aggregate_deposits_by_month(all_deposits, months)
 
@@ -213,38 +346,53 @@ def get_income_trends():
         })
 
 
-def _aggregate_deposits_by_month(deposits, months=6):
-    """Aggregate deposits by month"""
-    monthly_totals = {}
+def _recent_months(months: int, today: Optional[datetime] = None) -> np.ndarray:
+    """The last `months` calendar months as datetime64[M], oldest first (current month last)"""
+    current = np.datetime64((today or datetime.now()).strftime("%Y-%m"), "M")
+    return current - np.arange(months - 1, -1, -1)
 
-    # Initialize months
-    today = datetime.now()
-    for i in range(months):
-        month_date = today - timedelta(days=30 * i)
-        month_key = month_date.strftime("%Y-%m")
-        month_label = month_date.strftime("%b")
-        monthly_totals[month_key] = {"month": month_label, "amount": 0}
-
-    # Sum deposits by month
-    for deposit in deposits:
-        if isinstance(deposit, dict):
-            trans_date = deposit.get("transaction_date", "")
-            amount = deposit.get("amount", 0)
-
-            if trans_date:
-                try:
-                    # Parse date (Nessie format: YYYY-MM-DD)
-                    date_obj = datetime.strptime(trans_date[:10], "%Y-%m-%d")
-                    month_key = date_obj.strftime("%Y-%m")
-
-                    if month_key in monthly_totals:
-                        monthly_totals[month_key]["amount"] += float(amount)
-                except (ValueError, TypeError):
-                    pass
-
-    # Convert to sorted list (oldest first)
-    sorted_months = sorted(monthly_totals.keys())
-    return [monthly_totals[m] for m in sorted_months]
+
+def _month_label(month: np.datetime64) -> str:
+    return month.astype(datetime).strftime("%b")
+
+
+def _parse_days(dates: list) -> np.ndarray:
+    """Nessie YYYY-MM-DD strings to datetime64[D]; unparseable dates become NaT"""
+    try:
+        return np.array(dates, dtype="datetime64[D]")
+    except ValueError:
+        parsed = []
+        for value in dates:
+            try:
+                parsed.append(np.datetime64(value, "D"))
+            except ValueError:
+                parsed.append(np.datetime64("NaT", "D"))
+        return np.array(parsed, dtype="datetime64[D]")
+
+
+def _to_amount(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _aggregate_deposits_by_month(deposits, months=6, today: Optional[datetime] = None):
+    """Sum deposits per calendar month over the last `months` months, oldest first"""
+    window = _recent_months(months, today)
+    rows = [d for d in deposits if isinstance(d, dict) and d.get("transaction_date")]
+    totals = np.zeros(months)
+
+    if rows:
+        days = _parse_days([str(d["transaction_date"])[:10] for d in rows])
+        amounts = np.array([_to_amount(d.get("amount", 0)) for d in rows])
+        # One pass: month offset from the window start, then a weighted bincount
+        offsets = (days.astype("datetime64[M]") - window[0]).astype(np.int64)
+        in_window = ~np.isnat(days) & (offsets >= 0) & (offsets < months)
+        totals = np.bincount(offsets[in_window], weights=amounts[in_window], minlength=months)
+
+    return [{"month": _month_label(month), "amount": round(float(total), 2)}
+            for month, total in zip(window, totals)]
 
 
 def _get_sample_income_trends():
@@ -256,16 +404,12 @@ def _get_sample_income_trends():
     # Pattern: stable base with gradual increase and bonus month
     income_pattern = [4200, 4350, 4400, 5200, 4500, 4650]
 
-    for i in range(5, -1, -1):
-        month_date = today - timedelta(days=30 * i)
-        month_label = month_date.strftime("%b")
-
+    for pattern_index, month in enumerate(_recent_months(6, today)):
         # Use predefined pattern
-        pattern_index = 5 - i
         amount = income_pattern[pattern_index]
 
         sample_data.append({
-            "month": month_label,
+            "month": _month_label(month),
             "amount": round(amount, 2)
         })
 
@@ -296,7 +440,7 @@ def create_demo_data():
             }
         }
 
-        customer_response = requests.post(
+        customer_response = nessie_client.post(
             f"{NESSIE_BASE_URL}/customers",
             params={"key": api_key},
             json=customer_data
@@ -319,7 +463,7 @@ def create_demo_data():
             "balance": 5000
         }
 
-        account_response = requests.post(
+        account_response = nessie_client.post(
             f"{NESSIE_BASE_URL}/customers/{customer_id}/accounts",
             params={"key": api_key},
             json=account_data
@@ -339,8 +483,9 @@ def create_demo_data():
         deposits_created = 0
         today = datetime.now()
 
-        for i in range(6):
-            deposit_date = (today - timedelta(days=30 * i)).strftime("%Y-%m-%d")
+        # One payroll deposit per calendar month: mid-month, or today for the current month
+        for i, month in enumerate(_recent_months(6, today)[::-1]):
+            deposit_date = min(month.astype(datetime).replace(day=15), today.date()).strftime("%Y-%m-%d")
             deposit_data = {
                 "medium": "balance",
                 "transaction_date": deposit_date,
@@ -349,7 +494,7 @@ def create_demo_data():
                 "description": f"Payroll Deposit - Month {6-i}"
             }
 
-            deposit_response = requests.post(
+            deposit_response = nessie_client.post(
                 f"{NESSIE_BASE_URL}/accounts/{account_id}/deposits",
                 params={"key": api_key},
                 json=deposit_data
@@ -358,6 +503,8 @@ def create_demo_data():
             if deposit_response.status_code == 201:
                 deposits_created += 1
 
+        nessie_cache.invalidate("/accounts", f"/accounts/{account_id}/deposits")
+
         return jsonify({
             "success": True,
             "customer_id": customer_id,
@@ -2,8 +2,14 @@
 Snowflake Management Routes
 - Setup tables
 - Test connection
+- Connection pool and read cache stats
+- Classification cache stats and invalidation
+- Rebuild analytics rollup
+- Migrate legacy raw payloads out of TRANSACTIONS (opt-in)
+- Chunked column backfills (start, pause, progress)
 - Classify transactions
 - Get stored transactions
+- Transaction detail with the raw order payload
 """
 
 from flask import Blueprint, request, jsonify
@@ -31,6 +37,16 @@ def setup():
     try:
         db.setup_tables()
         db.populate_category_embeddings()
+        # Backfill the analytics rollup for rows that predate it
+        db.refresh_spend_rollup()
+        # Compile benefit multipliers for cards saved before the column existed
+        db.backfill_card_benefits()
+        # Derived columns for rows that predate them, in resumable background batches
+        # (once: later runs go through /backfills/<name>)
+        from backfill import start_backfill
+        for name in ("payment_method", "card_id", "product_text", "items"):
+            if db.get_backfill_checkpoint(name) is None:
+                start_backfill(db, name)
         return jsonify({"success": True, "message": "Snowflake setup complete"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -60,6 +76,125 @@ def test():
     return jsonify(db.test_connection())
 
 
+@snowflake_bp.route("/pool", methods=["GET"])
+def pool():
+    """Connection pool size and wait-time stats"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    return jsonify(db.pool_stats())
+
+
+@snowflake_bp.route("/cache", methods=["GET", "DELETE"])
+def cache():
+    """Read cache hit/miss/eviction counters (DELETE invalidates everything)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    if request.method == "DELETE":
+        db._invalidate()
+    return jsonify(db.cache_stats())
+
+
+@snowflake_bp.route("/classification-cache", methods=["GET", "DELETE"])
+def classification_cache():
+    """CLASSIFY_TEXT result cache hit rate (DELETE drops stale label sets, ?all=true drops everything)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    try:
+        if request.method == "DELETE":
+            all_versions = request.args.get("all", "false").lower() == "true"
+            return jsonify(db.invalidate_classification_cache(all_versions))
+        return jsonify(db.classification_cache_stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/rebuild-rollup", methods=["POST"])
+def rebuild_rollup():
+    """Rebuild DAILY_SPEND_ROLLUP from TRANSACTIONS (all users, or one user_id)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    data = request.json or {}
+    try:
+        result = db.refresh_spend_rollup(user_id=data.get("user_id"))
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/migrate-raw-payloads", methods=["POST"])
+def migrate_raw_payloads():
+    """Copy TRANSACTIONS.raw_json into TRANSACTION_RAW (body: {"drop_column": true} also drops it once verified)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        drop_column = bool(data.get("drop_column"))
+        result = db.migrate_raw_payloads(drop_column=drop_column)
+        if drop_column and not result["verified"]:
+            return jsonify({"error": "Copied payloads did not verify; raw_json column kept", "migration": result}), 409
+        return jsonify({"success": True, "migration": result})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/backfills", methods=["GET"])
+def backfills():
+    """Progress checkpoints for every column backfill"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    try:
+        from backfill import BACKFILL_DERIVATIONS
+        return jsonify({
+            "available": list(BACKFILL_DERIVATIONS),
+            "backfills": db.list_backfill_checkpoints(),
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/backfills/<name>", methods=["POST"])
+def start_backfill(name):
+    """Start or resume a column backfill (body: {"restart": true} starts over)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        from backfill import start_backfill as start
+        return jsonify({"success": True, "backfill": start(db, name, restart=bool(data.get("restart")))}), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/backfills/<name>/pause", methods=["POST"])
+def pause_backfill(name):
+    """Pause a running backfill after its current batch"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    try:
+        from backfill import pause_backfill as pause
+        return jsonify({"success": True, "backfill": pause(db, name)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @snowflake_bp.route("/classify", methods=["POST"])
 def classify():
     """Classify all uncategorized transactions using vector search"""
@@ -67,8 +202,33 @@ def classify():
     if not db:
         return jsonify({"error": "Snowflake not configured"}), 500
     
+    data = request.get_json(silent=True) or {}
+    min_confidence = float(data["min_confidence"]) if data.get("min_confidence") is not None else None
+    
     try:
-        result = db.classify_all_unclassified()
+        # Async: the same classifier as ?sync=true, run by the durable job queue
+        if request.args.get("sync", "false").lower() != "true":
+            from jobs import get_queue
+            queue = get_queue()
+            job_id = queue.enqueue("classify_unclassified", {"min_confidence": min_confidence})
+            return jsonify({"success": True, "async": True, "job": queue.get(job_id)}), 202
+        result = db.classify_all_unclassified(min_confidence)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@snowflake_bp.route("/classify/<tx_id>", methods=["POST"])
+def classify_one(tx_id):
+    """Classify one transaction, returning the top_k category matches"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        result = db.classify_transaction(tx_id, top_k=int(data.get("top_k", 1)))
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -87,9 +247,33 @@ def get_stored_transactions():
     card_id = data.get("card_id", request.args.get("card_id"))
     card_type = data.get("card_type", request.args.get("card_type"))
     limit = int(data.get("limit", request.args.get("limit", 50)))
+    cursor = data.get("cursor", request.args.get("cursor"))
+    include_raw = str(data.get("include_raw", request.args.get("include_raw", ""))).lower() in ("1", "true", "yes")
+    fields = data.get("fields", request.args.get("fields"))
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
     
     try:
-        transactions = db.get_transactions(user_id, int(merchant_id) if merchant_id else None, limit, card_id=card_id, card_type=card_type)
-        return jsonify({"transactions": transactions})
+        page = db.get_transactions_page(user_id, int(merchant_id) if merchant_id else None, limit, card_id=card_id, card_type=card_type,
+                                        cursor=cursor, include_raw=include_raw, fields=fields or None)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e), "transactions": []}), 400
     except Exception as e:
         return jsonify({"error": str(e), "transactions": []}), 200
+
+
+@snowflake_bp.route("/transactions/<tx_id>", methods=["GET"])
+def get_transaction_detail(tx_id):
+    """One stored transaction plus its raw Knot payload (fetched from cold storage on demand)"""
+    db = get_snowflake()
+    if not db:
+        return jsonify({"error": "Snowflake not configured"}), 500
+    
+    try:
+        tx = db.get_transaction_detail(tx_id, request.args.get("user_id"))
+        if not tx:
+            return jsonify({"error": "Transaction not found"}), 404
+        return jsonify(tx)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -9,9 +9,24 @@ Provides connection management and operations for:
 
 import os
 import json
+import base64
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
 
+from cache import CACHE_CONFIG, VersionedCache, cached_read
+from card_index import card_indexes
+from classification_cache import (
+    CLASSIFICATION_CACHE_CONFIG, ClassificationLRU, classification_key, classification_text, model_version,
+)
+from db_pool import ConnectionPool, PoolTimeoutError, pool_lane
+from fast_classifier import FAST_PATH_CONFIG, FastPathClassifier
+from metrics import TimedCursor, query_tag, registry as metrics_registry
+
 load_dotenv()
 
 # Snowflake connection settings from environment
@@ -24,6 +39,27 @@ SNOWFLAKE_CONFIG = {
     "warehouse": os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH"),
 }
 
+# Connection pool settings (one pool per process)
+POOL_CONFIG = {
+    "max_size": int(os.getenv("SNOWFLAKE_POOL_SIZE", "8")),
+    "wait_timeout": float(os.getenv("SNOWFLAKE_POOL_WAIT_SECONDS", "30")),
+    "idle_timeout": float(os.getenv("SNOWFLAKE_POOL_IDLE_SECONDS", "600")),
+    "health_check_after": float(os.getenv("SNOWFLAKE_POOL_HEALTHCHECK_SECONDS", "60")),
+    # Job workers and the warehouse poller draw from a separate, smaller pool so long
+    # jobs can never take the connections interactive requests are waiting for
+    "background_max_size": int(os.getenv("SNOWFLAKE_BACKGROUND_POOL_SIZE", "2")),
+    "background_wait_timeout": float(os.getenv("SNOWFLAKE_BACKGROUND_POOL_WAIT_SECONDS", "300")),
+}
+
+# Cold storage for Knot order payloads (TRANSACTION_RAW), fetched only on demand
+RAW_PAYLOAD_CONFIG = {
+    # Store payloads ZLIB-compressed (BINARY) instead of as a VARIANT
+    "compress": os.getenv("RAW_PAYLOAD_COMPRESS", "false").lower() in ("1", "true", "yes"),
+    # Payloads never change once written, so the per-id cache only needs bounding
+    "cache_max_entries": int(os.getenv("RAW_PAYLOAD_CACHE_MAX_ENTRIES", "256")),
+    "cache_ttl_seconds": float(os.getenv("RAW_PAYLOAD_CACHE_TTL_SECONDS", "600")),
+}
+
 # Condensed spend categories for AI classification
 SPEND_CATEGORIES = [
     "food_dining",      # Restaurants, food delivery, coffee, DoorDash, UberEats
@@ -38,6 +74,9 @@ SPEND_CATEGORIES = [
     "other"             # Uncategorized transactions
 ]
 
+# Cached CLASSIFY_TEXT labels are only reused under the same label set
+CLASSIFICATION_MODEL_VERSION = model_version("cortex.classify_text", SPEND_CATEGORIES)
+
 # Legacy categories for backward compatibility with vector embeddings
 CATEGORIES = [
     ("food_dining", "Restaurant food delivery takeout cafe coffee shop bar dining DoorDash UberEats Grubhub"),
@@ -72,416 +111,1243 @@ def decrypt_card_data(encrypted: str) -> str:
     return f.decrypt(encrypted.encode()).decode()
 
 
+def benefits_hash(benefits_text: str) -> str:
+    """Key for a benefits string, so identical text (ignoring case/whitespace) is parsed once"""
+    normalized = " ".join((benefits_text or "").lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _numeric_multipliers(parsed: Dict[str, Any]) -> Dict[str, float]:
+    """Keep only category -> number pairs from a parsed benefits dict"""
+    multipliers = {}
+    for category, value in (parsed or {}).items():
+        try:
+            multipliers[str(category)] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return multipliers
+
+
+def _connect():
+    """Open a new Snowflake connection (pool factory)"""
+    import snowflake.connector
+    return snowflake.connector.connect(
+        account=SNOWFLAKE_CONFIG["account"],
+        user=SNOWFLAKE_CONFIG["user"],
+        password=SNOWFLAKE_CONFIG["password"],
+        database=SNOWFLAKE_CONFIG["database"],
+        schema=SNOWFLAKE_CONFIG["schema"],
+        warehouse=SNOWFLAKE_CONFIG["warehouse"],
+    )
+
+
+def _extract_payment_info(tx: Dict[str, Any]) -> tuple:
+    """Extract (payment_method, card_id) from a Knot transaction"""
+    payment_methods = tx.get("payment_methods", [])
+    payment_method = None
+    card_id = tx.get("card_id") or tx.get("account_id") # Try Knot fields
+    
+    if payment_methods:
+        pm = payment_methods[0]
+        # Check type first (PAYPAL, CARD, etc.), then brand (VISA, PAYPAL, etc.)
+        pm_type = pm.get("type", "").upper()
+        pm_brand = pm.get("brand", "").upper()
+        if not card_id:
+            card_id = pm.get("external_id") # Fallback to payment method external id
+            
+        if pm_type == "PAYPAL" or pm_brand == "PAYPAL":
+            payment_method = "PAYPAL"
+        else:
+            payment_method = pm_brand or pm_type or "CARD"
+    return payment_method, card_id
+
+
+# Transactions per CLASSIFY_TEXT UPDATE in categorize_transactions_batch
+CATEGORIZE_CHUNK_SIZE = int(os.getenv("CATEGORIZE_CHUNK_SIZE", "200"))
+
+# Column order of _transaction_row(), matching the TRANSACTIONS insert list
+TRANSACTION_ROW_WIDTH = 12
+
+# Rows per bulk MERGE statement (keeps statement text bounded on huge syncs)
+BULK_MERGE_CHUNK_SIZE = int(os.getenv("BULK_MERGE_CHUNK_SIZE", "500"))
+
+# Transaction ids per rollup refresh when a deferred_rollup() block flushes
+ROLLUP_FLUSH_CHUNK_SIZE = int(os.getenv("ROLLUP_FLUSH_CHUNK_SIZE", "1000"))
+
+# Every EMBED_TEXT_768 call (categories, products, ad-hoc text) must use this one model,
+# or category and product vectors stop being comparable
+EMBED_MODEL = "snowflake-arctic-embed-m-v1.5"
+
+# Column order of _transaction_item_rows(), matching the TRANSACTION_ITEMS insert list
+TRANSACTION_ITEM_ROW_WIDTH = 9
+
+
+def _transaction_row(tx: Dict[str, Any], user_id: str, merchant_id: int, merchant_name: str) -> tuple:
+    """Flatten a Knot transaction into TRANSACTIONS insert values (typed columns only)"""
+    products = tx.get("products", [])
+    product_text = " ".join([p.get("name", "") for p in products[:10]])  # First 10 products
+    
+    price = tx.get("price", {})
+    total = price.get("total", "0")
+    payment_method, card_id = _extract_payment_info(tx)
+    
+    return (
+        tx.get("id", ""),
+        tx.get("external_id", ""),
+        user_id,
+        merchant_id,
+        merchant_name,
+        tx.get("datetime"),
+        tx.get("order_status", ""),
+        float(total) if total else 0,
+        price.get("currency", "USD"),
+        payment_method,
+        card_id,
+        product_text,
+    )
+
+
+def _raw_payload_row(tx: Dict[str, Any]) -> tuple:
+    """(tx_id, payload JSON) for TRANSACTION_RAW"""
+    return (tx.get("id", ""), json.dumps(tx))
+
+
+def _price_value(value: Any) -> Optional[float]:
+    """Knot prices arrive as strings ("12.99"); None when missing or unparseable"""
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _transaction_item_rows(tx: Dict[str, Any], user_id: str, merchant_id: int) -> List[tuple]:
+    """One TRANSACTION_ITEMS row per product (every product, not just the 10 in product_text)"""
+    rows = []
+    for position, product in enumerate(tx.get("products") or []):
+        price = product.get("price") or {}
+        quantity = _price_value(product.get("quantity")) or 1
+        unit_price = _price_value(price.get("unit_price"))
+        total_price = _price_value(price.get("total"))
+        # Fill whichever price is missing from the other (same rule as backfill_transaction_items)
+        if total_price is None and unit_price is not None:
+            total_price = unit_price * quantity
+        if unit_price is None and total_price is not None:
+            unit_price = total_price / quantity
+        rows.append((
+            tx.get("id", ""),
+            position,
+            user_id,
+            merchant_id,
+            product.get("name", ""),
+            quantity,
+            unit_price,
+            total_price,
+            tx.get("datetime"),
+        ))
+    return rows
+
+
+# Payment method points rules, evaluated top to bottom (first match wins).
+# Used both by calculate_points (Python) and recalculate_all_points (compiled SQL CASE).
+POINTS_RULES = [
+    {"payment_contains": "PAYPAL", "multiplier": 0, "reason": "PayPal (0x)"},
+    {"payment_contains": "DISCOVER", "multiplier": 1, "reason": "Discover (1x flat)"},
+    {"payment_contains": "VISA", "merchant_id": 44, "merchant_name_contains": "amazon",
+     "multiplier": 2, "reason": "Visa on Amazon (2x)"},
+    {"payment_contains": "VISA", "multiplier": 1, "reason": "Visa (1x)"},
+]
+DEFAULT_POINTS_MULTIPLIER = 1
+
+
+def match_points_rule(payment_method: Optional[str], merchant_id: Optional[int], merchant_name: Optional[str]) -> tuple:
+    """Return (multiplier, reason) for the first POINTS_RULES entry that matches"""
+    pm_upper = (payment_method or "").upper()
+    for rule in POINTS_RULES:
+        if rule["payment_contains"] not in pm_upper:
+            continue
+        if "merchant_id" in rule or "merchant_name_contains" in rule:
+            # Merchant conditions match on either the id or the name
+            id_match = "merchant_id" in rule and merchant_id == rule["merchant_id"]
+            name_match = ("merchant_name_contains" in rule and merchant_name
+                          and rule["merchant_name_contains"] in merchant_name.lower())
+            if not (id_match or name_match):
+                continue
+        return rule["multiplier"], rule["reason"]
+    return DEFAULT_POINTS_MULTIPLIER, f"{payment_method or 'Card'} (1x default)"
+
+
+def compile_points_case_sql() -> tuple:
+    """Compile POINTS_RULES into a points_earned CASE expression and its bind params"""
+    whens = []
+    params = []
+    for rule in POINTS_RULES:
+        condition = "UPPER(COALESCE(payment_method, '')) LIKE %s"
+        params.append(f"%{rule['payment_contains']}%")
+        merchant_conditions = []
+        if "merchant_id" in rule:
+            merchant_conditions.append("merchant_id = %s")
+            params.append(rule["merchant_id"])
+        if "merchant_name_contains" in rule:
+            merchant_conditions.append("LOWER(merchant_name) LIKE %s")
+            params.append(f"%{rule['merchant_name_contains']}%")
+        if merchant_conditions:
+            condition += " AND (" + " OR ".join(merchant_conditions) + ")"
+        whens.append(f"WHEN {condition} THEN TRUNC(COALESCE(total_amount, 0) * {rule['multiplier']})")
+    case_sql = "CASE " + " ".join(whens) + f" ELSE TRUNC(COALESCE(total_amount, 0) * {DEFAULT_POINTS_MULTIPLIER}) END"
+    return case_sql, params
+
+
+def points_update_sql(user_id: str = None, tx_ids: Optional[List[str]] = None) -> tuple:
+    """UPDATE statement (and params) that recalculates points_earned from POINTS_RULES"""
+    case_sql, params = compile_points_case_sql()
+    query = f"UPDATE TRANSACTIONS SET points_earned = {case_sql}"
+    conditions = []
+    if user_id:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if tx_ids is not None:
+        conditions.append(f"id IN ({', '.join(['%s'] * len(tx_ids))})")
+        params.extend(tx_ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query, tuple(params)
+
+
+def classify_unclassified_sql(min_confidence: float = None) -> tuple:
+    """Vector-similarity classification of every uncategorized row, entirely on the warehouse.
+    
+    Best matches below min_confidence are left unclassified (same floor as the local classifier).
+    """
+    confidence_filter = "AND matched.similarity >= %s" if min_confidence is not None else ""
+    query = f"""
+        UPDATE TRANSACTIONS t
+        SET 
+            category = matched.category,
+            category_confidence = matched.similarity
+        FROM (
+            SELECT 
+                tx.id,
+                cat.category,
+                VECTOR_COSINE_SIMILARITY(
+                    COALESCE(tx.product_embedding,
+                             SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', tx.product_text)),
+                    cat.embedding
+                ) AS similarity,
+                ROW_NUMBER() OVER (PARTITION BY tx.id ORDER BY similarity DESC) AS rn
+            FROM TRANSACTIONS tx
+            CROSS JOIN CATEGORY_EMBEDDINGS cat
+            WHERE tx.category IS NULL 
+              AND tx.product_text IS NOT NULL 
+              AND tx.product_text != ''
+        ) matched
+        WHERE t.id = matched.id AND matched.rn = 1 {confidence_filter}
+        """
+    return query, (float(min_confidence),) if min_confidence is not None else ()
+
+
+# payment_method derived from raw_json (mirrors _extract_payment_info), used by the payment_method backfill.
+# Expects TRANSACTION_RAW_JSON joined as r.
+PAYMENT_METHOD_FROM_RAW_SQL = """
+    CASE 
+        WHEN r.raw_json:payment_methods[0]:type::VARCHAR = 'PAYPAL' 
+             OR UPPER(r.raw_json:payment_methods[0]:brand::VARCHAR) = 'PAYPAL'
+        THEN 'PAYPAL'
+        ELSE COALESCE(
+            UPPER(r.raw_json:payment_methods[0]:brand::VARCHAR),
+            UPPER(r.raw_json:payment_methods[0]:type::VARCHAR),
+            'CARD'
+        )
+    END
+"""
+
+
+def _decode_raw_json(value: Any) -> Any:
+    """Decode a raw_json VARIANT value (returned as a JSON string by the connector)"""
+    if value and isinstance(value, str):
+        return json.loads(value)
+    return value if value else {}
+
+
+# Output field -> (TRANSACTIONS column, value converter) for get_transactions projections
+TRANSACTION_FIELDS = {
+    "id": ("id", None),
+    "external_id": ("external_id", None),
+    "merchant_id": ("merchant_id", None),
+    "merchant_name": ("merchant_name", None),
+    "datetime": ("datetime", lambda v: str(v) if v else None),
+    "order_status": ("order_status", None),
+    "total_amount": ("total_amount", lambda v: float(v) if v else 0),
+    "currency": ("currency", None),
+    "category": ("spend_category", None),
+    "category_confidence": ("category_confidence", lambda v: float(v) if v else None),
+    "points_earned": ("points_earned", lambda v: v if v is not None else 0),
+    "payment_method": ("payment_method", None),
+    "card_id": ("card_id", None),
+    # Not a TRANSACTIONS column: loaded from TRANSACTION_RAW after the page query
+    "raw_json": (None, _decode_raw_json),
+}
+
+
+def _resolve_transaction_fields(fields: Optional[List[str]], include_raw: bool) -> List[str]:
+    """Validate a requested projection; raw_json only when explicitly asked for"""
+    if fields:
+        unknown = [f for f in fields if f not in TRANSACTION_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown transaction fields: {', '.join(unknown)}")
+        resolved = list(dict.fromkeys(fields))
+    else:
+        resolved = [f for f in TRANSACTION_FIELDS if f != "raw_json"]
+    if include_raw and "raw_json" not in resolved:
+        resolved.append("raw_json")
+    return resolved
+
+
+def _encode_page_cursor(after_datetime: Any, after_id: str) -> str:
+    """Opaque keyset cursor for (datetime, id)"""
+    if after_datetime is not None and hasattr(after_datetime, "isoformat"):
+        after_datetime = after_datetime.isoformat()
+    elif after_datetime is not None:
+        after_datetime = str(after_datetime)
+    raw = json.dumps([after_datetime, after_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_page_cursor(cursor: str) -> tuple:
+    """Inverse of _encode_page_cursor; raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_datetime, after_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return after_datetime, after_id
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
 class SnowflakeDB:
     """Snowflake database operations for Dime"""
     
-    def __init__(self):
-        self._connection = None
-        self._cursor = None
+    def __init__(self, pool: Optional[ConnectionPool] = None, background_pool: Optional[ConnectionPool] = None):
+        self._pool = pool or ConnectionPool(
+            _connect,
+            max_size=POOL_CONFIG["max_size"],
+            wait_timeout=POOL_CONFIG["wait_timeout"],
+            idle_timeout=POOL_CONFIG["idle_timeout"],
+            health_check_after=POOL_CONFIG["health_check_after"],
+        )
+        # Used inside db_pool.background_lane(); an injected pool serves both lanes unless one is given
+        if background_pool is None and pool is not None:
+            background_pool = pool
+        self._background_pool = background_pool or ConnectionPool(
+            _connect,
+            max_size=POOL_CONFIG["background_max_size"],
+            wait_timeout=POOL_CONFIG["background_wait_timeout"],
+            idle_timeout=POOL_CONFIG["idle_timeout"],
+            health_check_after=POOL_CONFIG["health_check_after"],
+        )
+        # Connection held by the current thread, so nested calls share one session/transaction
+        self._local = threading.local()
+        # Read-through cache for list/analytics reads; every write bumps the user's version
+        self._cache = VersionedCache() if CACHE_CONFIG["enabled"] else None
+        # benefits_hash -> compiled multipliers, in front of the CARDS.benefits_multipliers lookup
+        self._compiled_benefits: Dict[str, Dict[str, float]] = {}
+        # In-memory tier of the CLASSIFICATION_CACHE table
+        self._classification_lru = ClassificationLRU() if CLASSIFICATION_CACHE_CONFIG["enabled"] else None
+        # Merchant/keyword rules tried before any Cortex call
+        self._fast_classifier = FastPathClassifier(SPEND_CATEGORIES) if FAST_PATH_CONFIG["enabled"] else None
+        # tx_id -> decoded order payload for the detail endpoint
+        self._raw_cache = VersionedCache(ttl_seconds=RAW_PAYLOAD_CONFIG["cache_ttl_seconds"],
+                                         max_entries=RAW_PAYLOAD_CONFIG["cache_max_entries"], namespace="raw")
+        metrics_registry.gauge("dime_snowflake_pool_connections", "Pooled Snowflake connections by pool and state",
+                               self._pool_gauge)
     
-    def _get_connection(self):
-        """Get or create Snowflake connection"""
-        if self._connection is None:
+    @contextmanager
+    def _get_connection(self, method: str):
+        """Check out a pooled connection with a fresh per-call cursor.
+        
+        method (the calling SnowflakeDB method) labels the cursor's query metrics.
+        Reentrant per thread: nested SnowflakeDB calls reuse the outer checkout so
+        commit=False batches still land in one transaction.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            cursor = TimedCursor(held.cursor(), method)
             try:
-                import snowflake.connector
-                self._connection = snowflake.connector.connect(
-                    account=SNOWFLAKE_CONFIG["account"],
-                    user=SNOWFLAKE_CONFIG["user"],
-                    password=SNOWFLAKE_CONFIG["password"],
-                    database=SNOWFLAKE_CONFIG["database"],
-                    schema=SNOWFLAKE_CONFIG["schema"],
-                    warehouse=SNOWFLAKE_CONFIG["warehouse"],
-                )
-                self._cursor = self._connection.cursor()
-            except Exception as e:
-                raise Exception(f"Failed to connect to Snowflake: {e}")
-        return self._connection, self._cursor
+                yield held, cursor
+            finally:
+                cursor.close()
+            return
+        
+        pool = self._background_pool if pool_lane.get() == "background" else self._pool
+        try:
+            conn = pool.checkout()
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to connect to Snowflake: {e}")
+        
+        self._local.conn = conn
+        discard = False
+        cursor = None
+        try:
+            self._apply_query_tag(conn)
+            cursor = TimedCursor(conn.cursor(), method)
+            yield conn, cursor
+        except Exception:
+            # Don't hand a half-finished transaction to the next borrower
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    discard = True
+            self._local.conn = None
+            pool.checkin(conn, discard=discard)
+    
+    def _apply_query_tag(self, conn):
+        """Set QUERY_TAG to the current route, only when it differs from the session's last tag"""
+        tag = query_tag()
+        if getattr(conn, "_dime_query_tag", None) == tag:
+            return
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("ALTER SESSION SET QUERY_TAG = %s", (tag,))
+            finally:
+                cursor.close()
+            conn._dime_query_tag = tag
+        except Exception as e:
+            print(f"⚠️  Could not set QUERY_TAG: {e}")
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool size and wait-time stats (interactive pool, background pool nested)"""
+        stats = self._pool.stats()
+        if self._background_pool is not self._pool:
+            stats["background"] = self._background_pool.stats()
+        return stats
+    
+    def _pool_gauge(self) -> Dict[tuple, float]:
+        series = {}
+        pools = [("interactive", self._pool)]
+        if self._background_pool is not self._pool:
+            pools.append(("background", self._background_pool))
+        for name, pool in pools:
+            stats = pool.stats()
+            series[(("pool", name), ("state", "in_use"))] = stats["in_use"]
+            series[(("pool", name), ("state", "idle"))] = stats["idle"]
+        return series
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Read cache hit/miss/eviction counters"""
+        if self._cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._cache.stats()}
+    
+    def _invalidate(self, user_id: Optional[str] = None):
+        """Bump the cached data version for a user (or everyone when the user is unknown)"""
+        if self._cache is None:
+            return
+        if user_id:
+            self._cache.invalidate_user(user_id)
+        else:
+            self._cache.invalidate_all()
     
     def test_connection(self) -> bool:
         """Test the Snowflake connection"""
         try:
-            conn, cursor = self._get_connection()
-            cursor.execute("SELECT CURRENT_VERSION()")
-            result = cursor.fetchone()
-            return {"connected": True, "version": result[0]}
+            with self._get_connection("test_connection") as (conn, cursor):
+                cursor.execute("SELECT CURRENT_VERSION()")
+                result = cursor.fetchone()
+                return {"connected": True, "version": result[0]}
         except Exception as e:
             return {"connected": False, "error": str(e)}
     
     def close(self):
-        """Close the connection"""
-        if self._cursor:
-            self._cursor.close()
-        if self._connection:
-            self._connection.close()
-        self._connection = None
-        self._cursor = None
+        """Close all pooled connections"""
+        self._pool.close_all()
+        self._background_pool.close_all()
     
     # ========== Schema Setup ==========
     
     def setup_tables(self):
         """Create required tables if they don't exist"""
-        conn, cursor = self._get_connection()
+        with self._get_connection("setup_tables") as (conn, cursor):
+            # First, create database and schema if they don't exist
+            db_name = SNOWFLAKE_CONFIG["database"]
+            schema_name = SNOWFLAKE_CONFIG["schema"]
+            warehouse = SNOWFLAKE_CONFIG["warehouse"]
+        
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
+            cursor.execute(f"USE DATABASE {db_name}")
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+            cursor.execute(f"USE SCHEMA {schema_name}")
+            cursor.execute(f"USE WAREHOUSE {warehouse}")
+        
+            # Cards table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS CARDS (
+                    card_id VARCHAR PRIMARY KEY,
+                    user_id VARCHAR,
+                    card_type VARCHAR(20),
+                    card_number_encrypted VARCHAR,
+                    cvv_encrypted VARCHAR,
+                    card_last_four VARCHAR(4),
+                    expiration VARCHAR(10),
+                    cardholder_name VARCHAR,
+                    billing_address VARCHAR,
+                    billing_city VARCHAR,
+                    billing_state VARCHAR(10),
+                    billing_zip VARCHAR(10),
+                    benefits TEXT,
+                    benefits_hash VARCHAR(64),
+                    benefits_multipliers VARIANT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
+        
+            # Add columns if they don't exist (for existing tables)
+            columns_to_add = [
+                "card_type VARCHAR(20)", 
+                "benefits TEXT", 
+                "cvv_encrypted VARCHAR", 
+                "cardholder_name VARCHAR",
+                "billing_address VARCHAR",
+                "billing_state VARCHAR(20)",
+                "billing_zip VARCHAR(20)",
+                "benefits_hash VARCHAR(64)",
+                "benefits_multipliers VARIANT"
+            ]
+            for col_def in columns_to_add:
+                try:
+                    # Snowflake ALTER TABLE ADD COLUMN IF NOT EXISTS requires this syntax
+                    cursor.execute(f"ALTER TABLE CARDS ADD COLUMN IF NOT EXISTS {col_def}")
+                except Exception as e:
+                    print(f"Note: Could not add column {col_def}: {e}")
         
-        # First, create database and schema if they don't exist
-        db_name = SNOWFLAKE_CONFIG["database"]
-        schema_name = SNOWFLAKE_CONFIG["schema"]
-        warehouse = SNOWFLAKE_CONFIG["warehouse"]
         
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
-        cursor.execute(f"USE DATABASE {db_name}")
-        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
-        cursor.execute(f"USE SCHEMA {schema_name}")
-        cursor.execute(f"USE WAREHOUSE {warehouse}")
+            # Transactions table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS TRANSACTIONS (
+                    id VARCHAR PRIMARY KEY,
+                    external_id VARCHAR,
+                    user_id VARCHAR,
+                    merchant_id INTEGER,
+                    merchant_name VARCHAR,
+                    datetime TIMESTAMP,
+                    order_status VARCHAR,
+                    total_amount DECIMAL(10,2),
+                    currency VARCHAR(3),
+                    category VARCHAR,
+                    category_confidence FLOAT,
+                    spend_category VARCHAR(50),
+                    points_earned INTEGER DEFAULT 0,
+                    payment_method VARCHAR(50),
+                    card_id VARCHAR,
+                    product_text VARCHAR,
+                    product_text_hash VARCHAR(64),
+                    product_embedding VECTOR(FLOAT, 768),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
+        
+            # Add new columns if they don't exist (for existing tables)
+            tx_columns = [
+                "spend_category VARCHAR(50)",
+                "points_earned INTEGER DEFAULT 0",
+                "payment_method VARCHAR(50)",
+                "card_id VARCHAR",
+                "product_text_hash VARCHAR(64)",
+                "product_embedding VECTOR(FLOAT, 768)"
+            ]
+            for col_def in tx_columns:
+                try:
+                    cursor.execute(f"ALTER TABLE TRANSACTIONS ADD COLUMN IF NOT EXISTS {col_def}")
+                except Exception as e:
+                    print(f"Note: Could not add column {col_def}: {e}")
         
-        # Cards table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS CARDS (
-                card_id VARCHAR PRIMARY KEY,
-                user_id VARCHAR,
-                card_type VARCHAR(20),
-                card_number_encrypted VARCHAR,
-                cvv_encrypted VARCHAR,
-                card_last_four VARCHAR(4),
-                expiration VARCHAR(10),
-                cardholder_name VARCHAR,
-                billing_address VARCHAR,
-                billing_city VARCHAR,
-                billing_state VARCHAR(10),
-                billing_zip VARCHAR(10),
-                benefits TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
-            )
-        """)
+            # Full Knot order payloads, kept out of the hot TRANSACTIONS table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS TRANSACTION_RAW (
+                    tx_id VARCHAR PRIMARY KEY,
+                    payload VARIANT,
+                    payload_zlib BINARY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
+            # Decoded view over either storage format, for SQL that reads the payload
+            cursor.execute("""
+                CREATE OR REPLACE VIEW TRANSACTION_RAW_JSON AS
+                SELECT tx_id,
+                       COALESCE(payload, TRY_PARSE_JSON(DECOMPRESS_STRING(payload_zlib, 'ZLIB'))) AS raw_json
+                FROM TRANSACTION_RAW
+            """)
+            if self._has_legacy_raw_column(cursor):
+                # Copying and dropping the old column is an explicit step, never a setup side effect
+                print("ℹ️  TRANSACTIONS.raw_json still exists; run POST /api/snowflake/migrate-raw-payloads")
+        
+            # One row per purchased product, flattened from raw_json:products at ingest
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS TRANSACTION_ITEMS (
+                    tx_id VARCHAR,
+                    position INTEGER,
+                    user_id VARCHAR,
+                    merchant_id INTEGER,
+                    name VARCHAR,
+                    quantity FLOAT,
+                    unit_price DECIMAL(10,2),
+                    total_price DECIMAL(10,2),
+                    datetime TIMESTAMP,
+                    PRIMARY KEY (tx_id, position)
+                )
+            """)
         
-        # Add columns if they don't exist (for existing tables)
-        columns_to_add = [
-            "card_type VARCHAR(20)", 
-            "benefits TEXT", 
-            "cvv_encrypted VARCHAR", 
-            "cardholder_name VARCHAR",
-            "billing_address VARCHAR",
-            "billing_state VARCHAR(20)",
-            "billing_zip VARCHAR(20)"
-        ]
-        for col_def in columns_to_add:
-            try:
-                # Snowflake ALTER TABLE ADD COLUMN IF NOT EXISTS requires this syntax
-                cursor.execute(f"ALTER TABLE CARDS ADD COLUMN IF NOT EXISTS {col_def}")
-            except Exception as e:
-                print(f"Note: Could not add column {col_def}: {e}")
+            # Progress of chunked column backfills (see backfill.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS BACKFILL_CHECKPOINTS (
+                    name VARCHAR PRIMARY KEY,
+                    status VARCHAR(20),
+                    last_id VARCHAR,
+                    rows_processed INTEGER DEFAULT 0,
+                    rows_updated INTEGER DEFAULT 0,
+                    batches INTEGER DEFAULT 0,
+                    error VARCHAR,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP(),
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
         
+            # Product text embeddings, one per distinct product_text (SHA2 hash)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS PRODUCT_EMBEDDINGS (
+                    text_hash VARCHAR(64) PRIMARY KEY,
+                    embedding VECTOR(FLOAT, 768),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
         
-        # Transactions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS TRANSACTIONS (
-                id VARCHAR PRIMARY KEY,
-                external_id VARCHAR,
-                user_id VARCHAR,
-                merchant_id INTEGER,
-                merchant_name VARCHAR,
-                datetime TIMESTAMP,
-                order_status VARCHAR,
-                total_amount DECIMAL(10,2),
-                currency VARCHAR(3),
-                category VARCHAR,
-                category_confidence FLOAT,
-                spend_category VARCHAR(50),
-                points_earned INTEGER DEFAULT 0,
-                payment_method VARCHAR(50),
-                card_id VARCHAR,
-                product_text VARCHAR,
-                raw_json VARIANT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
-            )
-        """)
+            # CLASSIFY_TEXT results keyed by normalized product_text || merchant_name hash
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS CLASSIFICATION_CACHE (
+                    text_hash VARCHAR(64),
+                    model_version VARCHAR(64),
+                    label VARCHAR(50),
+                    score FLOAT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP(),
+                    PRIMARY KEY (text_hash, model_version)
+                )
+            """)
         
-        # Add new columns if they don't exist (for existing tables)
-        tx_columns = [
-            "spend_category VARCHAR(50)",
-            "points_earned INTEGER DEFAULT 0",
-            "payment_method VARCHAR(50)",
-            "card_id VARCHAR"
-        ]
-        for col_def in tx_columns:
-            try:
-                cursor.execute(f"ALTER TABLE TRANSACTIONS ADD COLUMN IF NOT EXISTS {col_def}")
-            except Exception as e:
-                print(f"Note: Could not add column {col_def}: {e}")
+            # Category embeddings table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS CATEGORY_EMBEDDINGS (
+                    category VARCHAR PRIMARY KEY,
+                    description VARCHAR,
+                    embedding VECTOR(FLOAT, 768)
+                )
+            """)
+        
+            # Merchants table - connected merchants with top-of-file payment method
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS MERCHANTS (
+                    merchant_id INTEGER PRIMARY KEY,
+                    user_id VARCHAR,
+                    name VARCHAR,
+                    logo_url VARCHAR,
+                    top_of_file_payment VARCHAR DEFAULT 'paypal',
+                    connected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP(),
+                    last_transaction_at TIMESTAMP
+                )
+            """)
+        
+            # Daily spend rollup - pre-aggregated analytics, maintained on every write path
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS DAILY_SPEND_ROLLUP (
+                    user_id VARCHAR,
+                    day DATE,
+                    category VARCHAR,
+                    spend_category VARCHAR(50),
+                    payment_method VARCHAR(50),
+                    tx_count INTEGER,
+                    total_spent DECIMAL(14,2),
+                    total_points INTEGER,
+                    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+                )
+            """)
+        
+            # Knot sync watermarks - resume cursor per (user, merchant)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS KNOT_SYNC_STATE (
+                    user_id VARCHAR,
+                    merchant_id INTEGER,
+                    sync_cursor VARCHAR,
+                    pages_fetched INTEGER DEFAULT 0,
+                    transactions_synced INTEGER DEFAULT 0,
+                    last_synced_at TIMESTAMP,
+                    PRIMARY KEY (user_id, merchant_id)
+                )
+            """)
         
-        # Category embeddings table
+            conn.commit()
+            return {"success": True, "message": "Database, schema, and tables created"}
+
+    @staticmethod
+    def _has_legacy_raw_column(cursor) -> bool:
+        """True while TRANSACTIONS still has the pre-split raw_json column"""
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS CATEGORY_EMBEDDINGS (
-                category VARCHAR PRIMARY KEY,
-                description VARCHAR,
-                embedding VECTOR(FLOAT, 768)
-            )
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME = 'TRANSACTIONS' AND COLUMN_NAME = 'RAW_JSON'
+        """)
+        row = cursor.fetchone()
+        return bool(row and row[0])
+    
+    def migrate_raw_payloads(self, drop_column: bool = False) -> Dict[str, Any]:
+        """Copy TRANSACTIONS.raw_json into TRANSACTION_RAW; drop the old column only if asked and verified"""
+        with self._get_connection("migrate_raw_payloads") as (conn, cursor):
+            result = self._migrate_raw_payloads(cursor, drop_column)
+            conn.commit()
+        self._raw_cache.invalidate_all()
+        return result
+    
+    def _migrate_raw_payloads(self, cursor, drop_column: bool = False) -> Dict[str, Any]:
+        """Copy legacy payloads (idempotent), then check every one reads back identically.
+        
+        The column is dropped only when drop_column is set and the check passed, so a
+        partial copy or a bad COMPRESS round-trip never loses a payload.
+        """
+        result = {"legacy_column": False, "copied": 0, "source_rows": 0, "verified_rows": 0,
+                  "verified": False, "dropped": False}
+        if not self._has_legacy_raw_column(cursor):
+            result["verified"] = True
+            return result
+        result["legacy_column"] = True
+        
+        cursor.execute(f"""
+            INSERT INTO TRANSACTION_RAW (tx_id, payload, payload_zlib)
+            SELECT t.id, {self._raw_payload_sql("TO_JSON(t.raw_json)")}
+            FROM TRANSACTIONS t
+            WHERE t.raw_json IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM TRANSACTION_RAW r WHERE r.tx_id = t.id)
         """)
+        result["copied"] = cursor.rowcount or 0
         
-        # Merchants table - connected merchants with top-of-file payment method
+        # Compare through the decoding view, so compressed copies are checked after DECOMPRESS
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS MERCHANTS (
-                merchant_id INTEGER PRIMARY KEY,
-                user_id VARCHAR,
-                name VARCHAR,
-                logo_url VARCHAR,
-                top_of_file_payment VARCHAR DEFAULT 'paypal',
-                connected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP(),
-                last_transaction_at TIMESTAMP
-            )
+            SELECT COUNT_IF(t.raw_json IS NOT NULL),
+                   COUNT_IF(t.raw_json IS NOT NULL AND r.raw_json = t.raw_json)
+            FROM TRANSACTIONS t
+            LEFT JOIN TRANSACTION_RAW_JSON r ON r.tx_id = t.id
         """)
-        
-        conn.commit()
-        return {"success": True, "message": "Database, schema, and tables created"}
-
+        source_rows, verified_rows = cursor.fetchone()
+        result["source_rows"], result["verified_rows"] = int(source_rows or 0), int(verified_rows or 0)
+        result["verified"] = result["source_rows"] == result["verified_rows"]
+        print(f"🧊 Copied {result['copied']} raw payloads to TRANSACTION_RAW; "
+              f"{result['verified_rows']}/{result['source_rows']} verified")
+        
+        if drop_column and result["verified"]:
+            cursor.execute("ALTER TABLE TRANSACTIONS DROP COLUMN raw_json")
+            result["dropped"] = True
+            print("🧊 Dropped TRANSACTIONS.raw_json")
+        elif drop_column:
+            print("⚠️  Keeping TRANSACTIONS.raw_json: not every payload verified in TRANSACTION_RAW")
+        return result
+    
+    @staticmethod
+    def _raw_payload_sql(text_expr: str) -> str:
+        """payload, payload_zlib insert expressions for a JSON text expression"""
+        if RAW_PAYLOAD_CONFIG["compress"]:
+            return f"NULL, COMPRESS({text_expr}, 'ZLIB')"
+        return f"PARSE_JSON({text_expr}), NULL"
+    
     def reset_database(self):
         """DROP and RECREATE all tables"""
-        conn, cursor = self._get_connection()
-        try:
-            # Drop tables individually
-            cursor.execute("DROP TABLE IF EXISTS TRANSACTIONS")
-            cursor.execute("DROP TABLE IF EXISTS CARDS")
-            cursor.execute("DROP TABLE IF EXISTS MERCHANTS")
-            cursor.execute("DROP TABLE IF EXISTS CATEGORY_EMBEDDINGS")
-            conn.commit()
-            return self.setup_tables()
-        except Exception as e:
-            conn.rollback()
-            raise e
+        with self._get_connection("reset_database") as (conn, cursor):
+            try:
+                # Drop tables individually
+                cursor.execute("DROP TABLE IF EXISTS TRANSACTIONS")
+                cursor.execute("DROP TABLE IF EXISTS TRANSACTION_ITEMS")
+                cursor.execute("DROP VIEW IF EXISTS TRANSACTION_RAW_JSON")
+                cursor.execute("DROP TABLE IF EXISTS TRANSACTION_RAW")
+                cursor.execute("DROP TABLE IF EXISTS CARDS")
+                cursor.execute("DROP TABLE IF EXISTS MERCHANTS")
+                cursor.execute("DROP TABLE IF EXISTS CATEGORY_EMBEDDINGS")
+                cursor.execute("DROP TABLE IF EXISTS PRODUCT_EMBEDDINGS")
+                cursor.execute("DROP TABLE IF EXISTS CLASSIFICATION_CACHE")
+                cursor.execute("DROP TABLE IF EXISTS BACKFILL_CHECKPOINTS")
+                cursor.execute("DROP TABLE IF EXISTS KNOT_SYNC_STATE")
+                cursor.execute("DROP TABLE IF EXISTS DAILY_SPEND_ROLLUP")
+                conn.commit()
+                # Every worker's cached reads and payloads refer to dropped rows
+                self._raw_cache.invalidate_all()
+                self._invalidate()
+                return self.setup_tables()
+            except Exception as e:
+                conn.rollback()
+                raise e
     
     def populate_category_embeddings(self):
         """Pre-compute embeddings for categories using Cortex"""
-        conn, cursor = self._get_connection()
+        with self._get_connection("populate_category_embeddings") as (conn, cursor):
+            for category, description in CATEGORIES:
+                cursor.execute(f"""
+                    MERGE INTO CATEGORY_EMBEDDINGS AS target
+                    USING (
+                        SELECT 
+                            %s AS category,
+                            %s AS description,
+                            SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', %s) AS embedding
+                    ) AS source
+                    ON target.category = source.category
+                    WHEN NOT MATCHED THEN
+                        INSERT (category, description, embedding)
+                        VALUES (source.category, source.description, source.embedding)
+                """, (category, description, description))
         
-        for category, description in CATEGORIES:
-            cursor.execute("""
-                MERGE INTO CATEGORY_EMBEDDINGS AS target
-                USING (
-                    SELECT 
-                        %s AS category,
-                        %s AS description,
-                        SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m-v1.5', %s) AS embedding
-                ) AS source
-                ON target.category = source.category
-                WHEN NOT MATCHED THEN
-                    INSERT (category, description, embedding)
-                    VALUES (source.category, source.description, source.embedding)
-            """, (category, description, description))
+            conn.commit()
         
-        conn.commit()
+        # Local classifier reloads the category matrix on next use
+        try:
+            from vector_classifier import reset_classifier
+            reset_classifier()
+        except ImportError:
+            pass
         return {"success": True, "categories": len(CATEGORIES)}
     
     # ========== Card Operations ==========
     
     def save_card(self, card_data: Dict[str, Any], user_id: str = "aman") -> Dict[str, Any]:
-        """Save a card with encryption and full address"""
-        conn, cursor = self._get_connection()
-        
-        card_id = card_data.get("card_id") or str(uuid.uuid4())
-        card_number = card_data.get("card_number", "")
-        cvv = card_data.get("cvv", "")
-        last_four = card_number[-4:] if len(card_number) >= 4 else "****"
-        
-        # Super simple encryption fallback
-        try:
-            enc_number = encrypt_card_data(card_number)
-            enc_cvv = encrypt_card_data(cvv)
-        except:
-            enc_number = f"plain_{card_number}"
-            enc_cvv = f"plain_{cvv}"
+        """Save a card with encryption, full address and compiled benefit multipliers"""
+        with self._get_connection("save_card") as (conn, cursor):
+            card_id = card_data.get("card_id") or str(uuid.uuid4())
+            benefits = card_data.get("benefits", "")
+            multipliers = self.compile_benefits(benefits)
+            card_number = card_data.get("card_number", "")
+            cvv = card_data.get("cvv", "")
+            last_four = card_number[-4:] if len(card_number) >= 4 else "****"
+        
+            # Super simple encryption fallback
+            try:
+                enc_number = encrypt_card_data(card_number)
+                enc_cvv = encrypt_card_data(cvv)
+            except:
+                enc_number = f"plain_{card_number}"
+                enc_cvv = f"plain_{cvv}"
 
-        try:
-            cursor.execute("""
-                INSERT INTO CARDS (
-                    card_id, user_id, card_type, card_number_encrypted, 
-                    cvv_encrypted, card_last_four, expiration, cardholder_name,
-                    billing_address, billing_city, billing_state, billing_zip, benefits
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                card_id, user_id, card_data.get("card_type", "unknown"),
-                enc_number, enc_cvv, last_four, 
-                card_data.get("expiration", ""), 
-                card_data.get("cardholder_name") or card_data.get("cardholder", ""),
-                card_data.get("billing_address", ""),
-                card_data.get("billing_city", ""),
-                card_data.get("billing_state", ""),
-                card_data.get("billing_zip", ""),
-                card_data.get("benefits", "")
-            ))
-            conn.commit()
-            return {"success": True, "card_id": card_id}
-        except Exception as e:
-            print(f"❌ ERROR saving card: {e}")
-            raise e
+            try:
+                cursor.execute("""
+                    INSERT INTO CARDS (
+                        card_id, user_id, card_type, card_number_encrypted, 
+                        cvv_encrypted, card_last_four, expiration, cardholder_name,
+                        billing_address, billing_city, billing_state, billing_zip, benefits,
+                        benefits_hash, benefits_multipliers
+                    ) SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, PARSE_JSON(%s)
+                """, (
+                    card_id, user_id, card_data.get("card_type", "unknown"),
+                    enc_number, enc_cvv, last_four, 
+                    card_data.get("expiration", ""), 
+                    card_data.get("cardholder_name") or card_data.get("cardholder", ""),
+                    card_data.get("billing_address", ""),
+                    card_data.get("billing_city", ""),
+                    card_data.get("billing_state", ""),
+                    card_data.get("billing_zip", ""),
+                    benefits,
+                    benefits_hash(benefits),
+                    json.dumps(multipliers) if multipliers else None
+                ))
+                conn.commit()
+                self._invalidate(user_id)
+                return {"success": True, "card_id": card_id}
+            except Exception as e:
+                print(f"❌ ERROR saving card: {e}")
+                raise e
 
     def delete_card(self, card_id: str, user_id: str = "aman") -> bool:
         """Delete a card from Snowflake"""
-        conn, cursor = self._get_connection()
-        try:
-            cursor.execute("DELETE FROM CARDS WHERE card_id = %s AND user_id = %s", (card_id, user_id))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"❌ ERROR deleting card: {e}")
-            return False
+        with self._get_connection("delete_card") as (conn, cursor):
+            try:
+                cursor.execute("DELETE FROM CARDS WHERE card_id = %s AND user_id = %s", (card_id, user_id))
+                conn.commit()
+                self._invalidate(user_id)
+                return True
+            except Exception as e:
+                print(f"❌ ERROR deleting card: {e}")
+                return False
     
+    @cached_read
     def get_cards(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get cards from Snowflake (masked numbers)"""
-        conn, cursor = self._get_connection()
+        with self._get_connection("get_cards") as (conn, cursor):
+            query = """
+                SELECT card_id, card_type, card_last_four, expiration, 
+                       cardholder_name, billing_city, billing_state, benefits, created_at,
+                       benefits_multipliers
+                FROM CARDS
+            """
+        
+            if user_id:
+                query += " WHERE user_id = %s"
+                params = (user_id,)
+            else:
+                params = ()
+            
+            query += " ORDER BY created_at DESC"
         
-        query = """
-            SELECT card_id, card_type, card_last_four, expiration, 
-                   cardholder_name, billing_city, billing_state, benefits, created_at
-            FROM CARDS
-        """
+            cursor.execute(query, params)
         
-        if user_id:
-            query += " WHERE user_id = %s"
-            params = (user_id,)
-        else:
-            params = ()
+            rows = cursor.fetchall()
+            cards = []
+            for row in rows:
+                # Try to infer cardholder if name column was old format
+                cardholder = row[4] if row[4] else "Unknown User"
             
-        query += " ORDER BY created_at DESC"
+                cards.append({
+                    "card_id": row[0],
+                    "card_type": row[1] or "Unknown",
+                    "last_four": row[2],
+                    "card_number": f"****{row[2]}",
+                    "expiration": row[3],
+                    "cardholder": cardholder,
+                    "location": f"{row[5]}, {row[6]}".strip(", "),
+                    "benefits": row[7] or "",
+                    "multipliers": _decode_raw_json(row[9]),
+                    "created_at": str(row[8]) if row[8] else None,
+                })
+            return cards
+    
+    def compile_benefits(self, benefits_text: str) -> Dict[str, float]:
+        """Benefits text -> {category: multiplier}, parsed with Cortex at most once per distinct text"""
+        if not benefits_text or not benefits_text.strip():
+            return {}
+        text_hash = benefits_hash(benefits_text)
+        cached = self._compiled_benefits.get(text_hash)
+        if cached is not None:
+            return dict(cached)
         
-        cursor.execute(query, params)
+        with self._get_connection("compile_benefits") as (conn, cursor):
+            # Another card (or an earlier save of this one) may already carry the same text
+            cursor.execute("""
+                SELECT benefits_multipliers FROM CARDS
+                WHERE benefits_hash = %s AND benefits_multipliers IS NOT NULL
+                LIMIT 1
+            """, (text_hash,))
+            row = cursor.fetchone()
         
-        rows = cursor.fetchall()
-        cards = []
-        for row in rows:
-            # Try to infer cardholder if name column was old format
-            cardholder = row[4] if row[4] else "Unknown User"
-            
-            cards.append({
-                "card_id": row[0],
-                "card_type": row[1] or "Unknown",
-                "last_four": row[2],
-                "card_number": f"****{row[2]}",
-                "expiration": row[3],
-                "cardholder": cardholder,
-                "location": f"{row[5]}, {row[6]}".strip(", "),
-                "benefits": row[7] or "",
-                "created_at": str(row[8]) if row[8] else None,
-            })
-        return cards
+        if row and row[0]:
+            multipliers = _numeric_multipliers(_decode_raw_json(row[0]))
+        else:
+            multipliers = _numeric_multipliers(self.parse_benefits_with_ai(benefits_text))
+            print(f"🧾 Compiled benefits {text_hash[:8]}: {multipliers}")
+        
+        # Empty results may be a failed parse; leave them uncached so the next save retries
+        if multipliers:
+            self._compiled_benefits[text_hash] = dict(multipliers)
+        return multipliers
+    
+    def backfill_card_benefits(self, user_id: str = None) -> Dict[str, Any]:
+        """Compile multipliers for cards saved before benefits_multipliers existed"""
+        with self._get_connection("backfill_card_benefits") as (conn, cursor):
+            query = """
+                SELECT card_id, user_id, benefits FROM CARDS
+                WHERE benefits_multipliers IS NULL AND COALESCE(benefits, '') <> ''
+            """
+            params = ()
+            if user_id:
+                query += " AND user_id = %s"
+                params = (user_id,)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        
+            compiled = 0
+            users = set()
+            for card_id, card_user_id, benefits in rows:
+                multipliers = self.compile_benefits(benefits)
+                if not multipliers:
+                    continue
+                cursor.execute("""
+                    UPDATE CARDS SET benefits_hash = %s, benefits_multipliers = PARSE_JSON(%s)
+                    WHERE card_id = %s
+                """, (benefits_hash(benefits), json.dumps(multipliers), card_id))
+                compiled += 1
+                users.add(card_user_id)
+            conn.commit()
+        
+        # Rankings come from the compiled card index, not the read cache: drop both, in every worker
+        for card_user_id in users:
+            self._invalidate(card_user_id)
+            card_indexes.invalidate(card_user_id)
+        return {"success": True, "cards": len(rows), "compiled": compiled}
     
     # ========== Transaction Operations ==========
     
     def save_transaction(self, tx: Dict[str, Any], user_id: str, merchant_id: int, merchant_name: str, commit: bool = True) -> Dict[str, Any]:
         """Save a transaction to Snowflake"""
-        conn, cursor = self._get_connection()
-        
-        tx_id = tx.get("id", "")
-        products = tx.get("products", [])
-        product_text = " ".join([p.get("name", "") for p in products[:10]])  # First 10 products
-        
-        price = tx.get("price", {})
-        total = price.get("total", "0")
-        
-        # Extract payment method and card_id from Knot transaction
-        payment_methods = tx.get("payment_methods", [])
-        payment_method = None
-        card_id = tx.get("card_id") or tx.get("account_id") # Try Knot fields
-        
-        if payment_methods:
-            pm = payment_methods[0]
-            # Check type first (PAYPAL, CARD, etc.), then brand (VISA, PAYPAL, etc.)
-            pm_type = pm.get("type", "").upper()
-            pm_brand = pm.get("brand", "").upper()
-            if not card_id:
-                card_id = pm.get("external_id") # Fallback to payment method external id
-                
-            if pm_type == "PAYPAL" or pm_brand == "PAYPAL":
-                payment_method = "PAYPAL"
-            else:
-                payment_method = pm_brand or pm_type or "CARD"
+        with self._get_connection("save_transaction") as (conn, cursor):
+            row = _transaction_row(tx, user_id, merchant_id, merchant_name)
+            tx_id, payment_method, card_id = row[0], row[9], row[10]
         
-        cursor.execute("""
-            MERGE INTO TRANSACTIONS AS target
-            USING (SELECT %s AS id) AS source
-            ON target.id = source.id
-            WHEN NOT MATCHED THEN
-                INSERT (id, external_id, user_id, merchant_id, merchant_name,
-                        datetime, order_status, total_amount, currency, payment_method, 
-                        card_id, product_text, raw_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, PARSE_JSON(%s))
-            WHEN MATCHED THEN
-                UPDATE SET payment_method = %s, card_id = COALESCE(target.card_id, %s)
-        """, (
-            tx_id,
-            tx_id,
-            tx.get("external_id", ""),
-            user_id,
-            merchant_id,
-            merchant_name,
-            tx.get("datetime"),
-            tx.get("order_status", ""),
-            float(total) if total else 0,
-            price.get("currency", "USD"),
-            payment_method,
-            card_id,
-            product_text,
-            json.dumps(tx),
-            payment_method,  # For the UPDATE clause
-            card_id         # For the UPDATE clause
-        ))
+            cursor.execute("""
+                MERGE INTO TRANSACTIONS AS target
+                USING (SELECT %s AS id) AS source
+                ON target.id = source.id
+                WHEN NOT MATCHED THEN
+                    INSERT (id, external_id, user_id, merchant_id, merchant_name,
+                            datetime, order_status, total_amount, currency, payment_method, 
+                            card_id, product_text)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                WHEN MATCHED THEN
+                    UPDATE SET payment_method = %s, card_id = COALESCE(target.card_id, %s)
+            """, (
+                tx_id,
+                *row,
+                payment_method,  # For the UPDATE clause
+                card_id         # For the UPDATE clause
+            ))
+            self._merge_raw_payloads(cursor, [_raw_payload_row(tx)])
+            self._merge_transaction_items(cursor, _transaction_item_rows(tx, user_id, merchant_id))
+        
+            if commit:
+                conn.commit()
+                self._refresh_rollup_safely(tx_ids=[tx_id], user_id=user_id)
+            return {"success": True, "id": tx_id, "payment_method": payment_method}
+    
+    def save_transactions_bulk(self, transactions: List[Dict], user_id: str, merchant_id: int, merchant_name: str, commit: bool = True) -> Dict[str, Any]:
+        """Stage a whole batch as one multi-row VALUES source and apply it with a single MERGE"""
+        started = time.perf_counter()
+        
+        # Build rows in Python first; bad rows are skipped like the per-row path did
+        rows_by_id = {}
+        raw_by_id = {}
+        items_by_id = {}
+        skipped = 0
+        for tx in transactions:
+            try:
+                row = _transaction_row(tx, user_id, merchant_id, merchant_name)
+                raw = _raw_payload_row(tx)
+                items = _transaction_item_rows(tx, user_id, merchant_id)
+            except Exception as e:
+                print(f"Error saving transaction {tx.get('id')}: {e}")
+                skipped += 1
+                continue
+            # MERGE rejects duplicate source keys, last occurrence wins
+            rows_by_id[row[0]] = row
+            raw_by_id[row[0]] = raw
+            items_by_id[row[0]] = items
+        rows = list(rows_by_id.values())
+        item_rows = [item for items in items_by_id.values() for item in items]
+        
+        statements = 0
+        inserted = 0
+        with self._get_connection("save_transactions_bulk") as (conn, cursor):
+            for i in range(0, len(rows), BULK_MERGE_CHUNK_SIZE):
+                chunk = rows[i:i + BULK_MERGE_CHUNK_SIZE]
+                placeholders = ", ".join(["(" + ", ".join(["%s"] * TRANSACTION_ROW_WIDTH) + ")"] * len(chunk))
+                params = [value for row in chunk for value in row]
+                cursor.execute(f"""
+                    MERGE INTO TRANSACTIONS AS target
+                    USING (
+                        SELECT column1 AS id, column2 AS external_id, column3 AS user_id,
+                               column4 AS merchant_id, column5 AS merchant_name,
+                               TRY_TO_TIMESTAMP(column6) AS datetime, column7 AS order_status,
+                               column8 AS total_amount, column9 AS currency,
+                               column10 AS payment_method, column11 AS card_id,
+                               column12 AS product_text
+                        FROM VALUES {placeholders}
+                    ) AS source
+                    ON target.id = source.id
+                    WHEN NOT MATCHED THEN
+                        INSERT (id, external_id, user_id, merchant_id, merchant_name,
+                                datetime, order_status, total_amount, currency, payment_method,
+                                card_id, product_text)
+                        VALUES (source.id, source.external_id, source.user_id, source.merchant_id,
+                                source.merchant_name, source.datetime, source.order_status,
+                                source.total_amount, source.currency, source.payment_method,
+                                source.card_id, source.product_text)
+                    WHEN MATCHED THEN
+                        UPDATE SET payment_method = source.payment_method,
+                                   card_id = COALESCE(target.card_id, source.card_id)
+                """, tuple(params))
+                statements += 1
+                # MERGE returns (rows inserted, rows updated)
+                counts = cursor.fetchone()
+                if counts:
+                    inserted += counts[0] or 0
+            statements += self._merge_raw_payloads(cursor, list(raw_by_id.values()))
+            statements += self._merge_transaction_items(cursor, item_rows)
+        
+            if commit:
+                conn.commit()
+                self._refresh_rollup_safely(tx_ids=[row[0] for row in rows], user_id=user_id)
         
-        if commit:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"💾 Bulk merged {len(rows)} transactions in {statements} statement(s), {elapsed_ms:.1f} ms")
+        return {
+            "success": True,
+            "ids": [row[0] for row in rows],
+            "saved": len(rows),
+            "inserted": inserted,
+            "items": len(item_rows),
+            "skipped": skipped,
+            "statements": statements,
+            "merge_ms": round(elapsed_ms, 1),
+        }
+    
+    def _merge_raw_payloads(self, cursor, raw_rows: List[tuple]) -> int:
+        """Insert (tx_id, payload JSON) rows into TRANSACTION_RAW if absent; returns statements run"""
+        statements = 0
+        for i in range(0, len(raw_rows), BULK_MERGE_CHUNK_SIZE):
+            chunk = raw_rows[i:i + BULK_MERGE_CHUNK_SIZE]
+            placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(f"""
+                MERGE INTO TRANSACTION_RAW AS target
+                USING (
+                    SELECT column1 AS tx_id, column2 AS payload_text
+                    FROM VALUES {placeholders}
+                ) AS source
+                ON target.tx_id = source.tx_id
+                WHEN NOT MATCHED THEN
+                    INSERT (tx_id, payload, payload_zlib)
+                    VALUES (source.tx_id, {self._raw_payload_sql("source.payload_text")})
+            """, tuple(value for row in chunk for value in row))
+            statements += 1
+        return statements
+    
+    def _merge_transaction_items(self, cursor, item_rows: List[tuple]) -> int:
+        """Insert TRANSACTION_ITEMS rows not already present (keyed by tx_id, position); returns statements run"""
+        statements = 0
+        for i in range(0, len(item_rows), BULK_MERGE_CHUNK_SIZE):
+            chunk = item_rows[i:i + BULK_MERGE_CHUNK_SIZE]
+            placeholders = ", ".join(["(" + ", ".join(["%s"] * TRANSACTION_ITEM_ROW_WIDTH) + ")"] * len(chunk))
+            cursor.execute(f"""
+                MERGE INTO TRANSACTION_ITEMS AS target
+                USING (
+                    SELECT column1 AS tx_id, column2 AS position, column3 AS user_id,
+                           column4 AS merchant_id, column5 AS name, column6 AS quantity,
+                           column7 AS unit_price, column8 AS total_price,
+                           TRY_TO_TIMESTAMP(column9) AS datetime
+                    FROM VALUES {placeholders}
+                ) AS source
+                ON target.tx_id = source.tx_id AND target.position = source.position
+                WHEN NOT MATCHED THEN
+                    INSERT (tx_id, position, user_id, merchant_id, name, quantity, unit_price, total_price, datetime)
+                    VALUES (source.tx_id, source.position, source.user_id, source.merchant_id, source.name,
+                            source.quantity, source.unit_price, source.total_price, source.datetime)
+            """, tuple(value for row in chunk for value in row))
+            statements += 1
+        return statements
+    
+    def backfill_transaction_items(self, tx_ids: List[str]) -> int:
+        """Flatten raw_json:products into TRANSACTION_ITEMS for transactions that have no items yet"""
+        if not tx_ids:
+            return 0
+        placeholders = ", ".join(["%s"] * len(tx_ids))
+        with self._get_connection("backfill_transaction_items") as (conn, cursor):
+            cursor.execute(f"""
+                INSERT INTO TRANSACTION_ITEMS
+                    (tx_id, position, user_id, merchant_id, name, quantity, unit_price, total_price, datetime)
+                SELECT tx_id, position, user_id, merchant_id, name, quantity,
+                       COALESCE(unit_price, total_price / quantity),
+                       COALESCE(total_price, unit_price * quantity),
+                       datetime
+                FROM (
+                    SELECT t.id AS tx_id, p.index AS position, t.user_id, t.merchant_id,
+                           COALESCE(p.value:name::VARCHAR, '') AS name,
+                           COALESCE(NULLIF(TRY_TO_DOUBLE(p.value:quantity::VARCHAR), 0), 1) AS quantity,
+                           TRY_TO_DOUBLE(p.value:price:unit_price::VARCHAR) AS unit_price,
+                           TRY_TO_DOUBLE(p.value:price:total::VARCHAR) AS total_price,
+                           t.datetime
+                    FROM TRANSACTIONS t
+                    JOIN TRANSACTION_RAW_JSON r ON r.tx_id = t.id,
+                    LATERAL FLATTEN(input => r.raw_json:products) p
+                    WHERE t.id IN ({placeholders})
+                      AND NOT EXISTS (SELECT 1 FROM TRANSACTION_ITEMS i WHERE i.tx_id = t.id)
+                )
+            """, tuple(tx_ids))
+            inserted = cursor.rowcount or 0
             conn.commit()
-        return {"success": True, "id": tx_id, "payment_method": payment_method}
+        self._invalidate()
+        return inserted
     
-    def save_transactions_batch(self, transactions: List[Dict], user_id: str, merchant_id: int, merchant_name: str) -> Dict[str, Any]:
-        """Save multiple transactions with a single commit and auto-categorize"""
-        saved = 0
-        categorized = 0
-        conn, cursor = self._get_connection()
+    def save_transactions_batch(self, transactions: List[Dict], user_id: str, merchant_id: int, merchant_name: str, background: bool = False) -> Dict[str, Any]:
+        """Save multiple transactions with one set-based MERGE and auto-categorize.
         
-        try:
-            tx_ids = []
-            for tx in transactions:
-                try:
-                    result = self.save_transaction(tx, user_id, merchant_id, merchant_name, commit=False)
-                    tx_ids.append(result["id"])
-                    saved += 1
-                except Exception as e:
-                    print(f"Error saving transaction {tx.get('id')}: {e}")
-                    # Continue with other transactions instead of failing completely
-                    continue
+        With background=True the rows are committed and categorization + points are
+        handed to the job queue instead of running inside the caller's request.
+        """
+        categorized = 0
+        categorize_ms = 0.0
+        job_id = None
+        with self._get_connection("save_transactions_batch") as (conn, cursor):
+            try:
+                bulk = self.save_transactions_bulk(transactions, user_id, merchant_id, merchant_name)
+                tx_ids = bulk["ids"]
             
-            # Commit all changes at once
-            conn.commit()
+                if background:
+                    if tx_ids:
+                        from jobs import get_queue
+                        job_id = get_queue().enqueue("categorize_and_points", {"tx_ids": tx_ids}, user_id=user_id)
+                        print(f"📬 Queued categorization job {job_id} for {len(tx_ids)} transactions")
+                else:
+                    # Auto-categorize newly saved transactions
+                    categorize_started = time.perf_counter()
+                    print(f"🤖 Auto-categorizing {len(tx_ids)} new transactions...")
+                    try:
+                        self.embed_transactions(tx_ids)
+                    except Exception as e:
+                        print(f"⚠️  Embedding skipped: {e}")
+                    try:
+                        categorized = self.categorize_transactions_batch(tx_ids, user_id=user_id)["categorized"]
+                    except Exception as e:
+                        print(f"⚠️  Categorization skipped: {e}")
+                    categorize_ms = (time.perf_counter() - categorize_started) * 1000
+                
+                    print(f"✅ Categorized {categorized}/{len(tx_ids)} transactions")
             
-            # Auto-categorize newly saved transactions
-            print(f"🤖 Auto-categorizing {len(tx_ids)} new transactions...")
-            for tx_id in tx_ids:
+            except Exception as e:
+                print(f"Error committing batch: {e}")
+                # Rollback to release locks
                 try:
-                    result = self.categorize_transaction_ai(tx_id)
-                    if result.get("spend_category"):
-                        categorized += 1
-                except Exception as e:
-                    print(f"⚠️  Categorization skipped for {tx_id}: {e}")
-                    continue
-            
-            print(f"✅ Categorized {categorized}/{len(tx_ids)} transactions")
+                    conn.rollback()
+                except:
+                    pass
+                raise e
             
-        except Exception as e:
-            print(f"Error committing batch: {e}")
-            # Rollback to release locks
-            try:
-                conn.rollback()
-            except:
-                pass
-            raise e
-            
-        return {"success": True, "saved": saved, "categorized": categorized, "total": len(transactions)}
+            return {
+                "success": True,
+                "saved": bulk["saved"],
+                "inserted": bulk["inserted"],
+                "categorized": categorized,
+                "total": len(transactions),
+                "job_id": job_id,
+                "timing": {
+                    "merge_ms": bulk["merge_ms"],
+                    "merge_statements": bulk["statements"],
+                    "categorize_ms": round(categorize_ms, 1),
+                },
+            }
     
-    def get_transactions(self, user_id: str, merchant_id: Optional[int] = None, limit: int = 50, card_id: Optional[str] = None, card_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_transactions(self, user_id: str, merchant_id: Optional[int] = None, limit: int = 50, card_id: Optional[str] = None, card_type: Optional[str] = None,
+                         cursor: Optional[str] = None, include_raw: bool = False, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get transactions from Snowflake with fallback card_type filtering"""
-        conn, cursor = self._get_connection()
+        return self.get_transactions_page(user_id, merchant_id, limit, card_id, card_type,
+                                          cursor=cursor, include_raw=include_raw, fields=fields)["transactions"]
+    
+    def get_transactions_page(self, user_id: str, merchant_id: Optional[int] = None, limit: int = 50, card_id: Optional[str] = None, card_type: Optional[str] = None,
+                              cursor: Optional[str] = None, include_raw: bool = False, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Get one keyset page of transactions, newest first.
         
-        query = """
-            SELECT id, external_id, merchant_id, merchant_name, datetime,
-                   order_status, total_amount, currency, 
-                   spend_category, category_confidence,
-                   points_earned, payment_method, card_id, raw_json
+        cursor is the opaque next_cursor from the previous page. raw_json (the
+        order payload, stored in TRANSACTION_RAW) is only fetched and decoded when
+        include_raw is set or it is listed in fields.
+        """
+        output_fields = _resolve_transaction_fields(fields, include_raw)
+        # id/datetime are always selected since the keyset cursor is built from them
+        select_fields = [f for f in dict.fromkeys(["id", "datetime"] + output_fields) if TRANSACTION_FIELDS[f][0]]
+        columns = ", ".join(TRANSACTION_FIELDS[f][0] for f in select_fields)
+        
+        query = f"""
+            SELECT {columns}
             FROM TRANSACTIONS 
             WHERE user_id = %s
         """
@@ -495,7 +1361,7 @@ class SnowflakeDB:
             # Handle both strict card_id match AND brand fallback for unlinked transactions
             # This ensures transactions show for Visa/PayPal cards even before explicit linking
             target_type = card_type.upper() if card_type else "UNKNOWN"
-            
+        
             if card_id and card_id not in ["null", "undefined", "paypal-static"]:
                 query += " AND (card_id = %s OR (card_id IS NULL AND (UPPER(payment_method) = %s OR UPPER(payment_method) LIKE %s)))"
                 params.append(card_id)
@@ -507,170 +1373,555 @@ class SnowflakeDB:
                 params.append(target_type)
                 params.append(f"%{target_type}%")
         # No else clause - when no filters specified, show ALL transactions
-            
-        query += " ORDER BY datetime DESC LIMIT %s"
-        params.append(limit)
         
-        cursor.execute(query, tuple(params))
+        if cursor:
+            after_datetime, after_id = _decode_page_cursor(cursor)
+            if after_datetime is None:
+                # Already into the NULL-datetime tail (sorted last)
+                query += " AND datetime IS NULL AND id < %s"
+                params.append(after_id)
+            else:
+                query += " AND (datetime < %s OR (datetime = %s AND id < %s) OR datetime IS NULL)"
+                params.extend([after_datetime, after_datetime, after_id])
+        
+        # Fetch one extra row to know whether another page exists
+        query += " ORDER BY datetime DESC NULLS LAST, id DESC LIMIT %s"
+        params.append(limit + 1)
+        
+        with self._get_connection("get_transactions_page") as (conn, db_cursor):
+            db_cursor.execute(query, tuple(params))
+            rows = db_cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        raw_payloads = self._fetch_raw_payloads([row[0] for row in rows]) if "raw_json" in output_fields else {}
         
-        rows = cursor.fetchall()
         transactions = []
         for row in rows:
-            raw_json_str = row[13]
-            raw_data = json.loads(raw_json_str) if raw_json_str and isinstance(raw_json_str, str) else (raw_json_str if raw_json_str else {})
-            
-            transactions.append({
-                "id": row[0],
-                "external_id": row[1],
-                "merchant_id": row[2],
-                "merchant_name": row[3],
-                "datetime": str(row[4]) if row[4] else None,
-                "order_status": row[5],
-                "total_amount": float(row[6]) if row[6] else 0,
-                "currency": row[7],
-                "category": row[8], # spend_category
-                "category_confidence": float(row[9]) if row[9] else None,
-                "points_earned": row[10] if row[10] is not None else 0,
-                "payment_method": row[11],
-                "card_id": row[12],
-                "raw_json": raw_data
-            })
-        return transactions
+            values = dict(zip(select_fields, row))
+            values["raw_json"] = raw_payloads.get(values["id"])
+            tx = {}
+            for field in output_fields:
+                convert = TRANSACTION_FIELDS[field][1]
+                tx[field] = convert(values[field]) if convert else values[field]
+            transactions.append(tx)
+        
+        next_cursor = None
+        if has_more and rows:
+            last = dict(zip(select_fields, rows[-1]))
+            next_cursor = _encode_page_cursor(last["datetime"], last["id"])
+        
+        return {"transactions": transactions, "next_cursor": next_cursor, "has_more": has_more}
     
-    # ========== Vector Classification ==========
+    def _fetch_raw_payloads(self, tx_ids: List[str]) -> Dict[str, Any]:
+        """tx_id -> undecoded raw_json for a page of transactions (one query)"""
+        if not tx_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(tx_ids))
+        with self._get_connection("_fetch_raw_payloads") as (conn, cursor):
+            cursor.execute(f"SELECT tx_id, raw_json FROM TRANSACTION_RAW_JSON WHERE tx_id IN ({placeholders})",
+                           tuple(tx_ids))
+            return {row[0]: row[1] for row in cursor.fetchall()}
     
-    def classify_transaction(self, tx_id: str) -> Dict[str, Any]:
-        """Classify a single transaction using vector similarity"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            WITH tx_embedding AS (
-                SELECT 
-                    id,
-                    product_text,
-                    SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m-v1.5', product_text) AS embedding
-                FROM TRANSACTIONS
-                WHERE id = %s AND product_text IS NOT NULL AND product_text != ''
-            ),
-            similarities AS (
-                SELECT 
-                    t.id,
-                    c.category,
-                    VECTOR_COSINE_SIMILARITY(t.embedding, c.embedding) AS similarity
-                FROM tx_embedding t
-                CROSS JOIN CATEGORY_EMBEDDINGS c
-            ),
-            best_match AS (
-                SELECT id, category, similarity
-                FROM similarities
-                ORDER BY similarity DESC
-                LIMIT 1
-            )
-            UPDATE TRANSACTIONS
-            SET category = best_match.category,
-                category_confidence = best_match.similarity
-            FROM best_match
-            WHERE TRANSACTIONS.id = best_match.id
-            RETURNING TRANSACTIONS.id, TRANSACTIONS.category, TRANSACTIONS.category_confidence
-        """, (tx_id,))
-        
-        result = cursor.fetchone()
-        conn.commit()
-        
-        if result:
-            return {"id": result[0], "category": result[1], "confidence": float(result[2])}
-        return {"id": tx_id, "category": None, "error": "No product text to classify"}
-    
-    def classify_all_unclassified(self) -> Dict[str, Any]:
-        """Classify all transactions that don't have a category"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            UPDATE TRANSACTIONS t
-            SET 
-                category = matched.category,
-                category_confidence = matched.similarity
-            FROM (
-                SELECT 
-                    tx.id,
-                    cat.category,
-                    VECTOR_COSINE_SIMILARITY(
-                        SNOWFLAKE.CORTEX.EMBED_TEXT_768('snowflake-arctic-embed-m-v1.5', tx.product_text),
-                        cat.embedding
-                    ) AS similarity,
-                    ROW_NUMBER() OVER (PARTITION BY tx.id ORDER BY similarity DESC) AS rn
-                FROM TRANSACTIONS tx
-                CROSS JOIN CATEGORY_EMBEDDINGS cat
-                WHERE tx.category IS NULL 
-                  AND tx.product_text IS NOT NULL 
-                  AND tx.product_text != ''
-            ) matched
-            WHERE t.id = matched.id AND matched.rn = 1
-        """)
-        
-        count = cursor.rowcount
-        conn.commit()
-        return {"success": True, "classified": count}
+    def get_raw_payload(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        """Decoded Knot order payload for one transaction (per-id cache in front of TRANSACTION_RAW)"""
+        return self._raw_cache.get_or_load(
+            "raw_payload", (tx_id,), None,
+            lambda: _decode_raw_json(self._fetch_raw_payloads([tx_id]).get(tx_id)) or None,
+        )
     
-    # ========== Cortex AI Categorization ==========
+    def get_transaction_detail(self, tx_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """One transaction's typed columns plus its raw payload, or None if not found (or not the user's)"""
+        fields = [f for f in TRANSACTION_FIELDS if TRANSACTION_FIELDS[f][0]]
+        query = f"SELECT {', '.join(TRANSACTION_FIELDS[f][0] for f in fields)} FROM TRANSACTIONS WHERE id = %s"
+        params = [tx_id]
+        if user_id:
+            query += " AND user_id = %s"
+            params.append(user_id)
+        with self._get_connection("get_transaction_detail") as (conn, cursor):
+            cursor.execute(query, tuple(params))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        tx = {}
+        for field, value in zip(fields, row):
+            convert = TRANSACTION_FIELDS[field][1]
+            tx[field] = convert(value) if convert else value
+        tx["raw_json"] = self.get_raw_payload(tx_id)
+        return tx
     
-    def categorize_transaction_ai(self, tx_id: str) -> Dict[str, Any]:
-        """Use Snowflake Cortex CLASSIFY_TEXT to categorize a transaction"""
-        conn, cursor = self._get_connection()
-        
-        # Build category array for CLASSIFY_TEXT
-        category_array = ", ".join([f"'{cat}'" for cat in SPEND_CATEGORIES])
+    def raw_cache_stats(self) -> Dict[str, Any]:
+        return self._raw_cache.stats()
+    
+    # ========== Vector Classification ==========
+    
+    def classify_transaction(self, tx_id: str, top_k: int = 1) -> Dict[str, Any]:
+        """Classify a single transaction using vector similarity (local matrix first, warehouse fallback)"""
+        if self._local_classifier() is not None:
+            try:
+                result = self.classify_transactions_local([tx_id], top_k=top_k)
+                if result["results"]:
+                    return {**result["results"][0], "method": "local"}
+                return {"id": tx_id, "category": None, "error": "No product text to classify"}
+            except Exception as e:
+                print(f"⚠️  Local classification failed for {tx_id}, using warehouse: {e}")
         
-        try:
+        with self._get_connection("classify_transaction") as (conn, cursor):
             cursor.execute(f"""
-                WITH classification AS (
+                WITH tx_embedding AS (
                     SELECT 
                         id,
-                        SNOWFLAKE.CORTEX.CLASSIFY_TEXT(
-                            COALESCE(product_text, '') || ' ' || COALESCE(merchant_name, ''),
-                            ARRAY_CONSTRUCT({category_array})
-                        ) AS result
+                        product_text,
+                        COALESCE(product_embedding,
+                                 SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', product_text)) AS embedding
                     FROM TRANSACTIONS
-                    WHERE id = %s
+                    WHERE id = %s AND product_text IS NOT NULL AND product_text != ''
+                ),
+                similarities AS (
+                    SELECT 
+                        t.id,
+                        c.category,
+                        VECTOR_COSINE_SIMILARITY(t.embedding, c.embedding) AS similarity
+                    FROM tx_embedding t
+                    CROSS JOIN CATEGORY_EMBEDDINGS c
+                ),
+                best_match AS (
+                    SELECT id, category, similarity
+                    FROM similarities
+                    ORDER BY similarity DESC
+                    LIMIT 1
                 )
-                SELECT 
-                    id,
-                    result:label::VARCHAR AS category,
-                    result:score::FLOAT AS confidence
-                FROM classification
+                UPDATE TRANSACTIONS
+                SET category = best_match.category,
+                    category_confidence = best_match.similarity
+                FROM best_match
+                WHERE TRANSACTIONS.id = best_match.id
+                RETURNING TRANSACTIONS.id, TRANSACTIONS.category, TRANSACTIONS.category_confidence
             """, (tx_id,))
-            
+        
             result = cursor.fetchone()
+            conn.commit()
+        
             if result:
-                category = result[1]
-                confidence = result[2]
-                
-                # Update the transaction
+                self._refresh_rollup_safely(tx_ids=[tx_id])
+                return {"id": result[0], "category": result[1], "confidence": float(result[2]), "method": "warehouse"}
+            return {"id": tx_id, "category": None, "error": "No product text to classify"}
+    
+    def classify_all_unclassified(self, min_confidence: float = None) -> Dict[str, Any]:
+        """Classify all transactions that don't have a category (local matrix first, warehouse fallback)"""
+        if self._local_classifier() is not None:
+            try:
+                result = self.classify_transactions_local(only_unclassified=True, min_confidence=min_confidence)
+                result.pop("results")
+                return result
+            except Exception as e:
+                print(f"⚠️  Local classification failed, using warehouse: {e}")
+        
+        with self._get_connection("classify_all_unclassified") as (conn, cursor):
+            cursor.execute(*classify_unclassified_sql(min_confidence))
+        
+            count = cursor.rowcount
+            conn.commit()
+            if count:
+                self._refresh_rollup_safely()
+            return {"success": True, "classified": count, "method": "warehouse"}
+    
+    def embed_transactions(self, tx_ids: Optional[List[str]] = None, chunk_size: int = None) -> Dict[str, Any]:
+        """Fill product_embedding for transactions that lack one.
+        
+        Vectors are keyed by SHA2(product_text) in PRODUCT_EMBEDDINGS, so Cortex
+        EMBED_TEXT_768 runs once per distinct product text across all orders. Per
+        chunk: hash the text, embed only unseen hashes, copy vectors onto the rows.
+        """
+        chunk_size = max(1, chunk_size or BULK_MERGE_CHUNK_SIZE)
+        embedded_texts = 0
+        filled = 0
+        with self._get_connection("embed_transactions") as (conn, cursor):
+            if tx_ids is None:
                 cursor.execute("""
-                    UPDATE TRANSACTIONS 
-                    SET spend_category = %s, category_confidence = %s
-                    WHERE id = %s
-                """, (category, confidence, tx_id))
-                conn.commit()
-                
-                return {"id": tx_id, "spend_category": category, "confidence": confidence}
+                    SELECT id FROM TRANSACTIONS
+                    WHERE product_embedding IS NULL AND product_text IS NOT NULL AND product_text != ''
+                """)
+                tx_ids = [row[0] for row in cursor.fetchall()]
+        
+            for i in range(0, len(tx_ids), chunk_size):
+                chunk = tx_ids[i:i + chunk_size]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                scope = f"id IN ({placeholders}) AND product_embedding IS NULL AND product_text IS NOT NULL AND product_text != ''"
+        
+                cursor.execute(f"""
+                    UPDATE TRANSACTIONS SET product_text_hash = SHA2(product_text, 256)
+                    WHERE {scope} AND product_text_hash IS NULL
+                """, tuple(chunk))
+        
+                cursor.execute(f"""
+                    MERGE INTO PRODUCT_EMBEDDINGS AS target
+                    USING (
+                        SELECT text_hash, SNOWFLAKE.CORTEX.EMBED_TEXT_768('{EMBED_MODEL}', product_text) AS embedding
+                        FROM (
+                            SELECT product_text_hash AS text_hash, ANY_VALUE(product_text) AS product_text
+                            FROM TRANSACTIONS
+                            WHERE {scope}
+                              AND product_text_hash NOT IN (SELECT text_hash FROM PRODUCT_EMBEDDINGS)
+                            GROUP BY product_text_hash
+                        )
+                    ) AS source
+                    ON target.text_hash = source.text_hash
+                    WHEN NOT MATCHED THEN
+                        INSERT (text_hash, embedding) VALUES (source.text_hash, source.embedding)
+                """, tuple(chunk))
+                counts = cursor.fetchone()
+                embedded_texts += (counts[0] or 0) if counts else 0
+        
+                cursor.execute(f"""
+                    UPDATE TRANSACTIONS t
+                    SET product_embedding = e.embedding
+                    FROM PRODUCT_EMBEDDINGS e
+                    WHERE t.product_text_hash = e.text_hash AND {scope}
+                """, tuple(chunk))
+                filled += cursor.rowcount or 0
+            conn.commit()
+        
+        if embedded_texts:
+            print(f"🧬 Embedded {embedded_texts} new product texts ({filled} transactions filled)")
+        return {"success": True, "filled": filled, "embedded_texts": embedded_texts, "reused": max(0, filled - embedded_texts)}
+    
+    def _local_classifier(self):
+        """Shared in-process classifier, or None when disabled or unavailable"""
+        try:
+            from vector_classifier import CLASSIFIER_CONFIG, get_classifier
+        except ImportError as e:
+            print(f"Local classifier not available: {e}")
+            return None
+        if not CLASSIFIER_CONFIG["enabled"]:
+            return None
+        try:
+            return get_classifier(self._load_category_embeddings)
         except Exception as e:
-            print(f"CLASSIFY_TEXT error, falling back to vector: {e}")
-            # Fallback to legacy vector classification
-            return self.classify_transaction(tx_id)
+            print(f"⚠️  Could not load category embeddings: {e}")
+            return None
+    
+    def _load_category_embeddings(self) -> List[tuple]:
+        with self._get_connection("_load_category_embeddings") as (conn, cursor):
+            cursor.execute("SELECT category, embedding FROM CATEGORY_EMBEDDINGS ORDER BY category")
+            return cursor.fetchall()
+    
+    def classify_transactions_local(self, tx_ids: Optional[List[str]] = None, only_unclassified: bool = False,
+                                    top_k: int = 1, min_confidence: float = None,
+                                    chunk_size: int = None) -> Dict[str, Any]:
+        """Score stored product embeddings against the in-memory category matrix.
+        
+        Each chunk fills any missing product_embedding (embed_transactions), reads the
+        vectors, runs one local matrix multiply and one UPDATE ... FROM VALUES write-back.
+        Matches below min_confidence are left unclassified.
+        """
+        from vector_classifier import parse_vector
+        
+        classifier = self._local_classifier()
+        if classifier is None:
+            raise RuntimeError("Local classifier unavailable")
+        chunk_size = max(1, chunk_size or CATEGORIZE_CHUNK_SIZE)
+        
+        with self._get_connection("classify_transactions_local") as (conn, cursor):
+            if tx_ids is None:
+                query = "SELECT id FROM TRANSACTIONS WHERE product_text IS NOT NULL AND product_text != ''"
+                if only_unclassified:
+                    query += " AND category IS NULL"
+                cursor.execute(query)
+                tx_ids = [row[0] for row in cursor.fetchall()]
+        
+            results = []
+            classified_ids = []
+            score_ms = 0.0
+            for i in range(0, len(tx_ids), chunk_size):
+                chunk = tx_ids[i:i + chunk_size]
+                self.embed_transactions(chunk)
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT id, product_embedding
+                    FROM TRANSACTIONS
+                    WHERE id IN ({placeholders}) AND product_embedding IS NOT NULL
+                """, tuple(chunk))
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
         
-        return {"id": tx_id, "spend_category": None, "error": "No text to classify"}
+                started = time.perf_counter()
+                scored = classifier.classify([parse_vector(row[1]) for row in rows], top_k=top_k,
+                                             min_confidence=min_confidence)
+                score_ms += (time.perf_counter() - started) * 1000
+        
+                updates = []
+                for row, match in zip(rows, scored):
+                    results.append({"id": row[0], **match})
+                    if match["category"]:
+                        updates.append((row[0], match["category"], match["confidence"]))
+                if updates:
+                    values = ", ".join(["(%s, %s, %s)"] * len(updates))
+                    cursor.execute(f"""
+                        UPDATE TRANSACTIONS t
+                        SET category = v.column2, category_confidence = v.column3
+                        FROM (SELECT column1, column2, column3 FROM VALUES {values}) v
+                        WHERE t.id = v.column1
+                    """, tuple(value for update in updates for value in update))
+                    classified_ids.extend(update[0] for update in updates)
+            conn.commit()
+        
+        if classified_ids:
+            self._refresh_rollup_safely(tx_ids=classified_ids)
+        return {
+            "success": True,
+            "classified": len(classified_ids),
+            "below_threshold": len(results) - len(classified_ids),
+            "method": "local",
+            "score_ms": round(score_ms, 3),
+            "results": results,
+        }
+    
+    # ========== Cortex AI Categorization ==========
+    
+    def categorize_transaction_ai(self, tx_id: str) -> Dict[str, Any]:
+        """Use Snowflake Cortex CLASSIFY_TEXT to categorize a transaction (through the result cache)"""
+        with self._get_connection("categorize_transaction_ai") as (conn, cursor):
+            try:
+                cursor.execute("""
+                    SELECT id, product_text, merchant_name, merchant_id, spend_category
+                    FROM TRANSACTIONS WHERE id = %s
+                """, (tx_id,))
+                row = cursor.fetchone()
+                if row:
+                    previous_category = row[4]
+                    labels, remaining = self._fast_path([row[:4]])
+                    cache = {"cortex_calls": 0}
+                    if remaining:
+                        labels, cache = self._classify_rows(cursor, [r[:3] for r in remaining])
+                    if tx_id in labels:
+                        category, confidence = labels[tx_id]
+                
+                        # Update the transaction
+                        cursor.execute("""
+                            UPDATE TRANSACTIONS 
+                            SET spend_category = %s, category_confidence = %s
+                            WHERE id = %s
+                        """, (category, confidence, tx_id))
+                        conn.commit()
+                        # Only spend_category feeds the rollup; a re-categorization to the same label leaves it valid
+                        if category != previous_category:
+                            self._refresh_rollup_safely(tx_ids=[tx_id])
+                
+                        return {"id": tx_id, "spend_category": category, "confidence": confidence,
+                                "fast_path": not remaining, "cached": bool(remaining) and cache["cortex_calls"] == 0}
+            except Exception as e:
+                print(f"CLASSIFY_TEXT error, falling back to vector: {e}")
+                # Fallback to legacy vector classification
+                return self.classify_transaction(tx_id)
+        
+            return {"id": tx_id, "spend_category": None, "error": "No text to classify"}
+    
+    def categorize_transactions_batch(self, tx_ids: Optional[List[str]] = None, user_id: str = None, chunk_size: int = None) -> Dict[str, Any]:
+        """Categorize many transactions with at most one CLASSIFY_TEXT call per chunk.
+        
+        With no tx_ids, classifies every pending (spend_category IS NULL) row for the
+        user. Rows the merchant/keyword fast path resolves and texts already in the
+        classification cache skip Cortex entirely. A chunk that fails falls back to
+        vector classification row by row.
+        """
+        chunk_size = max(1, chunk_size or CATEGORIZE_CHUNK_SIZE)
+        
+        # One rollup refresh for the whole batch (including vector fallbacks), not one per chunk
+        with self.deferred_rollup(), self._get_connection("categorize_transactions_batch") as (conn, cursor):
+            if tx_ids is None:
+                if user_id:
+                    cursor.execute("SELECT id FROM TRANSACTIONS WHERE spend_category IS NULL AND user_id = %s", (user_id,))
+                else:
+                    cursor.execute("SELECT id FROM TRANSACTIONS WHERE spend_category IS NULL")
+                tx_ids = [row[0] for row in cursor.fetchall()]
+            
+            chunks = []
+            categorized = 0
+            fast_resolved = 0
+            for start in range(0, len(tx_ids), chunk_size):
+                chunk_ids = tx_ids[start:start + chunk_size]
+                chunk_started = time.perf_counter()
+                placeholders = ", ".join(["%s"] * len(chunk_ids))
+                cache = {"texts": 0, "cache_hits": 0, "cortex_calls": 0}
+                fast_count = 0
+                try:
+                    cursor.execute(f"""
+                        SELECT id, product_text, merchant_name, merchant_id FROM TRANSACTIONS
+                        WHERE id IN ({placeholders})
+                    """, tuple(chunk_ids))
+                    labels, remaining = self._fast_path(cursor.fetchall())
+                    fast_count = len(labels)
+                    if remaining:
+                        cortex_labels, cache = self._classify_rows(cursor, [row[:3] for row in remaining])
+                        labels.update(cortex_labels)
+                    count = self._write_spend_categories(cursor, labels)
+                    conn.commit()
+                    self._refresh_rollup_safely(tx_ids=chunk_ids, user_id=user_id)
+                    method = "classify_text"
+                except Exception as e:
+                    print(f"CLASSIFY_TEXT batch error, falling back to vector for {len(chunk_ids)} rows: {e}")
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    count = 0
+                    for tx_id in chunk_ids:
+                        try:
+                            if self.classify_transaction(tx_id).get("category"):
+                                count += 1
+                        except Exception as vector_error:
+                            print(f"⚠️  Vector fallback skipped for {tx_id}: {vector_error}")
+                    method = "vector_fallback"
+                
+                categorized += count
+                fast_resolved += fast_count
+                chunks.append({
+                    "chunk": len(chunks),
+                    "size": len(chunk_ids),
+                    "categorized": count,
+                    "method": method,
+                    "fast_path": fast_count,
+                    **cache,
+                    "ms": round((time.perf_counter() - chunk_started) * 1000, 1),
+                })
+            
+            return {
+                "success": True,
+                "transactions_found": len(tx_ids),
+                "categorized": categorized,
+                "fast_path_resolved": fast_resolved,
+                "fast_path_fraction": round(fast_resolved / len(tx_ids), 4) if tx_ids else 0.0,
+                "chunk_size": chunk_size,
+                "chunks": chunks,
+            }
+    
+    def _fast_path(self, rows: List[tuple]) -> tuple:
+        """Resolve (id, product_text, merchant_name, merchant_id) rows by merchant/keyword rules.
+        
+        Returns ({id: (label, confidence)}, rows left for Cortex).
+        """
+        if self._fast_classifier is None:
+            return {}, list(rows)
+        return self._fast_classifier.classify_many(rows)
+    
+    def _classify_rows(self, cursor, rows: List[tuple]) -> tuple:
+        """(id, product_text, merchant_name) rows -> ({id: (label, score)}, cache counts).
+        
+        Distinct texts are resolved from the in-memory LRU, then CLASSIFICATION_CACHE;
+        only the remaining misses go to CLASSIFY_TEXT (one statement), and their
+        labels are written back to both tiers.
+        """
+        version = CLASSIFICATION_MODEL_VERSION
+        lru = self._classification_lru
+        keys = {}
+        texts = {}
+        for tx_id, product_text, merchant_name in rows:
+            key = classification_key(product_text, merchant_name)
+            keys[tx_id] = key
+            texts.setdefault(key, classification_text(product_text, merchant_name))
+        
+        results = lru.get_many(texts, version) if lru else {}
+        pending = [key for key in texts if key not in results]
+        
+        table_hits = 0
+        if pending and lru:
+            placeholders = ", ".join(["%s"] * len(pending))
+            cursor.execute(f"""
+                SELECT text_hash, label, score FROM CLASSIFICATION_CACHE
+                WHERE model_version = %s AND text_hash IN ({placeholders})
+            """, (version, *pending))
+            stored = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            table_hits = len(stored)
+            results.update(stored)
+            lru.put_many(stored, version)
+            pending = [key for key in pending if key not in stored]
+        
+        if pending:
+            category_array = ", ".join([f"'{cat}'" for cat in SPEND_CATEGORIES])
+            values = ", ".join(["(%s, %s)"] * len(pending))
+            cursor.execute(f"""
+                SELECT column1, result:label::VARCHAR, result:score::FLOAT
+                FROM (
+                    SELECT column1, SNOWFLAKE.CORTEX.CLASSIFY_TEXT(column2, ARRAY_CONSTRUCT({category_array})) AS result
+                    FROM VALUES {values}
+                )
+            """, tuple(value for key in pending for value in (key, texts[key])))
+            fresh = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            results.update(fresh)
+            if fresh and lru:
+                values = ", ".join(["(%s, %s, %s)"] * len(fresh))
+                cursor.execute(f"""
+                    MERGE INTO CLASSIFICATION_CACHE AS target
+                    USING (SELECT column1 AS text_hash, column2 AS label, column3 AS score FROM VALUES {values}) AS source
+                    ON target.text_hash = source.text_hash AND target.model_version = %s
+                    WHEN NOT MATCHED THEN
+                        INSERT (text_hash, model_version, label, score)
+                        VALUES (source.text_hash, %s, source.label, source.score)
+                """, (*[value for key, (label, score) in fresh.items() for value in (key, label, score)], version, version))
+                lru.put_many(fresh, version)
+        
+        if lru:
+            lru.record(table_hits=table_hits, misses=len(pending))
+        labels = {tx_id: results[key] for tx_id, key in keys.items() if key in results}
+        return labels, {"texts": len(texts), "cache_hits": len(texts) - len(pending), "cortex_calls": len(pending)}
+    
+    def _write_spend_categories(self, cursor, labels: Dict[str, tuple]) -> int:
+        """Apply {id: (label, score)} to TRANSACTIONS with one UPDATE ... FROM VALUES"""
+        if not labels:
+            return 0
+        values = ", ".join(["(%s, %s, %s)"] * len(labels))
+        cursor.execute(f"""
+            UPDATE TRANSACTIONS t
+            SET spend_category = v.column2, category_confidence = v.column3
+            FROM (SELECT column1, column2, column3 FROM VALUES {values}) v
+            WHERE t.id = v.column1
+        """, tuple(value for tx_id, (label, score) in labels.items() for value in (tx_id, label, score)))
+        return cursor.rowcount or 0
+    
+    def classification_cache_stats(self) -> Dict[str, Any]:
+        """Hit rate of the classification cache (memory + table) and its table size"""
+        fast_path = self._fast_classifier.stats() if self._fast_classifier else {"enabled": False}
+        if self._classification_lru is None:
+            return {"enabled": False, "fast_path": fast_path}
+        with self._get_connection("classification_cache_stats") as (conn, cursor):
+            cursor.execute("""
+                SELECT COUNT_IF(model_version = %s), COUNT(*) FROM CLASSIFICATION_CACHE
+            """, (CLASSIFICATION_MODEL_VERSION,))
+            row = cursor.fetchone() or (0, 0)
+        return {
+            "enabled": True,
+            "model_version": CLASSIFICATION_MODEL_VERSION,
+            "table_entries": row[0] or 0,
+            "stale_table_entries": (row[1] or 0) - (row[0] or 0),
+            **self._classification_lru.stats(),
+            "fast_path": fast_path,
+        }
+    
+    def invalidate_classification_cache(self, all_versions: bool = False) -> Dict[str, Any]:
+        """Drop cached labels from older label sets (or everything), e.g. after SPEND_CATEGORIES changes"""
+        with self._get_connection("invalidate_classification_cache") as (conn, cursor):
+            if all_versions:
+                cursor.execute("DELETE FROM CLASSIFICATION_CACHE")
+            else:
+                cursor.execute("DELETE FROM CLASSIFICATION_CACHE WHERE model_version <> %s", (CLASSIFICATION_MODEL_VERSION,))
+            deleted = cursor.rowcount or 0
+            conn.commit()
+        if self._classification_lru is not None:
+            self._classification_lru.clear()
+        print(f"🧹 Invalidated {deleted} cached classifications")
+        return {"success": True, "deleted": deleted, "model_version": CLASSIFICATION_MODEL_VERSION}
     
     def parse_benefits_with_ai(self, benefits_text: str) -> Dict[str, int]:
         """Use Cortex AI to parse natural language benefits into multipliers"""
         if not benefits_text or benefits_text.strip() == "":
             return {}
         
-        conn, cursor = self._get_connection()
-        
-        try:
-            # Use Cortex COMPLETE to extract multipliers from natural language
-            prompt = f"""Extract point multipliers from this credit card benefits text.
+        with self._get_connection("parse_benefits_with_ai") as (conn, cursor):
+            try:
+                # Use Cortex COMPLETE to extract multipliers from natural language
+                prompt = f"""Extract point multipliers from this credit card benefits text.
 Return ONLY a valid JSON object with category:multiplier pairs.
 Valid categories: food_dining, groceries, gas_auto, shopping, travel, entertainment, healthcare, services, home
 If a category is not mentioned, do not include it.
@@ -680,296 +1931,573 @@ Benefits text: {benefits_text}
 
 Return JSON only, no explanation:"""
             
-            cursor.execute("""
-                SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                    'mistral-large2',
-                    %s
-                ) AS parsed
-            """, (prompt,))
+                cursor.execute("""
+                    SELECT SNOWFLAKE.CORTEX.COMPLETE(
+                        'mistral-large2',
+                        %s
+                    ) AS parsed
+                """, (prompt,))
             
-            result = cursor.fetchone()
-            if result and result[0]:
-                # Parse the JSON response
-                import re
-                response = result[0]
-                # Extract JSON from response
-                json_match = re.search(r'\{[^}]+\}', response)
-                if json_match:
-                    return json.loads(json_match.group())
-        except Exception as e:
-            print(f"Benefits parsing error: {e}")
+                result = cursor.fetchone()
+                if result and result[0]:
+                    # Parse the JSON response
+                    import re
+                    response = result[0]
+                    # Extract JSON from response
+                    json_match = re.search(r'\{[^}]+\}', response)
+                    if json_match:
+                        return json.loads(json_match.group())
+            except Exception as e:
+                print(f"Benefits parsing error: {e}")
         
         return {}
     
     def calculate_points(self, tx_id: str, card_id: str = None) -> Dict[str, Any]:
-        """Calculate points earned for a transaction based on card benefits and payment method rules"""
-        conn, cursor = self._get_connection()
-        
-        # Get transaction details including merchant info
-        cursor.execute("""
-            SELECT id, spend_category, total_amount, payment_method, card_id, merchant_name, merchant_id
-            FROM TRANSACTIONS WHERE id = %s
-        """, (tx_id,))
-        
-        tx = cursor.fetchone()
-        if not tx:
-            return {"error": "Transaction not found"}
-        
-        tx_id, spend_category, amount, payment_method, tx_card_id, merchant_name, merchant_id = tx
-        
-        # Payment method rules:
-        # PayPal = 0x
-        # Discover = 1x flat on all
-        # Visa = 2x on Amazon (merchant_id 44)
-        
-        points = 0
-        multiplier = 0
-        reason = "default"
-        
-        if not payment_method:
-            payment_method = ""
-        
-        pm_upper = payment_method.upper()
-        
-        # PayPal = 0 points
-        if 'PAYPAL' in pm_upper:
-            points = 0
-            multiplier = 0
-            reason = "PayPal (0x)"
-        
-        # Discover = 1x flat
-        elif 'DISCOVER' in pm_upper:
-            points = int(amount) if amount else 0
-            multiplier = 1
-            reason = "Discover (1x flat)"
-        
-        # Visa = 2x on Amazon (merchant_id 44), 1x elsewhere
-        elif 'VISA' in pm_upper:
-            if merchant_id == 44 or (merchant_name and 'amazon' in merchant_name.lower()):
-                points = int(amount * 2) if amount else 0
-                multiplier = 2
-                reason = "Visa on Amazon (2x)"
-            else:
-                points = int(amount) if amount else 0
-                multiplier = 1
-                reason = "Visa (1x)"
+        """Calculate points earned for a transaction.
         
-        # Default for other payment methods
-        else:
-            points = int(amount) if amount else 0
-            multiplier = 1
-            reason = f"{payment_method or 'Card'} (1x default)"
+        Uses the payment-method POINTS_RULES; when a card_id is given, that card's
+        compiled benefits_multipliers (category, then base) take precedence.
+        """
+        with self._get_connection("calculate_points") as (conn, cursor):
+            # Get transaction details including merchant info
+            cursor.execute("""
+                SELECT id, spend_category, total_amount, payment_method, card_id, merchant_name, merchant_id, points_earned
+                FROM TRANSACTIONS WHERE id = %s
+            """, (tx_id,))
         
-        cursor.execute("UPDATE TRANSACTIONS SET points_earned = %s WHERE id = %s", (points, tx_id))
-        conn.commit()
+            tx = cursor.fetchone()
+            if not tx:
+                return {"error": "Transaction not found"}
         
-        return {"id": tx_id, "points_earned": points, "multiplier": multiplier, "reason": reason}
+            tx_id, spend_category, amount, payment_method, tx_card_id, merchant_name, merchant_id, previous_points = tx
         
-        cursor.execute("SELECT benefits FROM CARDS WHERE card_id = %s", (use_card_id,))
-        card = cursor.fetchone()
-        benefits_text = card[0] if card and card[0] else ""
+            # Same POINTS_RULES the set-based recalculation compiles to SQL
+            multiplier, reason = match_points_rule(payment_method, merchant_id, merchant_name)
         
-        # Parse benefits with AI
-        multipliers = self.parse_benefits_with_ai(benefits_text)
+            if card_id:
+                cursor.execute("SELECT benefits_multipliers FROM CARDS WHERE card_id = %s", (card_id,))
+                card = cursor.fetchone()
+                multipliers = _numeric_multipliers(_decode_raw_json(card[0])) if card else {}
+                if spend_category in multipliers:
+                    multiplier, reason = multipliers[spend_category], f"Card benefits ({spend_category})"
+                elif "base" in multipliers:
+                    multiplier, reason = multipliers["base"], "Card benefits (all purchases)"
         
-        # Get multiplier for category
-        multiplier = multipliers.get(spend_category, multipliers.get("base", 1))
-        points = int(float(amount or 0) * multiplier)
+            points = int(float(amount or 0) * multiplier)
         
-        cursor.execute("UPDATE TRANSACTIONS SET points_earned = %s WHERE id = %s", (points, tx_id))
-        conn.commit()
+            cursor.execute("UPDATE TRANSACTIONS SET points_earned = %s WHERE id = %s", (points, tx_id))
+            conn.commit()
+            # total_points is the only rollup column this touches
+            if previous_points is None or int(previous_points) != points:
+                self._refresh_rollup_safely(tx_ids=[tx_id])
         
-        return {"id": tx_id, "points_earned": points, "multiplier": multiplier, "category": spend_category}
+            return {"id": tx_id, "points_earned": points, "multiplier": multiplier, "reason": reason, "category": spend_category}
     
-    def process_all_uncategorized(self, user_id: str = None) -> Dict[str, Any]:
-        """Categorize and calculate points for all uncategorized transactions"""
-        conn, cursor = self._get_connection()
-        
-        # Get uncategorized transactions
-        if user_id:
-            cursor.execute("""
-                SELECT id FROM TRANSACTIONS 
-                WHERE spend_category IS NULL AND user_id = %s
-            """, (user_id,))
-        else:
-            cursor.execute("SELECT id FROM TRANSACTIONS WHERE spend_category IS NULL")
+    def process_all_uncategorized(self, user_id: str = None, chunk_size: int = None) -> Dict[str, Any]:
+        """Categorize and calculate points for all uncategorized transactions (one rollup refresh at the end)"""
+        with self.deferred_rollup(), self._get_connection("process_all_uncategorized") as (conn, cursor):
+            # Get uncategorized transactions
+            if user_id:
+                cursor.execute("""
+                    SELECT id FROM TRANSACTIONS 
+                    WHERE spend_category IS NULL AND user_id = %s
+                """, (user_id,))
+            else:
+                cursor.execute("SELECT id FROM TRANSACTIONS WHERE spend_category IS NULL")
         
-        tx_ids = [row[0] for row in cursor.fetchall()]
+            tx_ids = [row[0] for row in cursor.fetchall()]
         
-        categorized = 0
-        points_calculated = 0
+            # Categorize in chunked set-based statements
+            batch = self.categorize_transactions_batch(tx_ids, chunk_size=chunk_size)
         
-        for tx_id in tx_ids:
-            try:
-                # Categorize
-                result = self.categorize_transaction_ai(tx_id)
-                if result.get("spend_category"):
-                    categorized += 1
-                    # Calculate points
-                    points_result = self.calculate_points(tx_id)
-                    if points_result.get("points_earned") is not None:
-                        points_calculated += 1
-            except Exception as e:
-                print(f"Error processing {tx_id}: {e}")
+            points_calculated = self.recalculate_all_points(tx_ids=tx_ids)["points_calculated"]
         
-        return {
-            "success": True,
-            "transactions_found": len(tx_ids),
-            "categorized": categorized,
-            "points_calculated": points_calculated
-        }
+            return {
+                "success": True,
+                "transactions_found": len(tx_ids),
+                "categorized": batch["categorized"],
+                "points_calculated": points_calculated,
+                "chunks": batch["chunks"]
+            }
     
-    def backfill_payment_methods(self, user_id: str = None) -> Dict[str, Any]:
-        """Backfill payment_method from raw_json for existing transactions"""
-        conn, cursor = self._get_connection()
-        
-        # Update payment_method from raw_json where it's currently NULL
-        cursor.execute("""
-            UPDATE TRANSACTIONS
-            SET payment_method = 
-                CASE 
-                    WHEN raw_json:payment_methods[0]:type::VARCHAR = 'PAYPAL' 
-                         OR UPPER(raw_json:payment_methods[0]:brand::VARCHAR) = 'PAYPAL'
-                    THEN 'PAYPAL'
-                    ELSE COALESCE(
-                        UPPER(raw_json:payment_methods[0]:brand::VARCHAR),
-                        UPPER(raw_json:payment_methods[0]:type::VARCHAR),
-                        'CARD'
-                    )
-                END
-            WHERE payment_method IS NULL
-              AND raw_json:payment_methods[0] IS NOT NULL
-        """)
-        
-        updated = cursor.rowcount
-        conn.commit()
-        return {"success": True, "updated": updated}
+    def backfill_payment_methods(self) -> Dict[str, Any]:
+        """Backfill payment_method from raw_json for existing transactions, all users (chunked, checkpointed)"""
+        from backfill import run_backfill
+        result = run_backfill(self, "payment_method")
+        return {"success": True, "updated": result.get("rows_updated", 0), "backfill": result}
+    
+    def recalculate_all_points(self, user_id: str = None, tx_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Recalculate points with one set-based UPDATE compiled from POINTS_RULES"""
+        if tx_ids is not None and not tx_ids:
+            return {"success": True, "total_transactions": 0, "points_calculated": 0}
+        query, params = points_update_sql(user_id, tx_ids)
+        
+        with self._get_connection("recalculate_all_points") as (conn, cursor):
+            cursor.execute(query, params)
+            updated = cursor.rowcount or 0
+            conn.commit()
+            if updated:
+                self._refresh_rollup_safely(tx_ids=tx_ids, user_id=user_id)
+            return {
+                "success": True,
+                "total_transactions": updated,
+                "points_calculated": updated
+            }
+    
+    # ========== Column Backfills ==========
+    
+    def backfill_next_ids(self, missing_sql: str, after_id: Optional[str], limit: int) -> List[str]:
+        """Next batch of ids (ordered, after after_id) whose derived column is still missing"""
+        query = f"SELECT id FROM TRANSACTIONS WHERE ({missing_sql})"
+        params: List[Any] = []
+        if after_id is not None:
+            query += " AND id > %s"
+            params.append(after_id)
+        query += " ORDER BY id LIMIT %s"
+        params.append(limit)
+        with self._get_connection("backfill_next_ids") as (conn, cursor):
+            cursor.execute(query, tuple(params))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def backfill_apply(self, column: str, source_sql: str, tx_ids: List[str], refresh_rollup: bool = False) -> int:
+        """Set column from a derivation's (id, value) source query, scoped to one batch of ids"""
+        placeholders = ", ".join(["%s"] * len(tx_ids))
+        source = source_sql.replace("{scope}", f"t.id IN ({placeholders})")
+        with self._get_connection("backfill_apply") as (conn, cursor):
+            cursor.execute(f"""
+                UPDATE TRANSACTIONS target
+                SET {column} = s.value
+                FROM ({source}) s
+                WHERE target.id = s.id AND s.value IS NOT NULL
+            """, tuple(tx_ids))
+            updated = cursor.rowcount or 0
+            conn.commit()
+        if refresh_rollup and updated:
+            self._refresh_rollup_safely(tx_ids=tx_ids)
+        return updated
+    
+    def get_backfill_checkpoint(self, name: str) -> Optional[Dict[str, Any]]:
+        """Stored progress for a backfill, or None if it never ran"""
+        checkpoints = self.list_backfill_checkpoints(name)
+        return checkpoints[0] if checkpoints else None
+    
+    def list_backfill_checkpoints(self, name: str = None) -> List[Dict[str, Any]]:
+        with self._get_connection("list_backfill_checkpoints") as (conn, cursor):
+            query = """
+                SELECT name, status, last_id, rows_processed, rows_updated, batches, error, started_at, updated_at
+                FROM BACKFILL_CHECKPOINTS
+            """
+            params = ()
+            if name:
+                query += " WHERE name = %s"
+                params = (name,)
+            cursor.execute(query + " ORDER BY name", params)
+            return [{
+                "name": row[0],
+                "status": row[1],
+                "last_id": row[2],
+                "rows_processed": row[3] or 0,
+                "rows_updated": row[4] or 0,
+                "batches": row[5] or 0,
+                "error": row[6],
+                "started_at": str(row[7]) if row[7] else None,
+                "updated_at": str(row[8]) if row[8] else None,
+            } for row in cursor.fetchall()]
+    
+    def save_backfill_checkpoint(self, name: str, status: str, **fields) -> Dict[str, Any]:
+        """Upsert a backfill's status plus any of last_id / rows_processed / rows_updated / batches / error"""
+        columns = [c for c in ("last_id", "rows_processed", "rows_updated", "batches", "error") if c in fields]
+        source_cols = ", ".join(["%s AS name", "%s AS status"] + [f"%s AS {c}" for c in columns])
+        update_sql = ", ".join(["status = source.status", "updated_at = CURRENT_TIMESTAMP()"]
+                               + [f"{c} = source.{c}" for c in columns])
+        insert_cols = ", ".join(["name", "status"] + columns)
+        insert_vals = ", ".join(f"source.{c}" for c in ["name", "status"] + columns)
+        with self._get_connection("save_backfill_checkpoint") as (conn, cursor):
+            cursor.execute(f"""
+                MERGE INTO BACKFILL_CHECKPOINTS AS target
+                USING (SELECT {source_cols}) AS source
+                ON target.name = source.name
+                WHEN MATCHED THEN UPDATE SET {update_sql}
+                WHEN NOT MATCHED THEN INSERT ({insert_cols}) VALUES ({insert_vals})
+            """, (name, status, *[fields[c] for c in columns]))
+            conn.commit()
+        return self.get_backfill_checkpoint(name) or {"name": name, "status": status, **fields}
+    
+    # ========== Async Maintenance Statements ==========
+    
+    def maintenance_statements(self, name: str, user_id: str = None) -> List[tuple]:
+        """(sql, params) steps for a long-running maintenance job, run in order"""
+        if name == "recalculate_points":
+            return [points_update_sql(user_id)]
+        raise ValueError(f"Unknown maintenance job: {name}")
+    
+    def execute_async(self, sql: str, params: tuple = ()) -> str:
+        """Submit a statement without waiting for it; returns the Snowflake query id"""
+        with self._get_connection("execute_async") as (conn, cursor):
+            cursor.execute_async(sql, params)
+            return cursor.sfqid
+    
+    def async_query_status(self, query_id: str) -> Dict[str, Any]:
+        """State of an async query: running, failed (with error) or succeeded (with affected rows)"""
+        with self._get_connection("async_query_status") as (conn, cursor):
+            status = conn.get_query_status(query_id)
+            if conn.is_still_running(status):
+                return {"state": "running", "status": status.name}
+            if conn.is_an_error(status):
+                try:
+                    conn.get_query_status_throw_if_error(query_id)
+                    error = status.name
+                except Exception as e:
+                    error = str(e)
+                return {"state": "failed", "status": status.name, "error": error}
+            cursor.get_results_from_sfqid(query_id)
+            row = cursor.fetchone()
+            return {"state": "succeeded", "status": status.name, "rows": (row[0] or 0) if row else 0}
+    
+    # ========== Daily Spend Rollup ==========
     
-    def recalculate_all_points(self, user_id: str = None) -> Dict[str, Any]:
-        """Recalculate points for all transactions using payment method rules"""
-        conn, cursor = self._get_connection()
+    def refresh_spend_rollup(self, tx_ids: Optional[List[str]] = None, user_id: str = None) -> Dict[str, Any]:
+        """Recompute DAILY_SPEND_ROLLUP rows.
         
-        # Get all transactions
-        if user_id:
-            cursor.execute("SELECT id FROM TRANSACTIONS WHERE user_id = %s", (user_id,))
+        With tx_ids only the (user, day) buckets those transactions fall in are
+        recomputed (narrowed to user_id if given); with only user_id all of that
+        user's days; with neither, the whole table is rebuilt. Cached reads for the
+        affected user (or everyone) are invalidated either way.
+        """
+        if tx_ids is not None and not tx_ids:
+            return {"success": True, "rows": 0}
+        
+        params: List[Any] = []
+        if tx_ids is not None:
+            placeholders = ", ".join(["%s"] * len(tx_ids))
+            scope = f"""
+                SELECT DISTINCT user_id, TO_DATE(datetime) AS day
+                FROM TRANSACTIONS
+                WHERE id IN ({placeholders}) AND datetime IS NOT NULL
+                {"AND user_id = %s" if user_id else ""}
+            """
+            delete_sql = f"""
+                DELETE FROM DAILY_SPEND_ROLLUP r
+                USING ({scope}) d
+                WHERE r.user_id = d.user_id AND r.day = d.day
+            """
+            source_filter = f"JOIN ({scope}) d ON t.user_id = d.user_id AND TO_DATE(t.datetime) = d.day"
+            delete_params = list(tx_ids) + ([user_id] if user_id else [])
+            params = list(delete_params)
+        elif user_id:
+            delete_sql = "DELETE FROM DAILY_SPEND_ROLLUP WHERE user_id = %s"
+            source_filter = "WHERE t.user_id = %s"
+            delete_params = [user_id]
+            params = [user_id]
         else:
-            cursor.execute("SELECT id FROM TRANSACTIONS")
+            delete_sql = "DELETE FROM DAILY_SPEND_ROLLUP"
+            source_filter = ""
+            delete_params = []
         
-        tx_ids = [row[0] for row in cursor.fetchall()]
+        insert_sql = f"""
+            INSERT INTO DAILY_SPEND_ROLLUP (user_id, day, category, spend_category, payment_method,
+                                            tx_count, total_spent, total_points, refreshed_at)
+            SELECT 
+                t.user_id,
+                TO_DATE(t.datetime),
+                COALESCE(t.category, 'uncategorized'),
+                COALESCE(t.spend_category, 'uncategorized'),
+                t.payment_method,
+                COUNT(*),
+                SUM(t.total_amount),
+                SUM(COALESCE(t.points_earned, 0)),
+                CURRENT_TIMESTAMP()
+            FROM TRANSACTIONS t
+            {source_filter}
+            {"AND" if source_filter.startswith("WHERE") else "WHERE"} t.datetime IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5
+        """
         
-        recalculated = 0
-        for tx_id in tx_ids:
-            try:
-                result = self.calculate_points(tx_id)
-                if result.get("points_earned") is not None:
-                    recalculated += 1
-            except Exception as e:
-                print(f"Error recalculating points for {tx_id}: {e}")
+        try:
+            with self._get_connection("refresh_spend_rollup") as (conn, cursor):
+                # Delete + re-insert atomically so readers never see a half-refreshed day
+                cursor.execute("BEGIN")
+                try:
+                    cursor.execute(delete_sql, tuple(delete_params))
+                    cursor.execute(insert_sql, tuple(params))
+                    rows = cursor.rowcount or 0
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return {"success": True, "rows": rows}
+        finally:
+            # The underlying transactions changed even if the rollup refresh failed
+            self._invalidate(user_id)
+    
+    @contextmanager
+    def deferred_rollup(self):
+        """Collect the rollup refreshes of the enclosed writes and run them once on exit.
         
-        conn.commit()
-        return {
-            "success": True,
-            "total_transactions": len(tx_ids),
-            "points_calculated": recalculated
-        }
+        Reentrant per thread (only the outermost block flushes). Batch paths and jobs use
+        it so a many-write operation costs one rollup pass instead of one per write.
+        """
+        if getattr(self._local, "rollup_pending", None) is not None:
+            yield
+            return
+        # user_id -> tx_ids (None key: writes not attributed to a user); "*" marks a full rebuild
+        pending: Dict[Any, set] = {}
+        self._local.rollup_pending = pending
+        try:
+            yield
+        finally:
+            # Flush even on error: writes committed before it still need their buckets refreshed
+            self._local.rollup_pending = None
+            self._flush_rollup(pending)
+    
+    def _flush_rollup(self, pending: Dict[Any, set]):
+        if "*" in pending:
+            self._refresh_rollup_safely()
+            return
+        for user_id, tx_ids in pending.items():
+            if None in tx_ids:
+                self._refresh_rollup_safely(user_id=user_id)
+                continue
+            ids = sorted(tx_ids)
+            for i in range(0, len(ids), ROLLUP_FLUSH_CHUNK_SIZE):
+                self._refresh_rollup_safely(tx_ids=ids[i:i + ROLLUP_FLUSH_CHUNK_SIZE], user_id=user_id)
+    
+    def _refresh_rollup_safely(self, tx_ids: Optional[List[str]] = None, user_id: str = None):
+        """Best-effort rollup maintenance for write paths (rebuild endpoint repairs misses)"""
+        pending = getattr(self._local, "rollup_pending", None)
+        if pending is not None:
+            if tx_ids is not None:
+                pending.setdefault(user_id, set()).update(tx_ids)
+            elif user_id:
+                pending.setdefault(user_id, set()).add(None)
+            else:
+                pending["*"] = set()
+            return
+        try:
+            self.refresh_spend_rollup(tx_ids=tx_ids, user_id=user_id)
+        except Exception as e:
+            print(f"⚠️  Spend rollup refresh failed: {e}")
     
     # ========== Cashflow Analytics ==========
     
+    @cached_read
     def get_cashflow(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-        """Get cashflow analytics by category"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            SELECT 
-                COALESCE(category, 'uncategorized') AS category,
-                COUNT(*) AS transaction_count,
-                SUM(total_amount) AS total_spent,
-                AVG(total_amount) AS avg_transaction
-            FROM TRANSACTIONS
+        """Get cashflow analytics by category (from DAILY_SPEND_ROLLUP)"""
+        with self._get_connection("get_cashflow") as (conn, cursor):
+            cursor.execute("""
+                SELECT 
+                    category,
+                    SUM(tx_count) AS transaction_count,
+                    SUM(total_spent) AS total_spent
+                FROM DAILY_SPEND_ROLLUP
+                WHERE user_id = %s
+                  AND day >= DATEADD(day, -%s, CURRENT_DATE())
+                GROUP BY category
+                ORDER BY total_spent DESC
+            """, (user_id, days))
+        
+            rows = cursor.fetchall()
+            categories = []
+            total_spent = 0
+        
+            for row in rows:
+                amount = float(row[2]) if row[2] else 0
+                count = int(row[1]) if row[1] else 0
+                total_spent += amount
+                categories.append({
+                    "category": row[0],
+                    "transaction_count": count,
+                    "total_spent": amount,
+                    "avg_transaction": amount / count if count else 0,
+                })
+        
+            return {
+                "user_id": user_id,
+                "period_days": days,
+                "total_spent": total_spent,
+                "by_category": categories,
+            }
+    
+    @cached_read
+    def get_spending_by_category(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Spend, count and points per AI spend_category (from DAILY_SPEND_ROLLUP)"""
+        with self._get_connection("get_spending_by_category") as (conn, cursor):
+            cursor.execute("""
+                SELECT 
+                    spend_category AS category,
+                    SUM(tx_count) AS transaction_count,
+                    SUM(total_spent) AS total_spent,
+                    SUM(total_points) AS total_points
+                FROM DAILY_SPEND_ROLLUP
+                WHERE user_id = %s
+                  AND day >= DATEADD(day, -%s, CURRENT_DATE())
+                GROUP BY spend_category
+                ORDER BY total_spent DESC
+            """, (user_id, days))
+            
+            return [{
+                "category": row[0],
+                "transaction_count": int(row[1]) if row[1] else 0,
+                "total_spent": float(row[2]) if row[2] else 0,
+                "total_points": int(row[3]) if row[3] else 0
+            } for row in cursor.fetchall()]
+    
+    @cached_read
+    def get_spending_trends(self, user_id: str, months: int = 6) -> List[Dict[str, Any]]:
+        """Monthly spend totals, oldest first (from DAILY_SPEND_ROLLUP)"""
+        with self._get_connection("get_spending_trends") as (conn, cursor):
+            cursor.execute("""
+                SELECT
+                    DATE_TRUNC('month', day) AS month,
+                    SUM(total_spent) AS total_spent
+                FROM DAILY_SPEND_ROLLUP
+                WHERE user_id = %s
+                  AND day >= DATEADD(month, -%s, CURRENT_DATE())
+                GROUP BY DATE_TRUNC('month', day)
+                ORDER BY month ASC
+            """, (user_id, months))
+            
+            return [{"month": row[0], "amount": float(row[1]) if row[1] else 0} for row in cursor.fetchall()]
+    
+    # ========== Item Analytics ==========
+    
+    @cached_read
+    def get_top_items(self, user_id: str, days: int = 30, limit: int = 10, sort: str = "spend",
+                      name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top purchased products by spend, quantity or orders (from TRANSACTION_ITEMS)"""
+        order_by = {"spend": "total_spent", "quantity": "total_quantity", "orders": "order_count"}.get(sort)
+        if order_by is None:
+            raise ValueError(f"Unknown sort: {sort}. Use spend, quantity or orders")
+        query = """
+            SELECT
+                MIN(name) AS name,
+                SUM(quantity) AS total_quantity,
+                SUM(total_price) AS total_spent,
+                COUNT(DISTINCT tx_id) AS order_count,
+                AVG(unit_price) AS avg_unit_price,
+                MAX(datetime) AS last_purchased
+            FROM TRANSACTION_ITEMS
             WHERE user_id = %s
               AND datetime >= DATEADD(day, -%s, CURRENT_TIMESTAMP())
-            GROUP BY category
-            ORDER BY total_spent DESC
-        """, (user_id, days))
-        
-        rows = cursor.fetchall()
-        categories = []
-        total_spent = 0
-        
-        for row in rows:
-            amount = float(row[2]) if row[2] else 0
-            total_spent += amount
-            categories.append({
-                "category": row[0],
-                "transaction_count": row[1],
-                "total_spent": amount,
-                "avg_transaction": float(row[3]) if row[3] else 0,
-            })
-        
-        return {
-            "user_id": user_id,
-            "period_days": days,
-            "total_spent": total_spent,
-            "by_category": categories,
-        }
+        """
+        params: List[Any] = [user_id, days]
+        if name:
+            query += " AND name ILIKE %s"
+            params.append(f"%{name}%")
+        # Same product bought under slightly different casing/spacing counts as one item
+        query += f"""
+            GROUP BY LOWER(TRIM(name))
+            ORDER BY {order_by} DESC NULLS LAST
+            LIMIT %s
+        """
+        params.append(limit)
+        with self._get_connection("get_top_items") as (conn, cursor):
+            cursor.execute(query, tuple(params))
+            return [{
+                "name": row[0],
+                "quantity": float(row[1]) if row[1] else 0,
+                "total_spent": float(row[2]) if row[2] else 0,
+                "orders": int(row[3]) if row[3] else 0,
+                "avg_unit_price": round(float(row[4]), 2) if row[4] is not None else None,
+                "last_purchased": str(row[5]) if row[5] else None,
+            } for row in cursor.fetchall()]
     
     # ========== Merchant Operations ==========
     
     def save_merchant(self, merchant_id: int, user_id: str, name: str, logo_url: str = "") -> Dict[str, Any]:
         """Save or update a connected merchant"""
-        conn, cursor = self._get_connection()
+        with self._get_connection("save_merchant") as (conn, cursor):
+            cursor.execute("""
+                MERGE INTO MERCHANTS AS target
+                USING (SELECT %s AS merchant_id) AS source
+                ON target.merchant_id = source.merchant_id AND target.user_id = %s
+                WHEN MATCHED THEN
+                    UPDATE SET name = %s, logo_url = %s
+                WHEN NOT MATCHED THEN
+                    INSERT (merchant_id, user_id, name, logo_url, top_of_file_payment)
+                    VALUES (%s, %s, %s, %s, 'paypal')
+            """, (merchant_id, user_id, name, logo_url, merchant_id, user_id, name, logo_url))
         
-        cursor.execute("""
-            MERGE INTO MERCHANTS AS target
-            USING (SELECT %s AS merchant_id) AS source
-            ON target.merchant_id = source.merchant_id AND target.user_id = %s
-            WHEN MATCHED THEN
-                UPDATE SET name = %s, logo_url = %s
-            WHEN NOT MATCHED THEN
-                INSERT (merchant_id, user_id, name, logo_url, top_of_file_payment)
-                VALUES (%s, %s, %s, %s, 'paypal')
-        """, (merchant_id, user_id, name, logo_url, merchant_id, user_id, name, logo_url))
-        
-        conn.commit()
-        return {"success": True, "merchant_id": merchant_id}
+            conn.commit()
+            self._invalidate(user_id)
+            return {"success": True, "merchant_id": merchant_id}
     
+    @cached_read
     def get_merchants(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all connected merchants for a user"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            SELECT merchant_id, name, logo_url, top_of_file_payment, 
-                   connected_at, last_transaction_at
-            FROM MERCHANTS
-            WHERE user_id = %s
-            ORDER BY last_transaction_at DESC NULLS LAST
-        """, (user_id,))
+        with self._get_connection("get_merchants") as (conn, cursor):
+            cursor.execute("""
+                SELECT merchant_id, name, logo_url, top_of_file_payment, 
+                       connected_at, last_transaction_at
+                FROM MERCHANTS
+                WHERE user_id = %s
+                ORDER BY last_transaction_at DESC NULLS LAST
+            """, (user_id,))
         
-        rows = cursor.fetchall()
-        merchants = []
-        for row in rows:
-            merchants.append({
-                "merchant_id": row[0],
-                "name": row[1],
-                "logo_url": row[2],
-                "top_of_file_payment": row[3] or "paypal",
-                "connected_at": str(row[4]) if row[4] else None,
-                "last_transaction_at": str(row[5]) if row[5] else None,
-            })
-        return merchants
+            rows = cursor.fetchall()
+            merchants = []
+            for row in rows:
+                merchants.append({
+                    "merchant_id": row[0],
+                    "name": row[1],
+                    "logo_url": row[2],
+                    "top_of_file_payment": row[3] or "paypal",
+                    "connected_at": str(row[4]) if row[4] else None,
+                    "last_transaction_at": str(row[5]) if row[5] else None,
+                })
+            return merchants
     
     def update_merchant_payment(self, merchant_id: int, user_id: str, payment_method: str) -> Dict[str, Any]:
         """Update the top-of-file payment method for a merchant"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            UPDATE MERCHANTS
-            SET top_of_file_payment = %s, last_transaction_at = CURRENT_TIMESTAMP()
-            WHERE merchant_id = %s AND user_id = %s
-        """, (payment_method, merchant_id, user_id))
+        with self._get_connection("update_merchant_payment") as (conn, cursor):
+            cursor.execute("""
+                UPDATE MERCHANTS
+                SET top_of_file_payment = %s, last_transaction_at = CURRENT_TIMESTAMP()
+                WHERE merchant_id = %s AND user_id = %s
+            """, (payment_method, merchant_id, user_id))
         
-        conn.commit()
-        return {"success": True, "merchant_id": merchant_id, "payment_method": payment_method}
+            conn.commit()
+            self._invalidate(user_id)
+            return {"success": True, "merchant_id": merchant_id, "payment_method": payment_method}
+    
+    # ========== Knot Sync State ==========
+    
+    def get_sync_state(self, user_id: str, merchant_id: int) -> Optional[Dict[str, Any]]:
+        """Get the saved Knot sync cursor for a (user, merchant)"""
+        with self._get_connection("get_sync_state") as (conn, cursor):
+            cursor.execute("""
+                SELECT sync_cursor, pages_fetched, transactions_synced, last_synced_at
+                FROM KNOT_SYNC_STATE
+                WHERE user_id = %s AND merchant_id = %s
+            """, (user_id, merchant_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {
+                "cursor": row[0],
+                "pages_fetched": row[1] or 0,
+                "transactions_synced": row[2] or 0,
+                "last_synced_at": str(row[3]) if row[3] else None,
+            }
+    
+    def save_sync_state(self, user_id: str, merchant_id: int, sync_cursor: Optional[str], pages: int, new_rows: int) -> Dict[str, Any]:
+        """Persist the Knot resume cursor and accumulate sync counters"""
+        with self._get_connection("save_sync_state") as (conn, cursor):
+            cursor.execute("""
+                MERGE INTO KNOT_SYNC_STATE AS target
+                USING (SELECT %s AS user_id, %s AS merchant_id) AS source
+                ON target.user_id = source.user_id AND target.merchant_id = source.merchant_id
+                WHEN MATCHED THEN
+                    UPDATE SET sync_cursor = COALESCE(%s, target.sync_cursor),
+                               pages_fetched = target.pages_fetched + %s,
+                               transactions_synced = target.transactions_synced + %s,
+                               last_synced_at = CURRENT_TIMESTAMP()
+                WHEN NOT MATCHED THEN
+                    INSERT (user_id, merchant_id, sync_cursor, pages_fetched, transactions_synced, last_synced_at)
+                    VALUES (source.user_id, source.merchant_id, %s, %s, %s, CURRENT_TIMESTAMP())
+            """, (user_id, merchant_id, sync_cursor, pages, new_rows, sync_cursor, pages, new_rows))
+            conn.commit()
+            return {"success": True, "merchant_id": merchant_id, "cursor": sync_cursor}
     
     def save_transaction_with_payment_update(self, tx: Dict[str, Any], user_id: str, merchant_id: int, merchant_name: str, payment_method: str = None) -> Dict[str, Any]:
         """Save a transaction and update merchant's top-of-file payment if provided"""
@@ -981,52 +2509,71 @@ Return JSON only, no explanation:"""
             self.update_merchant_payment(merchant_id, user_id, payment_method)
         else:
             # Just update the last transaction time
-            conn, cursor = self._get_connection()
-            cursor.execute("""
-                UPDATE MERCHANTS
-                SET last_transaction_at = CURRENT_TIMESTAMP()
-                WHERE merchant_id = %s AND user_id = %s
-            """, (merchant_id, user_id))
-            conn.commit()
+            with self._get_connection("save_transaction_with_payment_update") as (conn, cursor):
+                cursor.execute("""
+                    UPDATE MERCHANTS
+                    SET last_transaction_at = CURRENT_TIMESTAMP()
+                    WHERE merchant_id = %s AND user_id = %s
+                """, (merchant_id, user_id))
+                conn.commit()
+            self._invalidate(user_id)
         
         return result
     
     def complete(self, prompt: str, model: str = "llama3.1-70b") -> str:
         """Call Snowflake Cortex COMPLETE to generate a response"""
-        conn, cursor = self._get_connection()
+        with self._get_connection("complete") as (conn, cursor):
+            # Escape single quotes in prompt for SQL
+            escaped_prompt = prompt.replace("'", "''")
         
-        # Escape single quotes in prompt for SQL
-        escaped_prompt = prompt.replace("'", "''")
-        
-        try:
-            cursor.execute(f"SELECT SNOWFLAKE.CORTEX.COMPLETE(%s, %s)", (model, prompt))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            return "No response generated."
-        except Exception as e:
-            raise Exception(f"Cortex COMPLETE failed: {e}")
+            try:
+                cursor.execute(f"SELECT SNOWFLAKE.CORTEX.COMPLETE(%s, %s)", (model, prompt))
+                result = cursor.fetchone()
+                if result:
+                    return result[0]
+                return "No response generated."
+            except Exception as e:
+                raise Exception(f"Cortex COMPLETE failed: {e}")
 
     def delete_merchant(self, merchant_id: int, user_id: str) -> Dict[str, Any]:
         """Delete a connected merchant"""
-        conn, cursor = self._get_connection()
-        
-        cursor.execute("""
-            DELETE FROM MERCHANTS
-            WHERE merchant_id = %s AND user_id = %s
-        """, (merchant_id, user_id))
+        with self._get_connection("delete_merchant") as (conn, cursor):
+            cursor.execute("""
+                DELETE FROM MERCHANTS
+                WHERE merchant_id = %s AND user_id = %s
+            """, (merchant_id, user_id))
         
-        conn.commit()
-        return {"success": True, "deleted": cursor.rowcount > 0}
+            conn.commit()
+            self._invalidate(user_id)
+            return {"success": True, "deleted": cursor.rowcount > 0}
 
 
-# Singleton instance
+# Singleton instance (shares one connection pool across request threads)
 _db_instance = None
+_db_lock = threading.Lock()
 
 def get_db() -> SnowflakeDB:
     """Get the singleton database instance"""
     global _db_instance
     if _db_instance is None:
-        _db_instance = SnowflakeDB()
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = SnowflakeDB()
     return _db_instance
 
+
+def reset_db_after_fork() -> None:
+    """Forget the instance inherited from a pre-fork parent; this process opens its own connections lazily.
+    
+    The parent's pooled connections are dropped without close(), which would log out
+    sessions the parent is still using.
+    """
+    global _db_instance, _db_lock
+    _db_lock = threading.Lock()
+    _db_instance = None
+
+
+def close_db() -> None:
+    """Close this process's pooled Snowflake sessions (graceful shutdown)"""
+    if _db_instance is not None:
+        _db_instance.close()
@@ -0,0 +1,19 @@
+"""
+Shared pytest setup for the backend tests
+
+- Puts backend/ on sys.path so modules import the way app.py imports them
+- Points the job queue / shared cache versions at a throwaway SQLite file
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before jobs / cache are imported so their CONFIG dicts pick it up
+_tmp_dir = tempfile.mkdtemp(prefix="dime-tests-")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_tmp_dir, "jobs.sqlite3"))
+os.environ.setdefault("JOBS_WORKERS", "2")
@@ -0,0 +1,173 @@
+"""Tests for backfill.run_backfill / start_backfill checkpointing"""
+
+import pytest
+
+import backfill
+import jobs
+from backfill import pause_backfill, run_backfill, start_backfill
+from jobs import JobQueue
+
+
+class FakeDB:
+    """Checkpoint table and id scan for backfill tests"""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+        self.checkpoints = {}
+        self.applied = []
+        self.on_apply = None
+
+    def get_backfill_checkpoint(self, name):
+        checkpoint = self.checkpoints.get(name)
+        return dict(checkpoint) if checkpoint else None
+
+    def save_backfill_checkpoint(self, name, status, **fields):
+        checkpoint = self.checkpoints.setdefault(name, {
+            "name": name, "last_id": None, "rows_processed": 0, "rows_updated": 0, "batches": 0, "error": None,
+        })
+        checkpoint.update(fields)
+        checkpoint["status"] = status
+        return dict(checkpoint)
+
+    def backfill_next_ids(self, missing, after_id, limit):
+        return [i for i in self.ids if after_id is None or i > after_id][:limit]
+
+    def backfill_apply(self, column, source, ids, refresh_rollup=False):
+        self.applied.append(list(ids))
+        if self.on_apply:
+            self.on_apply(len(self.applied))
+        return len(ids)
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setitem(backfill.BACKFILL_CONFIG, "batch_size", 2)
+    monkeypatch.setitem(backfill.BACKFILL_CONFIG, "sleep_seconds", 0)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # Not started: tests only look at what start_backfill enqueues
+    q = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=1)
+    monkeypatch.setattr(jobs, "get_queue", lambda recover=True: q)
+    return q
+
+
+IDS = ["t1", "t2", "t3", "t4", "t5"]
+
+
+def test_runs_to_completion_in_batches():
+    db = FakeDB(IDS)
+    checkpoint = run_backfill(db, "card_id")
+
+    assert db.applied == [["t1", "t2"], ["t3", "t4"], ["t5"]]
+    assert checkpoint["status"] == "completed"
+    assert checkpoint["rows_processed"] == 5
+    assert checkpoint["batches"] == 3
+    assert checkpoint["last_id"] == "t5"
+
+
+def test_unknown_backfill_is_rejected():
+    with pytest.raises(ValueError):
+        run_backfill(FakeDB(IDS), "no_such_column")
+
+
+def test_max_batches_leaves_checkpoint_running_for_resume():
+    db = FakeDB(IDS)
+    checkpoint = run_backfill(db, "card_id", max_batches=1)
+    assert checkpoint["status"] == "running"
+    assert checkpoint["last_id"] == "t2"
+
+    run_backfill(db, "card_id")
+    assert db.applied == [["t1", "t2"], ["t3", "t4"], ["t5"]]
+
+
+def test_pause_stops_after_current_batch_and_resume_continues():
+    db = FakeDB(IDS)
+    db.on_apply = lambda batches: pause_backfill(db, "card_id") if batches == 1 else None
+
+    checkpoint = run_backfill(db, "card_id")
+    assert checkpoint["status"] == "paused"
+    assert db.applied == [["t1", "t2"]]
+
+    # A paused checkpoint is left alone until something marks it running again
+    assert run_backfill(db, "card_id")["status"] == "paused"
+    assert len(db.applied) == 1
+
+    db.on_apply = None
+    db.save_backfill_checkpoint("card_id", "running")
+    checkpoint = run_backfill(db, "card_id")
+    assert checkpoint["status"] == "completed"
+    assert db.applied == [["t1", "t2"], ["t3", "t4"], ["t5"]]
+    assert checkpoint["rows_processed"] == 5
+
+
+def test_completed_backfill_is_not_rescanned_unless_restarted():
+    db = FakeDB(IDS)
+    run_backfill(db, "card_id")
+    db.applied.clear()
+
+    assert run_backfill(db, "card_id")["status"] == "completed"
+    assert db.applied == []
+
+    checkpoint = run_backfill(db, "card_id", restart=True)
+    assert checkpoint["status"] == "completed"
+    assert checkpoint["batches"] == 3
+    assert db.applied[0] == ["t1", "t2"]
+
+
+def test_restart_during_run_is_adopted():
+    db = FakeDB(IDS)
+
+    def restart_after_second_batch(batches):
+        if batches == 2:
+            db.save_backfill_checkpoint("card_id", "running", last_id=None, rows_processed=0,
+                                        rows_updated=0, batches=0)
+    db.on_apply = restart_after_second_batch
+
+    checkpoint = run_backfill(db, "card_id")
+    assert db.applied[:3] == [["t1", "t2"], ["t3", "t4"], ["t1", "t2"]]
+    assert checkpoint["status"] == "completed"
+    assert checkpoint["rows_processed"] == 5
+
+
+def test_start_enqueues_one_job_per_backfill(queue):
+    db = FakeDB(IDS)
+    first = start_backfill(db, "card_id")
+    second = start_backfill(db, "card_id")
+
+    assert first["job_id"] == second["job_id"]
+    assert len(queue.active("backfill_column", "backfill:card_id")) == 1
+    assert db.checkpoints["card_id"]["status"] == "running"
+
+
+def test_start_after_pause_queues_successor_for_exiting_run(queue):
+    db = FakeDB(IDS)
+    first = start_backfill(db, "card_id")
+    queue._claim()  # the first job is now running
+    pause_backfill(db, "card_id")
+
+    resumed = start_backfill(db, "card_id")
+    assert resumed["job_id"] != first["job_id"]
+    assert resumed["status"] == "running"
+
+
+def test_start_returns_completed_checkpoint_without_job(queue):
+    db = FakeDB(IDS)
+    run_backfill(db, "card_id")
+
+    checkpoint = start_backfill(db, "card_id")
+    assert checkpoint["status"] == "completed"
+    assert "job_id" not in checkpoint
+    assert queue.active("backfill_column") == []
+
+
+def test_start_with_restart_resets_progress(queue):
+    db = FakeDB(IDS)
+    run_backfill(db, "card_id")
+
+    checkpoint = start_backfill(db, "card_id", restart=True)
+    assert checkpoint["status"] == "running"
+    assert checkpoint["last_id"] is None
+    assert checkpoint["batches"] == 0
+    assert len(queue.active("backfill_column")) == 1
@@ -0,0 +1,119 @@
+"""Tests for routing job-worker connections to SnowflakeDB's background pool"""
+
+import threading
+import time
+
+from db_pool import ConnectionPool, background_lane
+from jobs import JobQueue, job_handler
+from snowflake_db import SnowflakeDB
+
+
+class FakeCursor:
+    def execute(self, sql, params=()):
+        return self
+
+    def fetchone(self):
+        return ("9.0.0",)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, lane):
+        self.lane = lane
+        self._dime_query_tag = None
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_db(background_size=1):
+    interactive = ConnectionPool(lambda: FakeConnection("interactive"), max_size=1, wait_timeout=0.2)
+    background = ConnectionPool(lambda: FakeConnection("background"), max_size=background_size, wait_timeout=5)
+    return SnowflakeDB(pool=interactive, background_pool=background), interactive, background
+
+
+def lane_of(db, method="test"):
+    with db._get_connection(method) as (conn, cursor):
+        return conn.lane
+
+
+def test_requests_use_interactive_pool_and_lane_uses_background():
+    db, _, _ = make_db()
+    assert lane_of(db) == "interactive"
+    with background_lane():
+        assert lane_of(db) == "background"
+    assert lane_of(db) == "interactive"
+
+
+def test_busy_background_pool_does_not_block_requests():
+    db, interactive, background = make_db(background_size=1)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def long_job():
+        with background_lane(), db._get_connection("long_job"):
+            holding.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=long_job)
+    worker.start()
+    try:
+        assert holding.wait(5)
+        started = time.monotonic()
+        assert lane_of(db) == "interactive"
+        assert time.monotonic() - started < 0.1
+        assert background.stats()["in_use"] == 1
+    finally:
+        release.set()
+        worker.join(5)
+    assert interactive.stats()["in_use"] == 0
+
+
+def test_pool_stats_nest_background_pool():
+    db, _, _ = make_db(background_size=3)
+    assert db.pool_stats()["background"]["max_size"] == 3
+
+
+def test_injected_pool_serves_both_lanes():
+    pool = ConnectionPool(lambda: FakeConnection("only"), max_size=1)
+    db = SnowflakeDB(pool=pool)
+    with background_lane():
+        assert lane_of(db) == "only"
+    assert "background" not in db.pool_stats()
+
+
+seen_lanes = []
+
+
+@job_handler("test_lane")
+def _lane_job(payload, user_id):
+    seen_lanes.append(lane_of(_lane_job.db))
+    return None
+
+
+def test_job_handlers_run_in_background_lane(tmp_path):
+    db, _, _ = make_db()
+    _lane_job.db = db
+    seen_lanes.clear()
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=1)
+    job_id = queue.enqueue("test_lane", {}, user_id="u1")
+    queue.start()
+    try:
+        deadline = time.monotonic() + 5
+        while queue.get(job_id)["status"] != "succeeded" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop(timeout=5)
+
+    assert seen_lanes == ["background"]
@@ -0,0 +1,203 @@
+"""Tests for cache.VersionedCache and the version stores"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from cache import LocalVersions, SharedVersions, VersionedCache, cached_read
+
+
+class Loader:
+    def __init__(self, value="v"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"value": self.value, "call": self.calls}
+
+
+@pytest.fixture(params=["local", "shared"])
+def versions(request, tmp_path):
+    if request.param == "local":
+        return LocalVersions()
+    return SharedVersions(str(tmp_path / "versions.sqlite3"))
+
+
+def test_hit_returns_copy_without_reloading(versions):
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    load = Loader()
+
+    first = cache.get_or_load("get_x", (("user_id", "u1"),), "u1", load)
+    first["value"] = "mutated by caller"
+    second = cache.get_or_load("get_x", (("user_id", "u1"),), "u1", load)
+
+    assert load.calls == 1
+    assert second == {"value": "v", "call": 1}
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidate_user_only_drops_that_user(versions):
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    u1, u2 = Loader(), Loader()
+    cache.get_or_load("get_x", ("u1",), "u1", u1)
+    cache.get_or_load("get_x", ("u2",), "u2", u2)
+
+    cache.invalidate_user("u1")
+    cache.get_or_load("get_x", ("u1",), "u1", u1)
+    cache.get_or_load("get_x", ("u2",), "u2", u2)
+
+    assert (u1.calls, u2.calls) == (2, 1)
+
+
+def test_user_write_invalidates_all_users_reads(versions):
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    load = Loader()
+    cache.get_or_load("get_totals", (), None, load)
+
+    cache.invalidate_user("u1")
+    cache.get_or_load("get_totals", (), None, load)
+
+    assert load.calls == 2
+
+
+def test_invalidate_all_drops_every_user(versions):
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    u1, u2 = Loader(), Loader()
+    cache.get_or_load("get_x", ("u1",), "u1", u1)
+    cache.get_or_load("get_x", ("u2",), "u2", u2)
+
+    cache.invalidate_all()
+    cache.get_or_load("get_x", ("u1",), "u1", u1)
+    cache.get_or_load("get_x", ("u2",), "u2", u2)
+
+    assert (u1.calls, u2.calls) == (2, 2)
+
+
+def test_write_during_load_is_not_served_as_fresh(versions):
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    calls = []
+
+    def slow_load():
+        calls.append(1)
+        if len(calls) == 1:
+            # A write lands after the version was read but before the result is stored
+            cache.invalidate_user("u1")
+        return len(calls)
+
+    assert cache.get_or_load("get_x", (), "u1", slow_load) == 1
+    assert cache.get_or_load("get_x", (), "u1", slow_load) == 2
+
+
+def test_entries_expire_after_ttl():
+    cache = VersionedCache(ttl_seconds=0.01, max_entries=10, versions=LocalVersions())
+    load = Loader()
+    cache.get_or_load("get_x", (), "u1", load)
+    time.sleep(0.02)
+    cache.get_or_load("get_x", (), "u1", load)
+
+    assert load.calls == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = VersionedCache(ttl_seconds=60, max_entries=2, versions=LocalVersions())
+    loads = {name: Loader(name) for name in "abc"}
+    cache.get_or_load("get", ("a",), "u1", loads["a"])
+    cache.get_or_load("get", ("b",), "u1", loads["b"])
+    cache.get_or_load("get", ("a",), "u1", loads["a"])
+    cache.get_or_load("get", ("c",), "u1", loads["c"])
+
+    cache.get_or_load("get", ("a",), "u1", loads["a"])
+    cache.get_or_load("get", ("b",), "u1", loads["b"])
+
+    assert (loads["a"].calls, loads["b"].calls) == (1, 2)
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_namespaces_do_not_share_versions():
+    versions = LocalVersions()
+    reads = VersionedCache(ttl_seconds=60, max_entries=10, namespace="reads", versions=versions)
+    raw = VersionedCache(ttl_seconds=60, max_entries=10, namespace="raw", versions=versions)
+    load = Loader()
+    raw.get_or_load("get_raw", (), "u1", load)
+
+    reads.invalidate_all()
+    raw.get_or_load("get_raw", (), "u1", load)
+
+    assert load.calls == 1
+
+
+def test_shared_versions_invalidate_other_instances(tmp_path):
+    path = str(tmp_path / "versions.sqlite3")
+    worker_a = VersionedCache(ttl_seconds=60, max_entries=10, versions=SharedVersions(path))
+    worker_b = VersionedCache(ttl_seconds=60, max_entries=10, versions=SharedVersions(path))
+    load = Loader()
+    worker_a.get_or_load("get_x", (), "u1", load)
+
+    worker_b.invalidate_user("u1")
+    worker_a.get_or_load("get_x", (), "u1", load)
+
+    assert load.calls == 2
+
+
+def _bump_in_child(path):
+    SharedVersions(path).bump("reads:user:u1")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_shared_versions_see_writes_from_forked_process(tmp_path):
+    versions = SharedVersions(str(tmp_path / "versions.sqlite3"))
+    cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=versions)
+    load = Loader()
+    cache.get_or_load("get_x", (), "u1", load)
+
+    child = multiprocessing.get_context("fork").Process(target=_bump_in_child, args=(versions.db_path,))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+
+    cache.get_or_load("get_x", (), "u1", load)
+    assert load.calls == 2
+
+
+def test_shared_versions_bumps_are_not_lost_across_threads(tmp_path):
+    versions = SharedVersions(str(tmp_path / "versions.sqlite3"))
+
+    def bump():
+        for _ in range(25):
+            versions.bump("reads:user:u1")
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert versions.get("reads:user:u1") == (100,)
+
+
+class FakeDB:
+    def __init__(self):
+        self._cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=LocalVersions())
+        self.calls = 0
+
+    @cached_read
+    def get_summary(self, user_id, months=6):
+        self.calls += 1
+        return {"user_id": user_id, "months": months}
+
+
+def test_cached_read_keys_on_bound_arguments():
+    db = FakeDB()
+    db.get_summary("u1")
+    db.get_summary(user_id="u1", months=6)
+    db.get_summary("u1", months=3)
+
+    assert db.calls == 2
+
+    db._cache.invalidate_user("u1")
+    db.get_summary("u1")
+    assert db.calls == 3
@@ -0,0 +1,61 @@
+"""Tests for SnowflakeDB.backfill_card_benefits invalidation"""
+
+from card_index import card_indexes
+from snowflake_db import SnowflakeDB
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith("UPDATE"):
+            self.updates.append(params)
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._dime_query_tag = None
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SinglePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def checkout(self, timeout=None):
+        return self.conn
+
+    def checkin(self, conn, discard=False):
+        pass
+
+
+def test_backfill_invalidates_card_index_of_affected_users_only():
+    cursor = FakeCursor([("c1", "u1", "3x dining"), ("c2", "u2", "no rewards")])
+    db = SnowflakeDB(pool=SinglePool(FakeConnection(cursor)))
+    db.compile_benefits = lambda text: {"food_dining": 3.0} if "dining" in text else {}
+    before = {user: card_indexes._version(user) for user in ("u1", "u2")}
+
+    result = db.backfill_card_benefits()
+
+    assert result == {"success": True, "cards": 2, "compiled": 1}
+    assert [params[2] for params in cursor.updates] == ["c1"]
+    assert card_indexes._version("u1") != before["u1"]
+    assert card_indexes._version("u2") == before["u2"]
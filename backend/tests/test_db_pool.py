@@ -0,0 +1,239 @@
+"""Tests for db_pool.ConnectionPool"""
+
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        if self.conn.ping_fails:
+            raise RuntimeError("connection reset")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, ident):
+        self.ident = ident
+        self.closed = False
+        self.ping_fails = False
+
+    def is_closed(self):
+        return self.closed
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = []
+
+    def __call__(self):
+        with self.lock:
+            conn = FakeConnection(len(self.created))
+            self.created.append(conn)
+            return conn
+
+
+def test_reuses_idle_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=2)
+
+    conn = pool.checkout()
+    pool.checkin(conn)
+    again = pool.checkout()
+
+    assert again is conn
+    assert len(factory.created) == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_never_exceeds_max_size_under_contention():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=3, wait_timeout=5)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    errors = []
+
+    def worker():
+        nonlocal active, peak
+        try:
+            for _ in range(20):
+                conn = pool.checkout()
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.001)
+                with lock:
+                    active -= 1
+                pool.checkin(conn)
+        except Exception as e:  # pragma: no cover - surfaced by the assert below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.stats()
+    assert errors == []
+    assert peak <= 3
+    assert len(factory.created) <= 3
+    assert stats["in_use"] == 0
+    assert stats["checkouts"] == 200
+    assert stats["waits"] > 0
+
+
+def test_checkout_times_out_when_exhausted():
+    pool = ConnectionPool(Factory(), max_size=1)
+    held = pool.checkout()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.checkout(timeout=0.05)
+
+    stats = pool.stats()
+    assert stats["wait_timeouts"] == 1
+    assert stats["in_use"] == 1
+    pool.checkin(held)
+
+
+def test_waiter_wakes_on_checkin():
+    pool = ConnectionPool(Factory(), max_size=1)
+    held = pool.checkout()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    pool.checkin(held)
+    waiter.join(timeout=5)
+
+    assert got == [held]
+    assert pool.stats()["waits"] == 1
+
+
+def test_discard_closes_and_frees_slot():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=1)
+
+    conn = pool.checkout()
+    pool.checkin(conn, discard=True)
+    replacement = pool.checkout(timeout=0.1)
+
+    assert conn.closed
+    assert replacement is not conn
+    assert pool.stats()["created"] == 2
+
+
+def test_closed_connection_is_replaced():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=1)
+
+    conn = pool.checkout()
+    pool.checkin(conn)
+    conn.closed = True
+    replacement = pool.checkout()
+
+    assert replacement is not conn
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_failed_ping_replaces_connection_idle_past_threshold():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=1, health_check_after=0)
+
+    conn = pool.checkout()
+    pool.checkin(conn)
+    conn.ping_fails = True
+    replacement = pool.checkout()
+
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_idle_connections_are_evicted():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=2, idle_timeout=0.01)
+
+    conn = pool.checkout()
+    pool.checkin(conn)
+    time.sleep(0.03)
+    replacement = pool.checkout()
+
+    assert conn.closed
+    assert replacement is not conn
+    assert pool.stats()["evicted_idle"] == 1
+
+
+def test_connect_failure_releases_slot():
+    calls = []
+
+    def flaky_connect():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("warehouse unavailable")
+        return FakeConnection(len(calls))
+
+    pool = ConnectionPool(flaky_connect, max_size=1)
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+
+    assert pool.stats()["in_use"] == 0
+    assert pool.checkout(timeout=0.1) is not None
+
+
+def test_close_all_refuses_checkouts_and_reset_reopens():
+    pool = ConnectionPool(Factory(), max_size=1)
+    conn = pool.checkout()
+    pool.checkin(conn)
+
+    pool.close_all()
+    assert conn.closed
+    with pytest.raises(PoolTimeoutError):
+        pool.checkout(timeout=0.01)
+
+    pool.reset()
+    assert pool.checkout(timeout=0.01) is not conn
+
+
+def test_evicted_connections_close_outside_the_lock():
+    closing = threading.Event()
+
+    class SlowClose(FakeConnection):
+        def close(self):
+            closing.set()
+            time.sleep(0.3)
+            super().close()
+
+    pool = ConnectionPool(lambda: SlowClose(0), max_size=2, idle_timeout=0.01)
+    conn = pool.checkout()
+    pool.checkin(conn)
+    time.sleep(0.03)
+
+    evictor = threading.Thread(target=pool.checkout)
+    evictor.start()
+    assert closing.wait(2)
+    started = time.monotonic()
+    pool.stats()
+    assert time.monotonic() - started < 0.1
+    evictor.join(2)
+    assert conn.closed
@@ -0,0 +1,79 @@
+"""Tests that every warehouse embedding uses snowflake_db.EMBED_MODEL"""
+
+import pytest
+
+import snowflake_db
+from snowflake_db import SnowflakeDB, classify_unclassified_sql
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append(sql)
+        return self
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.recorder = RecordingCursor()
+        self._dime_query_tag = None
+
+    def cursor(self):
+        return self.recorder
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SinglePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def checkout(self, timeout=None):
+        return self.conn
+
+    def checkin(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(snowflake_db, "EMBED_MODEL", "test-embed-model")
+    return "'test-embed-model'"
+
+
+def embed_calls(statements):
+    return [sql for sql in statements if "EMBED_TEXT_768" in sql]
+
+
+def test_warehouse_classification_uses_embed_model(model):
+    query, _ = classify_unclassified_sql(0.5)
+    assert model in query
+
+
+def test_category_embeddings_use_embed_model(model):
+    conn = RecordingConnection()
+    SnowflakeDB(pool=SinglePool(conn)).populate_category_embeddings()
+
+    calls = embed_calls(conn.recorder.statements)
+    assert calls and all(model in sql for sql in calls)
+
+
+def test_no_hardcoded_model_names():
+    source = open(snowflake_db.__file__).read()
+    assert source.count(f'"{snowflake_db.EMBED_MODEL}"') == 1
+    assert f"'{snowflake_db.EMBED_MODEL}'" not in source
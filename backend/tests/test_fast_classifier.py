@@ -0,0 +1,75 @@
+"""Tests for fast_classifier.FastPathClassifier"""
+
+import pytest
+
+from fast_classifier import KEYWORD_RULES, MERCHANT_CONFIDENCE, FastPathClassifier
+
+CATEGORIES = list(KEYWORD_RULES)
+
+
+@pytest.fixture
+def classifier():
+    return FastPathClassifier(CATEGORIES, min_confidence=0.6)
+
+
+def test_merchant_map_wins_over_keywords(classifier):
+    # DoorDash (19) is food_dining even when the item text looks like shopping
+    assert classifier.match("USB charger", "DoorDash", 19) == ("food_dining", MERCHANT_CONFIDENCE, "merchant")
+
+
+def test_single_keyword_match(classifier):
+    assert classifier.match("Large pepperoni pizza", "Joe's") == ("food_dining", 0.7, "keyword")
+
+
+def test_agreeing_keywords_raise_confidence(classifier):
+    category, confidence, source = classifier.match("Latte and bagel", "Corner Bakery")
+    assert (category, source) == ("food_dining", "keyword")
+    assert confidence == pytest.approx(0.9)
+
+
+def test_conflicting_keywords_lower_confidence(classifier):
+    category, confidence, _ = classifier.match("Pizza and headphones", None)
+    assert category in ("food_dining", "shopping")
+    assert confidence == pytest.approx(0.35)
+
+
+def test_keywords_match_whole_words_only(classifier):
+    # "tire" inside "satire" and "cafe" inside "cafeteria" must not count
+    assert classifier.match("Satire novel", "Cafeteria") is None
+
+
+def test_multi_word_keyword_beats_shorter_overlap(classifier):
+    assert classifier.match("Uber Eats order", None)[0] == "food_dining"
+
+
+def test_unknown_categories_are_dropped():
+    classifier = FastPathClassifier(["groceries"], min_confidence=0.6)
+    assert classifier.match("pizza", "DoorDash", 19) is None
+    assert classifier.match("milk and eggs", None)[0] == "groceries"
+    assert classifier.stats()["merchants"] == 0
+
+
+def test_no_categories_matches_nothing():
+    classifier = FastPathClassifier([])
+    assert classifier.match("pizza", None) is None
+
+
+def test_classify_many_splits_rows_and_counts(classifier):
+    rows = [
+        ("t1", "Spotify Premium", "Spotify", 13),
+        ("t2", "Organic produce", "Safeway", None),
+        ("t3", "Pizza and headphones", None, None),
+        ("t4", "Gift card", "Amazon", 44),
+    ]
+    labels, remaining = classifier.classify_many(rows)
+
+    assert labels == {"t1": ("entertainment", MERCHANT_CONFIDENCE), "t2": ("groceries", 0.8)}
+    assert [row[0] for row in remaining] == ["t3", "t4"]
+
+    stats = classifier.stats()
+    assert stats["rows"] == 4
+    assert stats["merchant_hits"] == 1
+    assert stats["keyword_hits"] == 1
+    assert stats["low_confidence"] == 1
+    assert stats["unmatched"] == 1
+    assert stats["resolved_fraction"] == 0.5
@@ -0,0 +1,181 @@
+"""Tests for jobs.JobQueue (claiming, per-user ordering, retries, recovery)"""
+
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, job_handler
+
+calls = []
+calls_lock = threading.Lock()
+failures_left = {}
+
+
+@job_handler("test_record")
+def _record(payload, user_id):
+    with calls_lock:
+        calls.append(("start", user_id, payload["n"]))
+    time.sleep(payload.get("sleep", 0))
+    with calls_lock:
+        calls.append(("end", user_id, payload["n"]))
+    return {"n": payload["n"]}
+
+
+@job_handler("test_flaky")
+def _flaky(payload, user_id):
+    key = payload["key"]
+    if failures_left.get(key, 0) > 0:
+        failures_left[key] -= 1
+        with calls_lock:
+            calls.append(("fail", user_id, key))
+        raise RuntimeError("transient")
+    with calls_lock:
+        calls.append(("ok", user_id, key))
+    return "ok"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    calls.clear()
+    failures_left.clear()
+    q = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), workers=4)
+    yield q
+    q.stop(timeout=5)
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setitem(jobs.JOBS_CONFIG, "backoff_seconds", 0.01)
+    monkeypatch.setitem(jobs.JOBS_CONFIG, "max_backoff_seconds", 0.02)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_enqueue_rejects_unknown_kind(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue("no_such_kind", {})
+
+
+def test_claim_blocks_users_later_jobs_while_one_is_running(queue):
+    first = queue.enqueue("test_record", {"n": 1}, user_id="u1")
+    second = queue.enqueue("test_record", {"n": 2}, user_id="u1")
+    other = queue.enqueue("test_record", {"n": 1}, user_id="u2")
+
+    assert queue._claim()["id"] == first
+    # u1's second job waits behind the running one; u2 is independent
+    assert queue._claim()["id"] == other
+    assert queue._claim() is None
+
+    queue._finish(_seq(queue, first), "succeeded")
+    assert queue._claim()["id"] == second
+
+
+def _seq(queue, job_id):
+    conn = queue._connect()
+    try:
+        return conn.execute("SELECT seq FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_claim_skips_jobs_in_backoff(queue):
+    job_id = queue.enqueue("test_record", {"n": 1}, user_id="u1")
+    queue._finish(_seq(queue, job_id), "queued", run_after=time.time() + 60)
+
+    assert queue._claim() is None
+
+
+def test_workers_keep_per_user_order_and_never_overlap(queue):
+    for n in range(5):
+        for user in ("u1", "u2", "u3"):
+            queue.enqueue("test_record", {"n": n, "sleep": 0.005}, user_id=user)
+    queue.start()
+
+    assert wait_for(lambda: queue.stats().get("succeeded") == 15)
+
+    for user in ("u1", "u2", "u3"):
+        events = [(kind, n) for kind, u, n in calls if u == user]
+        # Strictly start/end pairs in enqueue order: no overlap, no reordering
+        assert events == [(kind, n) for n in range(5) for kind in ("start", "end")]
+
+
+def test_users_run_in_parallel(queue):
+    for user in ("u1", "u2", "u3", "u4"):
+        queue.enqueue("test_record", {"n": 0, "sleep": 0.2}, user_id=user)
+    started = time.monotonic()
+    queue.start()
+
+    assert wait_for(lambda: queue.stats().get("succeeded") == 4)
+    assert time.monotonic() - started < 0.7
+
+
+def test_failed_job_retries_then_succeeds(queue, fast_backoff):
+    failures_left["a"] = 2
+    job_id = queue.enqueue("test_flaky", {"key": "a"}, user_id="u1", max_attempts=5)
+    queue.start()
+
+    assert wait_for(lambda: queue.get(job_id)["status"] == "succeeded")
+    job = queue.get(job_id)
+    assert job["attempts"] == 3
+    assert job["result"] == "ok"
+
+
+def test_job_fails_after_max_attempts(queue, fast_backoff):
+    failures_left["b"] = 10
+    job_id = queue.enqueue("test_flaky", {"key": "b"}, user_id="u1", max_attempts=2)
+    queue.start()
+
+    assert wait_for(lambda: queue.get(job_id)["status"] == "failed")
+    job = queue.get(job_id)
+    assert job["attempts"] == 2
+    assert job["error"] == "transient"
+
+
+def test_retrying_job_still_blocks_users_later_jobs(queue, fast_backoff):
+    failures_left["c"] = 1
+    first = queue.enqueue("test_flaky", {"key": "c"}, user_id="u1")
+    queue.enqueue("test_record", {"n": 1}, user_id="u1")
+    queue.start()
+
+    assert wait_for(lambda: queue.stats().get("succeeded") == 2)
+    # The later job waited out the earlier one's backoff instead of jumping ahead
+    assert calls == [("fail", "u1", "c"), ("ok", "u1", "c"), ("start", "u1", 1), ("end", "u1", 1)]
+
+
+def test_recover_interrupted_requeues_running_jobs(queue):
+    job_id = queue.enqueue("test_record", {"n": 7}, user_id="u1")
+    assert queue._claim()["id"] == job_id
+    assert queue.get(job_id)["status"] == "running"
+
+    # A new process over the same file picks the job back up
+    restarted = JobQueue(db_path=queue.db_path, workers=1)
+    assert restarted.recover_interrupted() == 1
+    assert restarted.get(job_id)["status"] == "queued"
+
+    restarted.start(recover=False)
+    try:
+        assert wait_for(lambda: restarted.get(job_id)["status"] == "succeeded")
+    finally:
+        restarted.stop(timeout=5)
+    assert restarted.get(job_id)["attempts"] == 2
+
+
+def test_active_lists_queued_and_running_of_one_kind(queue):
+    running = queue.enqueue("test_record", {"n": 1}, user_id="u1")
+    queued = queue.enqueue("test_record", {"n": 2}, user_id="u1")
+    queue.enqueue("test_flaky", {"key": "x"}, user_id="u1")
+    done = queue.enqueue("test_record", {"n": 3}, user_id="u2")
+    queue._claim()
+    queue._finish(_seq(queue, done), "succeeded")
+
+    assert [job["id"] for job in queue.active("test_record")] == [running, queued]
+    assert queue.active("test_record", user_id="u2") == []
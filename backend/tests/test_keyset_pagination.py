@@ -0,0 +1,135 @@
+"""Tests for the keyset cursor used by SnowflakeDB.get_transactions_page"""
+
+import random
+import sqlite3
+
+import pytest
+
+from snowflake_db import SnowflakeDB, _decode_page_cursor, _encode_page_cursor
+
+
+class SQLiteCursor:
+    """Runs the connector's pyformat SQL against SQLite (which also sorts NULLS LAST)"""
+
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith("ALTER SESSION"):
+            return self
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params))
+        self.rowcount = self._cursor.rowcount
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, rows):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE TRANSACTIONS (
+                id TEXT, user_id TEXT, external_id TEXT, merchant_id INTEGER, merchant_name TEXT,
+                datetime TEXT, order_status TEXT, total_amount REAL, currency TEXT, spend_category TEXT,
+                category_confidence REAL, points_earned INTEGER, payment_method TEXT, card_id TEXT
+            )
+        """)
+        self._conn.executemany("INSERT INTO TRANSACTIONS (id, user_id, datetime, total_amount) VALUES (?, ?, ?, ?)",
+                               rows)
+
+    def cursor(self):
+        return SQLiteCursor(self._conn)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SinglePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def checkout(self, timeout=None):
+        return self.conn
+
+    def checkin(self, conn, discard=False):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def make_db(rows):
+    db = SnowflakeDB(pool=SinglePool(SQLiteConnection(rows)))
+    db._cache = None
+    return db
+
+
+def test_cursor_round_trip():
+    cursor = _encode_page_cursor("2026-03-01T12:00:00", "tx-9")
+    assert "=" not in cursor
+    assert _decode_page_cursor(cursor) == ("2026-03-01T12:00:00", "tx-9")
+
+
+def test_cursor_encodes_datetime_objects_and_nulls():
+    from datetime import datetime
+    assert _decode_page_cursor(_encode_page_cursor(datetime(2026, 3, 1, 12), "a"))[0] == "2026-03-01T12:00:00"
+    assert _decode_page_cursor(_encode_page_cursor(None, "a")) == (None, "a")
+
+
+@pytest.mark.parametrize("bad", ["", "not-a-cursor", "bm90IGpzb24", "WzEsMiwzXQ"])
+def test_malformed_cursor_raises_value_error(bad):
+    with pytest.raises(ValueError):
+        _decode_page_cursor(bad)
+
+
+def test_pages_cover_every_row_once_in_order():
+    rng = random.Random(3)
+    # Duplicate timestamps and NULL datetimes exercise both halves of the keyset predicate
+    stamps = [f"2026-0{m}-1{d} 10:00:00" for m in range(1, 4) for d in range(3)] + [None]
+    rows = [(f"tx{i:03d}", "u1", rng.choice(stamps), 1.0) for i in range(57)]
+    rows += [(f"other{i}", "u2", stamps[0], 1.0) for i in range(5)]
+    db = make_db(rows)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = db.get_transactions_page("u1", limit=10, cursor=cursor, fields=["id", "datetime"])
+        seen.extend((tx["datetime"], tx["id"]) for tx in page["transactions"])
+        pages += 1
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            break
+        cursor = page["next_cursor"]
+
+    expected = [(dt, tx_id) for tx_id, user, dt, _ in rows if user == "u1"]
+    # Newest first with NULL datetimes last; ties broken by id descending
+    non_null = sorted([r for r in expected if r[0] is not None], reverse=True)
+    nulls = sorted([r for r in expected if r[0] is None], reverse=True)
+    assert seen == non_null + nulls
+    assert pages == 6
+
+
+def test_exact_multiple_of_limit_has_no_empty_trailing_page():
+    db = make_db([(f"tx{i}", "u1", f"2026-01-0{i + 1} 00:00:00", 1.0) for i in range(4)])
+
+    first = db.get_transactions_page("u1", limit=2, fields=["id"])
+    second = db.get_transactions_page("u1", limit=2, cursor=first["next_cursor"], fields=["id"])
+
+    assert [tx["id"] for tx in first["transactions"]] == ["tx3", "tx2"]
+    assert [tx["id"] for tx in second["transactions"]] == ["tx1", "tx0"]
+    assert second["has_more"] is False
+
+
+def test_invalid_cursor_is_rejected_before_querying():
+    with pytest.raises(ValueError):
+        make_db([]).get_transactions_page("u1", cursor="garbage!")
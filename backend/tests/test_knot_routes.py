@@ -0,0 +1,57 @@
+"""Tests for /api/knot/transactions page-argument validation"""
+
+import pytest
+
+import routes.knot as knot
+from app import create_app
+
+
+class FakeDB:
+    def __init__(self):
+        self.saved = []
+        self.page_calls = []
+
+    def save_transactions_batch(self, txs, user_id, merchant_id, merchant_name, background=False):
+        self.saved.extend(txs)
+        return {"job_id": "job-1"}
+
+    def get_transactions_page(self, user_id, **kwargs):
+        self.page_calls.append(kwargs)
+        return {"transactions": [], "next_cursor": None, "has_more": False}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(knot, "get_snowflake", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    return create_app(start_background=False).test_client()
+
+
+MANUAL = [{"merchant_id": 19, "merchant_name": "DoorDash", "total_amount": 12.5}]
+
+
+@pytest.mark.parametrize("bad", [{"cursor": "not a cursor!"}, {"fields": ["nope"]}, {"limit": "ten"}])
+def test_manual_submission_with_bad_page_args_saves_nothing(client, db, bad):
+    response = client.post("/api/knot/transactions", json={"user_id": "u1", "transactions": MANUAL, **bad})
+
+    assert response.status_code == 400
+    assert db.saved == []
+
+
+def test_manual_submission_saves_then_returns_page(client, db):
+    response = client.post("/api/knot/transactions", json={"user_id": "u1", "transactions": MANUAL, "limit": 5})
+
+    assert response.status_code == 200
+    assert response.get_json()["jobs"] == ["job-1"]
+    assert len(db.saved) == 1
+    assert db.page_calls == [{"limit": 5, "cursor": None, "include_raw": False, "fields": None}]
+
+
+def test_load_more_with_bad_cursor_is_400(client, db):
+    response = client.get("/api/knot/transactions?user_id=u1&cursor=garbage!")
+    assert response.status_code == 400
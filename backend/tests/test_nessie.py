@@ -0,0 +1,183 @@
+"""Tests for the Nessie month aggregation and response cache"""
+
+from datetime import datetime
+
+import pytest
+import requests
+
+import routes.nessie as nessie
+from cache import LocalVersions
+from routes.nessie import NessieCache, _aggregate_deposits_by_month, _fetch_deposits
+
+TODAY = datetime(2026, 2, 10)
+
+
+def test_window_is_oldest_first_and_crosses_year_boundary():
+    result = _aggregate_deposits_by_month([], months=4, today=TODAY)
+    assert [m["month"] for m in result] == ["Nov", "Dec", "Jan", "Feb"]
+    assert all(m["amount"] == 0 for m in result)
+
+
+def test_deposits_summed_per_month():
+    deposits = [
+        {"transaction_date": "2025-12-01", "amount": 100},
+        {"transaction_date": "2025-12-31", "amount": 50.5},
+        {"transaction_date": "2026-02-09T08:00:00", "amount": "25"},
+    ]
+    result = _aggregate_deposits_by_month(deposits, months=3, today=TODAY)
+    assert result == [
+        {"month": "Dec", "amount": 150.5},
+        {"month": "Jan", "amount": 0.0},
+        {"month": "Feb", "amount": 25.0},
+    ]
+
+
+def test_out_of_window_and_malformed_rows_are_ignored():
+    deposits = [
+        {"transaction_date": "2025-08-31", "amount": 999},   # before the window
+        {"transaction_date": "2026-03-01", "amount": 999},   # future month
+        {"transaction_date": "not a date", "amount": 999},
+        {"transaction_date": None, "amount": 999},
+        {"amount": 999},
+        "garbage",
+        {"transaction_date": "2026-01-15", "amount": "n/a"},
+        {"transaction_date": "2026-01-16", "amount": 10},
+    ]
+    result = _aggregate_deposits_by_month(deposits, months=6, today=TODAY)
+    assert [m["amount"] for m in result] == [0, 0, 0, 0, 10.0, 0]
+
+
+def test_matches_per_row_loop():
+    deposits = [{"transaction_date": f"2025-{m:02d}-{d:02d}", "amount": m * 10 + d}
+                for m in range(1, 13) for d in (1, 15, 28)]
+    today = datetime(2025, 12, 31)
+    expected = {}
+    for dep in deposits:
+        month = dep["transaction_date"][:7]
+        if month >= "2025-07":
+            expected[month] = expected.get(month, 0) + dep["amount"]
+
+    result = _aggregate_deposits_by_month(deposits, months=6, today=today)
+    assert [m["amount"] for m in result] == [expected[f"2025-{m:02d}"] for m in range(7, 13)]
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+
+class FakeNessie:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None):
+        self.calls.append((url, dict(headers or {})))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    def install(*responses):
+        client = FakeNessie(*responses)
+        monkeypatch.setattr(nessie, "nessie_client", client)
+        return client
+    return install
+
+
+def test_fresh_entry_is_served_without_a_request(fake_client):
+    client = fake_client(FakeResponse(200, [{"_id": "a"}], {"ETag": '"v1"'}))
+    cache = NessieCache(ttl_seconds=60, versions=LocalVersions())
+
+    assert cache.get_json("/accounts", "key") == (200, [{"_id": "a"}])
+    assert cache.get_json("/accounts", "key") == (200, [{"_id": "a"}])
+    assert len(client.calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_expired_entry_is_revalidated_with_validators(fake_client):
+    client = fake_client(
+        FakeResponse(200, [1], {"ETag": '"v1"', "Last-Modified": "Mon, 09 Feb 2026 00:00:00 GMT"}),
+        FakeResponse(304),
+    )
+    cache = NessieCache(ttl_seconds=0, versions=LocalVersions())
+    cache.get_json("/accounts", "key")
+
+    assert cache.get_json("/accounts", "key") == (200, [1])
+    assert client.calls[1][1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 09 Feb 2026 00:00:00 GMT"}
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_stale_copy_served_when_refresh_fails(fake_client):
+    fake_client(
+        FakeResponse(200, [1]),
+        requests.exceptions.ConnectionError("down"),
+        FakeResponse(503),
+    )
+    cache = NessieCache(ttl_seconds=0, versions=LocalVersions())
+    cache.get_json("/accounts", "key")
+
+    assert cache.get_json("/accounts", "key") == (200, [1])
+    assert cache.get_json("/accounts", "key") == (200, [1])
+    assert cache.stats()["stale_served"] == 2
+
+
+def test_error_without_cached_copy_is_passed_through(fake_client):
+    fake_client(FakeResponse(404), requests.exceptions.ConnectionError("down"))
+    cache = NessieCache(ttl_seconds=60, versions=LocalVersions())
+
+    assert cache.get_json("/accounts/x/deposits", "key") == (404, None)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cache.get_json("/accounts/x/deposits", "key")
+
+
+def test_invalidation_from_another_instance_forces_unconditional_refetch(fake_client):
+    client = fake_client(FakeResponse(200, [1], {"ETag": '"v1"'}), FakeResponse(200, [2]))
+    versions = LocalVersions()
+    worker_a = NessieCache(ttl_seconds=60, versions=versions)
+    worker_b = NessieCache(ttl_seconds=60, versions=versions)
+    worker_a.get_json("/accounts", "key")
+
+    worker_b.invalidate("/accounts")
+
+    assert worker_a.get_json("/accounts", "key") == (200, [2])
+    assert client.calls[1][1] == {}
+
+
+def test_lru_eviction(fake_client):
+    fake_client(*[FakeResponse(200, [i]) for i in range(4)])
+    cache = NessieCache(ttl_seconds=60, max_entries=2, versions=LocalVersions())
+    for path in ("/a", "/b", "/c"):
+        cache.get_json(path, "key")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_json("/a", "key") == (200, [3])
+
+
+def test_fetch_deposits_merges_accounts_and_counts_failures(monkeypatch):
+    results = {
+        "/accounts/a1/deposits": (200, [{"amount": 1}]),
+        "/accounts/a2/deposits": (200, [{"amount": 2}, {"amount": 3}]),
+        "/accounts/a3/deposits": (500, None),
+    }
+
+    def get_json(path, api_key):
+        if path == "/accounts/a4/deposits":
+            raise requests.exceptions.Timeout("slow")
+        return results[path]
+
+    monkeypatch.setattr(nessie.nessie_cache, "get_json", get_json)
+    deposits, failed = _fetch_deposits(["a1", "a2", "a3", "a4"], "key")
+
+    assert sorted(d["amount"] for d in deposits) == [1, 2, 3]
+    assert failed == 2
+    assert _fetch_deposits([], "key") == ([], 0)
@@ -0,0 +1,92 @@
+"""Tests for where background workers start: gunicorn hooks, wsgi and the dev server"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import app
+import jobs
+from jobs import JobQueue, job_handler
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def gunicorn_conf():
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", os.path.join(BACKEND_DIR, "gunicorn.conf.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeLog:
+    def __init__(self):
+        self.lines = []
+
+    def info(self, message):
+        self.lines.append(message)
+
+
+class FakeServer:
+    def __init__(self):
+        self.log = FakeLog()
+
+
+@job_handler("test_process_model")
+def _noop(payload, user_id):
+    return None
+
+
+def test_master_recovers_interrupted_jobs_once(gunicorn_conf, tmp_path, monkeypatch):
+    monkeypatch.setitem(jobs.JOBS_CONFIG, "db_path", str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue()
+    job_id = queue.enqueue("test_process_model", {}, user_id="u1")
+    queue._claim()
+    server = FakeServer()
+
+    gunicorn_conf.when_ready(server)
+
+    assert queue.get(job_id)["status"] == "queued"
+    assert server.log.lines == ["Recovered 1 interrupted jobs"]
+
+
+def test_worker_resets_inherited_state_then_starts_without_recovery(gunicorn_conf, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "reset_after_fork", lambda: calls.append("reset"))
+    monkeypatch.setattr(app, "start_background_workers", lambda recover_jobs=True: calls.append(("start", recover_jobs)))
+
+    gunicorn_conf.post_worker_init(worker=None)
+
+    # Workers never recover: that would requeue jobs other live workers are running
+    assert calls == ["reset", ("start", False)]
+
+
+def test_worker_exit_drains_within_graceful_timeout(gunicorn_conf, monkeypatch):
+    timeouts = []
+    monkeypatch.setattr(app, "drain_background_workers", lambda timeout=30.0: timeouts.append(timeout))
+
+    gunicorn_conf.worker_exit(FakeServer(), worker=None)
+
+    assert timeouts == [max(1.0, gunicorn_conf.graceful_timeout - 5)]
+
+
+def test_wsgi_import_starts_no_background_threads(monkeypatch):
+    started = []
+    monkeypatch.setattr(app, "start_background_workers", lambda recover_jobs=True: started.append(recover_jobs))
+    sys.modules.pop("wsgi", None)
+
+    import wsgi
+
+    assert wsgi.app is not None
+    assert started == []
+
+
+@pytest.mark.parametrize("env, expected", [(None, False), ("true", True), ("false", False)])
+def test_dev_server_starts_workers_only_in_reloader_child(monkeypatch, env, expected):
+    if env is None:
+        monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+    else:
+        monkeypatch.setenv("WERKZEUG_RUN_MAIN", env)
+    assert app.is_reloader_child() is expected
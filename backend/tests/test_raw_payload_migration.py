@@ -0,0 +1,83 @@
+"""Tests for SnowflakeDB._migrate_raw_payloads (legacy TRANSACTIONS.raw_json -> TRANSACTION_RAW)"""
+
+import pytest
+
+import snowflake_db
+from snowflake_db import SnowflakeDB
+
+
+class ScriptedCursor:
+    """Records statements; fetchone() answers from a list in order"""
+
+    def __init__(self, fetches, rowcount=0):
+        self.fetches = list(fetches)
+        self.statements = []
+        self.rowcount = rowcount
+
+    def execute(self, sql, params=()):
+        self.statements.append(" ".join(sql.split()))
+        return self
+
+    def fetchone(self):
+        return self.fetches.pop(0)
+
+    def ran(self, fragment):
+        return [sql for sql in self.statements if fragment in sql]
+
+
+@pytest.fixture
+def db():
+    # No pool use: _migrate_raw_payloads only touches the cursor it is given
+    return SnowflakeDB(pool=object())
+
+
+def test_no_legacy_column_is_a_no_op(db):
+    cursor = ScriptedCursor([(0,)])
+    result = db._migrate_raw_payloads(cursor, drop_column=True)
+
+    assert result["legacy_column"] is False
+    assert result["dropped"] is False
+    assert len(cursor.statements) == 1
+
+
+def test_copy_without_drop_keeps_column(db):
+    cursor = ScriptedCursor([(1,), (10, 10)], rowcount=4)
+    result = db._migrate_raw_payloads(cursor)
+
+    assert result == {"legacy_column": True, "copied": 4, "source_rows": 10, "verified_rows": 10,
+                      "verified": True, "dropped": False}
+    assert cursor.ran("INSERT INTO TRANSACTION_RAW")
+    assert "NOT EXISTS (SELECT 1 FROM TRANSACTION_RAW r WHERE r.tx_id = t.id)" in cursor.ran("INSERT")[0]
+    assert not cursor.ran("DROP COLUMN")
+
+
+def test_drop_after_every_payload_verifies(db):
+    cursor = ScriptedCursor([(1,), (10, 10)], rowcount=10)
+    result = db._migrate_raw_payloads(cursor, drop_column=True)
+
+    assert result["dropped"] is True
+    # Verification reads through the decoding view before anything is dropped
+    verify = cursor.ran("LEFT JOIN TRANSACTION_RAW_JSON")
+    assert verify and cursor.statements.index(verify[0]) < cursor.statements.index(cursor.ran("DROP COLUMN")[0])
+
+
+def test_mismatch_keeps_column_even_when_drop_requested(db):
+    cursor = ScriptedCursor([(1,), (10, 9)], rowcount=9)
+    result = db._migrate_raw_payloads(cursor, drop_column=True)
+
+    assert result["verified"] is False
+    assert result["dropped"] is False
+    assert not cursor.ran("DROP COLUMN")
+
+
+@pytest.mark.parametrize("compress, expected", [
+    (True, "NULL, COMPRESS(TO_JSON(t.raw_json), 'ZLIB')"),
+    (False, "PARSE_JSON(TO_JSON(t.raw_json)), NULL"),
+])
+def test_copy_honours_compression_setting(db, monkeypatch, compress, expected):
+    monkeypatch.setitem(snowflake_db.RAW_PAYLOAD_CONFIG, "compress", compress)
+    cursor = ScriptedCursor([(1,), (0, 0)])
+    db._migrate_raw_payloads(cursor)
+
+    assert expected in cursor.ran("INSERT INTO TRANSACTION_RAW")[0]
+
@@ -0,0 +1,239 @@
+"""Tests for DAILY_SPEND_ROLLUP maintenance: refresh_spend_rollup scopes and deferred_rollup"""
+
+import threading
+
+import pytest
+
+import snowflake_db
+from cache import LocalVersions, VersionedCache
+from snowflake_db import SnowflakeDB
+
+
+class RecordingCursor:
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+        self.rowcount = 7
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise RuntimeError("warehouse error")
+        self.statements.append((sql, tuple(params)))
+        return self
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._dime_query_tag = None
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class SinglePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def checkout(self, timeout=None):
+        return self.conn
+
+    def checkin(self, conn, discard=False):
+        pass
+
+
+def make_db(fail_on=None):
+    cursor = RecordingCursor(fail_on)
+    conn = RecordingConnection(cursor)
+    db = SnowflakeDB(pool=SinglePool(conn))
+    db._cache = VersionedCache(ttl_seconds=60, max_entries=10, versions=LocalVersions())
+    return db, conn, cursor
+
+
+def rollup_statements(cursor):
+    # Skip QUERY_TAG and BEGIN; returns [(delete_sql, params), (insert_sql, params)]
+    return [(sql, params) for sql, params in cursor.statements if sql.startswith(("DELETE", "INSERT"))]
+
+
+def assert_binds_match(statements):
+    for sql, params in statements:
+        assert sql.count("%s") == len(params), sql
+
+
+# ========== refresh_spend_rollup ==========
+
+def test_tx_ids_scope_recomputes_only_their_user_days():
+    db, conn, cursor = make_db()
+    result = db.refresh_spend_rollup(tx_ids=["t1", "t2"], user_id="u1")
+
+    (delete_sql, delete_params), (insert_sql, insert_params) = rollup_statements(cursor)
+    assert result == {"success": True, "rows": 7}
+    assert delete_params == insert_params == ("t1", "t2", "u1")
+    assert "WHERE id IN (%s, %s) AND datetime IS NOT NULL AND user_id = %s" in delete_sql
+    assert "USING (" in delete_sql and "r.user_id = d.user_id AND r.day = d.day" in delete_sql
+    assert "JOIN ( SELECT DISTINCT user_id, TO_DATE(datetime) AS day" in insert_sql
+    assert "WHERE t.datetime IS NOT NULL GROUP BY" in insert_sql
+    assert_binds_match(rollup_statements(cursor))
+    assert conn.commits == 1
+
+
+def test_tx_ids_without_user_are_not_narrowed():
+    db, _, cursor = make_db()
+    db.refresh_spend_rollup(tx_ids=["t1"])
+
+    (delete_sql, delete_params), (_, insert_params) = rollup_statements(cursor)
+    assert delete_params == insert_params == ("t1",)
+    assert "user_id = %s" not in delete_sql
+    assert_binds_match(rollup_statements(cursor))
+
+
+def test_user_scope_recomputes_all_of_that_users_days():
+    db, _, cursor = make_db()
+    db.refresh_spend_rollup(user_id="u1")
+
+    (delete_sql, delete_params), (insert_sql, insert_params) = rollup_statements(cursor)
+    assert delete_sql == "DELETE FROM DAILY_SPEND_ROLLUP WHERE user_id = %s"
+    assert delete_params == insert_params == ("u1",)
+    assert "WHERE t.user_id = %s AND t.datetime IS NOT NULL" in insert_sql
+    assert_binds_match(rollup_statements(cursor))
+
+
+def test_no_scope_rebuilds_whole_table():
+    db, _, cursor = make_db()
+    db.refresh_spend_rollup()
+
+    (delete_sql, delete_params), (insert_sql, insert_params) = rollup_statements(cursor)
+    assert delete_sql == "DELETE FROM DAILY_SPEND_ROLLUP"
+    assert delete_params == insert_params == ()
+    assert "FROM TRANSACTIONS t WHERE t.datetime IS NOT NULL GROUP BY" in insert_sql
+
+
+def test_delete_and_insert_run_in_one_transaction():
+    db, _, cursor = make_db()
+    db.refresh_spend_rollup(user_id="u1")
+
+    kinds = [sql.split()[0] for sql, _ in cursor.statements if not sql.startswith("ALTER")]
+    assert kinds == ["BEGIN", "DELETE", "INSERT"]
+
+
+def test_empty_tx_ids_is_a_no_op():
+    db, conn, cursor = make_db()
+    assert db.refresh_spend_rollup(tx_ids=[]) == {"success": True, "rows": 0}
+    assert cursor.statements == []
+    assert conn.commits == 0
+
+
+def test_failed_insert_rolls_back_and_still_invalidates():
+    db, conn, _ = make_db(fail_on="INSERT")
+    before = db._cache._version("u1")
+
+    with pytest.raises(RuntimeError):
+        db.refresh_spend_rollup(user_id="u1")
+
+    assert conn.rollbacks >= 1
+    assert conn.commits == 0
+    assert db._cache._version("u1") != before
+
+
+# ========== deferred_rollup ==========
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    db, _, _ = make_db()
+    calls = []
+    monkeypatch.setattr(db, "refresh_spend_rollup",
+                        lambda tx_ids=None, user_id=None: calls.append((tx_ids, user_id)))
+    return db, calls
+
+
+def test_writes_outside_a_block_refresh_immediately(refreshes):
+    db, calls = refreshes
+    db._refresh_rollup_safely(tx_ids=["t1"], user_id="u1")
+    assert calls == [(["t1"], "u1")]
+
+
+def test_nested_blocks_flush_once_at_outermost_exit(refreshes):
+    db, calls = refreshes
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(tx_ids=["t2"], user_id="u1")
+        with db.deferred_rollup():
+            db._refresh_rollup_safely(tx_ids=["t1"], user_id="u1")
+        assert calls == []
+        db._refresh_rollup_safely(tx_ids=["t2", "t3"], user_id="u1")
+        db._refresh_rollup_safely(tx_ids=["x1"], user_id="u2")
+    assert sorted(calls) == [(["t1", "t2", "t3"], "u1"), (["x1"], "u2")]
+
+    # The block is finished: later writes are immediate again
+    db._refresh_rollup_safely(user_id="u1")
+    assert calls[-1] == (None, "u1")
+
+
+def test_flush_is_chunked(refreshes, monkeypatch):
+    monkeypatch.setattr(snowflake_db, "ROLLUP_FLUSH_CHUNK_SIZE", 2)
+    db, calls = refreshes
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(tx_ids=["t5", "t1", "t4"], user_id="u1")
+        db._refresh_rollup_safely(tx_ids=["t3", "t2"], user_id="u1")
+    assert calls == [(["t1", "t2"], "u1"), (["t3", "t4"], "u1"), (["t5"], "u1")]
+
+
+def test_user_wide_refresh_absorbs_that_users_tx_ids(refreshes):
+    db, calls = refreshes
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(tx_ids=["t1"], user_id="u1")
+        db._refresh_rollup_safely(user_id="u1")
+        db._refresh_rollup_safely(tx_ids=["x1"], user_id="u2")
+    assert sorted(calls, key=str) == sorted([(None, "u1"), (["x1"], "u2")], key=str)
+
+
+def test_full_rebuild_absorbs_everything(refreshes):
+    db, calls = refreshes
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(tx_ids=["t1"], user_id="u1")
+        db._refresh_rollup_safely()
+        db._refresh_rollup_safely(user_id="u2")
+    assert calls == [(None, None)]
+
+
+def test_unattributed_tx_ids_flush_without_user(refreshes):
+    db, calls = refreshes
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(tx_ids=["t1"])
+    assert calls == [(["t1"], None)]
+
+
+def test_flushes_even_when_block_raises(refreshes):
+    db, calls = refreshes
+    with pytest.raises(ValueError):
+        with db.deferred_rollup():
+            db._refresh_rollup_safely(tx_ids=["t1"], user_id="u1")
+            raise ValueError("categorize failed halfway")
+    assert calls == [(["t1"], "u1")]
+
+
+def test_refresh_failure_during_flush_is_swallowed():
+    db, _, _ = make_db(fail_on="INSERT")
+    with db.deferred_rollup():
+        db._refresh_rollup_safely(user_id="u1")
+
+
+def test_deferral_is_per_thread(refreshes):
+    db, calls = refreshes
+    with db.deferred_rollup():
+        other = threading.Thread(target=db._refresh_rollup_safely, kwargs={"tx_ids": ["o1"], "user_id": "u9"})
+        other.start()
+        other.join()
+        assert calls == [(["o1"], "u9")]
+    assert calls == [(["o1"], "u9")]
@@ -0,0 +1,106 @@
+"""Tests for vector_classifier.VectorClassifier"""
+
+import json
+
+import numpy as np
+import pytest
+
+import vector_classifier
+from vector_classifier import VectorClassifier, get_classifier, parse_vector, reset_classifier
+
+CATEGORIES = ["food_dining", "groceries", "travel"]
+
+
+def unit(*values):
+    return np.array(values, dtype=np.float32)
+
+
+@pytest.fixture
+def classifier():
+    return VectorClassifier(CATEGORIES, np.eye(3, dtype=np.float32) * 5)
+
+
+def test_parse_vector_accepts_list_and_json_text():
+    assert parse_vector([1, 2]).dtype == np.float32
+    assert parse_vector(json.dumps([1.5, 2.5])).tolist() == [1.5, 2.5]
+
+
+def test_from_rows_skips_missing_embeddings():
+    classifier = VectorClassifier.from_rows([("a", [1, 0]), ("b", None), ("c", json.dumps([0, 1]))])
+    assert classifier.categories == ["a", "c"]
+
+
+def test_from_rows_requires_embeddings():
+    with pytest.raises(ValueError):
+        VectorClassifier.from_rows([("a", None)])
+
+
+def test_shape_mismatch_is_rejected():
+    with pytest.raises(ValueError):
+        VectorClassifier(CATEGORIES, np.eye(2))
+    with pytest.raises(ValueError):
+        VectorClassifier(CATEGORIES, np.eye(3)).similarities(np.ones((1, 4)))
+
+
+def test_similarities_are_cosine_regardless_of_scale(classifier):
+    scores = classifier.similarities(np.array([[10, 0, 0], [1, 1, 0]]))
+    assert scores[0] == pytest.approx([1, 0, 0])
+    assert scores[1] == pytest.approx([0.7071, 0.7071, 0], abs=1e-4)
+
+
+def test_zero_embedding_scores_zero(classifier):
+    assert classifier.similarities(np.zeros(3)) == pytest.approx(np.zeros((1, 3)))
+
+
+def test_classify_batch_returns_sorted_top_k(classifier):
+    results = classifier.classify(np.array([[0.1, 0.9, 0.3], [0, 0, 1]]), top_k=2)
+
+    assert [r["category"] for r in results] == ["groceries", "travel"]
+    assert [t["category"] for t in results[0]["top"]] == ["groceries", "travel"]
+    similarities = [t["similarity"] for t in results[0]["top"]]
+    assert similarities == sorted(similarities, reverse=True)
+    assert results[1]["confidence"] == pytest.approx(1.0)
+
+
+def test_classify_top_k_is_capped_at_category_count(classifier):
+    assert len(classifier.classify(unit(1, 0, 0), top_k=10)[0]["top"]) == 3
+
+
+def test_classify_below_min_confidence_has_no_category(classifier):
+    result = classifier.classify(unit(1, 1, 1), min_confidence=0.9)[0]
+    assert result["category"] is None
+    assert result["confidence"] == pytest.approx(0.57735, abs=1e-4)
+    assert len(result["top"]) == 1
+
+
+def test_matches_brute_force_cosine():
+    rng = np.random.default_rng(7)
+    matrix = rng.normal(size=(9, 768)).astype(np.float32)
+    batch = rng.normal(size=(20, 768)).astype(np.float32)
+    classifier = VectorClassifier([f"c{i}" for i in range(9)], matrix)
+
+    expected = [
+        int(np.argmax([np.dot(row, m) / (np.linalg.norm(row) * np.linalg.norm(m)) for m in matrix]))
+        for row in batch
+    ]
+    assert [r["category"] for r in classifier.classify(batch, min_confidence=-1)] == [f"c{i}" for i in expected]
+
+
+def test_get_classifier_loads_once_and_reloads_when_stale(monkeypatch):
+    reset_classifier()
+    loads = []
+
+    def load_rows():
+        loads.append(1)
+        return [("a", [1, 0]), ("b", [0, 1])]
+
+    try:
+        first = get_classifier(load_rows)
+        assert get_classifier(load_rows) is first
+        assert len(loads) == 1
+
+        monkeypatch.setitem(vector_classifier.CLASSIFIER_CONFIG, "reload_seconds", -1)
+        assert get_classifier(load_rows) is not first
+        assert len(loads) == 2
+    finally:
+        reset_classifier()
@@ -0,0 +1,177 @@
+"""Tests for warehouse_jobs.WarehouseJobRegistry (submit, claim and advance)"""
+
+import threading
+import time
+
+import pytest
+
+import warehouse_jobs
+from warehouse_jobs import WarehouseJobRegistry
+
+
+class FakeWarehouse:
+    """Stands in for SnowflakeDB's execute_async / async_query_status"""
+
+    def __init__(self, status_delay=0.0):
+        self.lock = threading.Lock()
+        self.submitted = []
+        self.states = {}
+        self.rollups = []
+        self.status_delay = status_delay
+
+    def execute_async(self, sql, params=()):
+        with self.lock:
+            query_id = f"q{len(self.submitted)}"
+            self.submitted.append((query_id, sql, tuple(params)))
+            self.states[query_id] = {"state": "running"}
+        return query_id
+
+    def async_query_status(self, query_id):
+        time.sleep(self.status_delay)
+        return self.states[query_id]
+
+    def refresh_spend_rollup(self, user_id=None):
+        with self.lock:
+            self.rollups.append(user_id)
+
+    def finish(self, query_id, rows=0):
+        self.states[query_id] = {"state": "succeeded", "rows": rows}
+
+
+STEPS = [("UPDATE a SET x = %s", (1,)), ("UPDATE b SET y = %s", (2,))]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return WarehouseJobRegistry(db_path=str(tmp_path / "jobs.sqlite3"))
+
+
+def test_submit_starts_first_step_only(registry):
+    db = FakeWarehouse()
+    job = registry.submit(db, "cleanup", STEPS, user_id="u1")
+
+    assert [sql for _, sql, _ in db.submitted] == ["UPDATE a SET x = %s"]
+    assert job["status"] == "running"
+    assert job["step"] == 1 and job["steps"] == 2
+    assert job["query_ids"] == ["q0"]
+
+
+def test_submit_rejects_empty_steps(registry):
+    with pytest.raises(ValueError):
+        registry.submit(FakeWarehouse(), "nothing", [])
+
+
+def test_poll_advances_through_steps_then_refreshes_rollup(registry):
+    db = FakeWarehouse()
+    job_id = registry.submit(db, "cleanup", STEPS, user_id="u1")["id"]
+
+    assert registry.poll_once(lambda: db) == 1
+    assert len(db.submitted) == 1
+
+    db.finish("q0", rows=3)
+    assert registry.poll_once(lambda: db) == 1
+    assert db.submitted[1] == ("q1", "UPDATE b SET y = %s", (2,))
+    assert db.rollups == []
+
+    db.finish("q1", rows=4)
+    assert registry.poll_once(lambda: db) == 0
+    job = registry.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["rows"] == 7
+    assert job["query_ids"] == ["q0", "q1"]
+    assert job["finished_at"] is not None
+    assert db.rollups == ["u1"]
+
+
+def test_failed_query_fails_job_without_later_steps(registry):
+    db = FakeWarehouse()
+    job_id = registry.submit(db, "cleanup", STEPS)["id"]
+    db.states["q0"] = {"state": "failed", "error": "warehouse suspended"}
+
+    assert registry.poll_once(lambda: db) == 0
+    job = registry.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "warehouse suspended"
+    assert len(db.submitted) == 1
+    assert db.rollups == []
+
+
+def test_concurrent_pollers_advance_a_step_once(registry):
+    db = FakeWarehouse(status_delay=0.05)
+    job_id = registry.submit(db, "cleanup", STEPS)["id"]
+    db.finish("q0")
+    # Separate registries over one file stand in for pollers in different worker processes
+    pollers = [registry] + [WarehouseJobRegistry(db_path=registry.db_path) for _ in range(3)]
+    barrier = threading.Barrier(8)
+
+    def poll(poller):
+        barrier.wait()
+        poller._advance(db, job_id)
+
+    threads = [threading.Thread(target=poll, args=(pollers[i % 4],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [query_id for query_id, _, _ in db.submitted] == ["q0", "q1"]
+    assert registry.get(job_id)["query_ids"] == ["q0", "q1"]
+
+
+def test_advancing_job_reports_running_and_is_skipped(registry):
+    db = FakeWarehouse()
+    job_id = registry.submit(db, "cleanup", STEPS)["id"]
+    conn = registry._connect()
+    try:
+        conn.execute("UPDATE warehouse_jobs SET status = 'advancing', updated_at = ? WHERE id = ?",
+                     (time.time(), job_id))
+    finally:
+        conn.close()
+    db.finish("q0")
+
+    assert registry.get(job_id)["status"] == "running"
+    assert registry.poll_once(lambda: db) == 0
+    assert len(db.submitted) == 1
+
+
+def test_stale_advancing_job_is_taken_back(registry, monkeypatch):
+    monkeypatch.setitem(warehouse_jobs.WAREHOUSE_JOBS_CONFIG, "stale_advance_seconds", 60)
+    db = FakeWarehouse()
+    job_id = registry.submit(db, "cleanup", STEPS)["id"]
+    conn = registry._connect()
+    try:
+        # Claimed by a poller that died two minutes ago
+        conn.execute("UPDATE warehouse_jobs SET status = 'advancing', updated_at = ? WHERE id = ?",
+                     (time.time() - 120, job_id))
+    finally:
+        conn.close()
+    db.finish("q0")
+
+    assert registry.poll_once(lambda: db) == 1
+    assert registry.get(job_id)["query_ids"] == ["q0", "q1"]
+
+
+def test_poller_thread_drives_job_to_completion(registry, monkeypatch):
+    monkeypatch.setitem(warehouse_jobs.WAREHOUSE_JOBS_CONFIG, "poll_seconds", 0.01)
+    db = FakeWarehouse()
+    db.execute_async = _auto_finish(db.execute_async, db)
+    job_id = registry.submit(db, "cleanup", STEPS, user_id="u1")["id"]
+
+    registry.start(lambda: db)
+    try:
+        deadline = time.monotonic() + 5
+        while registry.get(job_id)["status"] == "running" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        registry.stop()
+
+    assert registry.get(job_id)["status"] == "succeeded"
+    assert db.rollups == ["u1"]
+
+
+def _auto_finish(execute_async, db):
+    def wrapper(sql, params=()):
+        query_id = execute_async(sql, params)
+        db.finish(query_id, rows=1)
+        return query_id
+    return wrapper
@@ -0,0 +1,123 @@
+"""
+Local Vector Classifier for Dime
+
+In-process cosine-similarity scoring against CATEGORY_EMBEDDINGS:
+- Loads the 768-dim category matrix once into a NumPy array
+- Scores a batch of transaction embeddings with a single matrix multiply
+- Top-k matches and a minimum-confidence threshold
+- SnowflakeDB falls back to the warehouse VECTOR_COSINE_SIMILARITY path when unavailable
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+CLASSIFIER_CONFIG = {
+    "enabled": os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() not in ("0", "false", "no"),
+    "min_confidence": float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0")),
+    "top_k": int(os.getenv("LOCAL_CLASSIFIER_TOP_K", "3")),
+    # Category embeddings only change on /setup; reload occasionally to pick that up
+    "reload_seconds": float(os.getenv("LOCAL_CLASSIFIER_RELOAD_SECONDS", "3600")),
+}
+
+EMBEDDING_DIM = 768
+
+
+def parse_vector(value: Any) -> np.ndarray:
+    """Coerce a VECTOR value from the connector (list or JSON text) into a float32 array"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorClassifier:
+    """Category matrix held in memory; classify() is one (N x 768) @ (768 x C) multiply"""
+
+    def __init__(self, categories: Sequence[str], embeddings: np.ndarray):
+        if len(categories) == 0:
+            raise ValueError("No category embeddings loaded")
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(categories):
+            raise ValueError(f"Category matrix shape {matrix.shape} does not match {len(categories)} categories")
+        self.categories = list(categories)
+        self.dim = matrix.shape[1]
+        # Unit rows, so a dot product is the cosine similarity
+        self._matrix_t = _normalize_rows(matrix).T.copy()
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "VectorClassifier":
+        """Build from (category, embedding) rows as returned by CATEGORY_EMBEDDINGS"""
+        categories, vectors = [], []
+        for category, embedding in rows:
+            if embedding is None:
+                continue
+            categories.append(category)
+            vectors.append(parse_vector(embedding))
+        if not vectors:
+            raise ValueError("No category embeddings loaded")
+        return cls(categories, np.vstack(vectors))
+
+    def similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        """(N x dim) embeddings -> (N x categories) cosine similarities"""
+        batch = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if batch.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim embeddings, got {batch.shape[1]}")
+        return _normalize_rows(batch) @ self._matrix_t
+
+    def classify(self, embeddings: np.ndarray, top_k: int = 1, min_confidence: float = None) -> List[Dict[str, Any]]:
+        """Best category per embedding (None below min_confidence) plus the top_k matches"""
+        min_confidence = CLASSIFIER_CONFIG["min_confidence"] if min_confidence is None else min_confidence
+        scores = self.similarities(embeddings)
+        k = max(1, min(top_k, len(self.categories)))
+        # argpartition finds the top k without sorting every category, then sort just those
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        results = []
+        for indices, values in zip(top, top_scores):
+            best = float(values[0])
+            results.append({
+                "category": self.categories[indices[0]] if best >= min_confidence else None,
+                "confidence": best,
+                "top": [{"category": self.categories[i], "similarity": float(v)} for i, v in zip(indices, values)],
+            })
+        return results
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.loaded_at > CLASSIFIER_CONFIG["reload_seconds"]
+
+
+_classifier_instance: Optional[VectorClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier(load_rows) -> VectorClassifier:
+    """Process-wide classifier; load_rows() returns (category, embedding) rows on first use / reload"""
+    global _classifier_instance
+    if _classifier_instance is None or _classifier_instance.is_stale():
+        with _classifier_lock:
+            if _classifier_instance is None or _classifier_instance.is_stale():
+                _classifier_instance = VectorClassifier.from_rows(load_rows())
+                print(f"🧮 Loaded {len(_classifier_instance.categories)} category embeddings into local classifier")
+    return _classifier_instance
+
+
+def reset_classifier() -> None:
+    """Drop the loaded matrix (after CATEGORY_EMBEDDINGS changes)"""
+    global _classifier_instance
+    with _classifier_lock:
+        _classifier_instance = None
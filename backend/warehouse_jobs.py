@@ -0,0 +1,277 @@
+"""
+Async Warehouse Jobs for Dime
+
+Long-running maintenance statements submitted with the connector's async execution:
+- submit() fires the first statement with execute_async and returns immediately
+- Query ids are tracked in a SQLite registry (shared with the job queue database)
+- A poller thread advances multi-step jobs and refreshes the rollup when they finish
+- Status lookups for /api/jobs/warehouse/<id>
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from db_pool import pool_lane
+from jobs import JOBS_CONFIG
+from metrics import current_route
+
+WAREHOUSE_JOBS_CONFIG = {
+    "poll_seconds": float(os.getenv("WAREHOUSE_JOBS_POLL_SECONDS", "2")),
+    # A process that died mid-advance leaves a job 'advancing'; another poller takes it back after this
+    "stale_advance_seconds": float(os.getenv("WAREHOUSE_JOBS_STALE_SECONDS", "120")),
+}
+
+
+class WarehouseJobRegistry:
+    """SQLite-backed registry of async warehouse query chains"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or JOBS_CONFIG["db_path"]
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._setup()
+
+    # ========== Storage ==========
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _setup(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS warehouse_jobs (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    steps TEXT NOT NULL,
+                    step INTEGER NOT NULL DEFAULT 0,
+                    query_ids TEXT NOT NULL,
+                    rows INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS warehouse_jobs_status_idx ON warehouse_jobs (status)")
+        finally:
+            conn.close()
+
+    # ========== Public API ==========
+
+    def submit(self, db, name: str, steps: List[tuple], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Start the first (sql, params) step asynchronously and register the job"""
+        if not steps:
+            raise ValueError(f"No statements for warehouse job {name}")
+        query_id = db.execute_async(*steps[0])
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                INSERT INTO warehouse_jobs (id, name, user_id, status, steps, step, query_ids, created_at, updated_at)
+                VALUES (?, ?, ?, 'running', ?, 0, ?, ?, ?)
+            """, (job_id, name, user_id, json.dumps([[sql, list(params)] for sql, params in steps]),
+                  json.dumps([query_id]), now, now))
+        finally:
+            conn.close()
+        print(f"🛰️  Submitted warehouse job {job_id} ({name}), query {query_id}")
+        with self._wakeup:
+            self._wakeup.notify()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM warehouse_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM warehouse_jobs"
+        params: List[Any] = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [self._to_dict(row) for row in rows]
+
+    # ========== Polling ==========
+
+    def poll_once(self, get_db: Callable[[], Any]) -> int:
+        """Check every running job's current query; returns how many are still running"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE warehouse_jobs SET status = 'running'
+                WHERE status = 'advancing' AND updated_at < ?
+            """, (time.time() - WAREHOUSE_JOBS_CONFIG["stale_advance_seconds"],))
+            running = conn.execute("SELECT id FROM warehouse_jobs WHERE status = 'running'").fetchall()
+        finally:
+            conn.close()
+        if not running:
+            return 0
+
+        db = get_db()
+        still_running = 0
+        for row in running:
+            try:
+                if self._advance(db, row["id"]):
+                    still_running += 1
+            except Exception as e:
+                print(f"⚠️  Warehouse job {row['id']} poll failed: {e}")
+                still_running += 1
+        return still_running
+
+    def _advance(self, db, job_id: str) -> bool:
+        """Move one job forward if its current query finished; True while it is still running"""
+        conn = self._connect()
+        try:
+            # Claim the job so only one poller (in any process) advances it
+            claimed = conn.execute("""
+                UPDATE warehouse_jobs SET status = 'advancing', updated_at = ?
+                WHERE id = ? AND status = 'running'
+            """, (time.time(), job_id)).rowcount
+            if not claimed:
+                return False
+            job = conn.execute("SELECT * FROM warehouse_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        steps = json.loads(job["steps"])
+        query_ids = json.loads(job["query_ids"])
+        status = "running"
+        rows = job["rows"]
+        error = None
+        step = job["step"]
+        try:
+            state = db.async_query_status(query_ids[-1])
+            if state["state"] == "running":
+                pass
+            elif state["state"] == "failed":
+                status, error = "failed", state.get("error")
+            else:
+                rows += state.get("rows") or 0
+                step += 1
+                if step < len(steps):
+                    sql, params = steps[step]
+                    query_ids.append(db.execute_async(sql, tuple(params)))
+                else:
+                    # Statements are done; bring the analytics rollup (and read cache) up to date
+                    db.refresh_spend_rollup(user_id=job["user_id"])
+                    status = "succeeded"
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        finished_at = time.time() if status != "running" else None
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE warehouse_jobs
+                SET status = ?, step = ?, query_ids = ?, rows = ?, error = ?, updated_at = ?, finished_at = ?
+                WHERE id = ?
+            """, (status, step, json.dumps(query_ids), rows, error, time.time(), finished_at, job_id))
+        finally:
+            conn.close()
+        if status != "running":
+            print(f"🛰️  Warehouse job {job_id} ({job['name']}) {status}: {rows} rows")
+        return status == "running"
+
+    def start(self, get_db: Callable[[], Any]):
+        """Start the poller thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._poll_loop, args=(get_db,), name="warehouse-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _poll_loop(self, get_db: Callable[[], Any]):
+        current_route.set("warehouse_poller")
+        pool_lane.set("background")
+        while not self._stopping:
+            try:
+                running = self.poll_once(get_db)
+            except Exception as e:
+                print(f"⚠️  Warehouse poller error: {e}")
+                running = 1
+            with self._wakeup:
+                # Idle until a submit() wakes us; poll steadily while queries are in flight
+                self._wakeup.wait(timeout=WAREHOUSE_JOBS_CONFIG["poll_seconds"] if running else 30.0)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        steps = json.loads(row["steps"])
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "user_id": row["user_id"],
+            "status": "running" if row["status"] == "advancing" else row["status"],
+            "step": min(row["step"] + 1, len(steps)),
+            "steps": len(steps),
+            "query_ids": json.loads(row["query_ids"]),
+            "rows": row["rows"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "finished_at": row["finished_at"],
+        }
+
+
+# Singleton registry (one per process)
+_registry_instance = None
+_registry_lock = threading.Lock()
+
+def get_warehouse_jobs() -> WarehouseJobRegistry:
+    """Get the process-wide registry, starting its poller on first use"""
+    global _registry_instance
+    if _registry_instance is None:
+        with _registry_lock:
+            if _registry_instance is None:
+                from snowflake_db import get_db
+                registry = WarehouseJobRegistry()
+                registry.start(get_db)
+                _registry_instance = registry
+    return _registry_instance
+
+
+def reset_warehouse_jobs_after_fork() -> None:
+    """Forget a registry inherited from the parent process (its poller thread did not survive fork)"""
+    global _registry_instance, _registry_lock
+    _registry_lock = threading.Lock()
+    _registry_instance = None
+
+
+def shutdown_warehouse_jobs() -> None:
+    """Stop the poller; queries keep running in the warehouse and are picked up by the next process"""
+    if _registry_instance is not None:
+        _registry_instance.stop()
+
+
+def submit_maintenance(db, name: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Submit one of SnowflakeDB.maintenance_statements() as an async warehouse job"""
+    return get_warehouse_jobs().submit(db, name, db.maintenance_statements(name, user_id), user_id=user_id)
@@ -0,0 +1,10 @@
+"""
+Production WSGI entry point for Dime
+- Run with `gunicorn` from backend/ (settings in gunicorn.conf.py)
+- Background workers and Snowflake connections are started per worker, after fork,
+  by the gunicorn hooks rather than at import
+"""
+
+from app import create_app
+
+app = create_app(start_background=False)